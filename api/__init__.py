@@ -3,11 +3,9 @@ Pharmacy-MS API module. Uses FastAPI.
 """
 
 import os
-import time
 from pathlib import Path
 
-from fastapi import FastAPI, Request, Response, Path as FPath
-from fastapi.staticfiles import StaticFiles
+from fastapi import FastAPI, Request, Path as FPath
 from fastapi.middleware.cors import CORSMiddleware
 from typing import Annotated
 
@@ -17,6 +15,8 @@ import django
 django.setup()
 
 from api.v1 import router as v1_router
+from api.metrics import MetricsMiddleware, router as metrics_router
+from api.static import PrecompressedStaticFiles, InMemoryFile
 from pharmacy_ms.settings import (
     STATIC_URL,
     MEDIA_URL,
@@ -42,26 +42,33 @@ app = FastAPI(
 )
 
 
-@app.middleware("http")
-async def add_process_time_header(request: Request, call_next):
-    start_time = time.time()
-    response: Response = await call_next(request)
-    process_time = time.time() - start_time
-    response.headers["X-Process-Time"] = str(process_time)
-    return response
-
-
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_credentials=True,
     allow_methods=["GET", "POST", "PATCH", "DELETE"],
     allow_headers=["*"],
+    expose_headers=[
+        "X-Next-Cursor",
+        "Idempotent-Replayed",
+        "X-DB-Queries",
+        "X-DB-Time",
+    ],
 )
 
+# Outermost, so that the time taken by other middlewares counts
+app.add_middleware(MetricsMiddleware, wsgi_mounts=("/d",))
+
 # Mount static & media files
-app.mount(STATIC_URL[:-1], StaticFiles(directory=STATIC_ROOT), name="static")
-app.mount(MEDIA_URL[:-1], StaticFiles(directory=MEDIA_ROOT), name="media")
+app.mount(
+    STATIC_URL[:-1], PrecompressedStaticFiles(directory=STATIC_ROOT), name="static"
+)
+# Uploads keep their names when replaced, never cached for good
+app.mount(
+    MEDIA_URL[:-1],
+    PrecompressedStaticFiles(directory=MEDIA_ROOT, immutable=False),
+    name="media",
+)
 
 from django.core.handlers.wsgi import WSGIHandler
 
@@ -69,16 +76,21 @@ from fastapi.middleware.wsgi import WSGIMiddleware
 
 # Include API router
 app.include_router(v1_router, prefix=api_prefix)
+app.include_router(metrics_router, prefix=api_prefix)
 
 app.mount("/d", app=WSGIMiddleware(WSGIHandler()), name="django")
 
 if FRONTEND_DIR:
+    # Read once, served from memory until changed on disk
+    index_html = InMemoryFile(FRONTEND_DIR / "index.html", media_type="text/html")
 
+    @app.get("/", name="React app entry", include_in_schema=False)
     @app.get("/{path}", name="React request hits here", include_in_schema=False)
-    def serve_react_app(path: str):
-        file_path = FRONTEND_DIR / "index.html"
-        if file_path.exists():
-            return Response(content=file_path.read_text(), media_type="text/html")
-        return Response(content="index.html not found", status_code=404)
-
-    app.mount("/", StaticFiles(directory=FRONTEND_DIR, html=True), name="frontend")
+    def serve_react_app(request: Request, path: str = ""):
+        return index_html.response(request.headers)
+
+    app.mount(
+        "/",
+        PrecompressedStaticFiles(directory=FRONTEND_DIR, html=True),
+        name="frontend",
+    )
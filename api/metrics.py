@@ -0,0 +1,99 @@
+"""Request metrics middleware & `/api/metrics` endpoint (see
+`pharmacy.metrics`), profiling SQL too when `SQL_PROFILER` is set (see
+`pharmacy.profiler`)
+"""
+
+import time
+
+import anyio.to_thread
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from pharmacy import metrics
+from pharmacy.profiler import QueryProfile
+from pharmacy_ms.settings import SQL_PROFILER
+
+METHODS = {"GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"}
+
+router = APIRouter()
+
+
+def route_template(scope: Scope, root_path: str, stats: metrics.RequestStats) -> str:
+    """Route pattern the request matched, keeping label values few"""
+    route = scope.get("route")
+    if route is not None:
+        return route.path
+    if "endpoint" not in scope:
+        return "unmatched"
+    # Mounted app, `root_path` grew by the mount path
+    mount = scope.get("root_path", "")[len(root_path) :]
+    if stats.route is not None:
+        # Django's URL pattern
+        return f"{mount}/{stats.route}"
+    return f"{mount}/{{path}}"
+
+
+class MetricsMiddleware:
+    """Records latency, in-flight requests and database queries of every
+    request, and sets the `X-Process-Time` header"""
+
+    def __init__(self, app: ASGIApp, wsgi_mounts: tuple[str, ...] = ()):
+        self.app = app
+        self.wsgi_mounts = wsgi_mounts
+        self.wsgi_prefixes = tuple(f"{mount}/" for mount in wsgi_mounts)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        start = time.perf_counter()
+        root_path = scope.get("root_path", "")
+        path = scope["path"]
+        if path.startswith(self.wsgi_prefixes) or path in self.wsgi_mounts:
+            app = "django"
+        else:
+            app = "api"
+        stats = metrics.RequestStats(QueryProfile() if SQL_PROFILER else None)
+        token = metrics.current_request.set(stats)
+        status = 500
+
+        async def send_wrapper(message: Message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = [
+                    *message.get("headers", ()),
+                    (b"x-process-time", b"%f" % (time.perf_counter() - start)),
+                ]
+                if stats.profile is not None:
+                    # Queries made so far, streamed bodies may make more
+                    headers.append((b"x-db-queries", b"%d" % stats.queries))
+                    headers.append((b"x-db-time", b"%.3f" % (stats.db_time * 1000)))
+                message["headers"] = headers
+            await send(message)
+
+        metrics.request_started(app)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            metrics.current_request.reset(token)
+            method = scope["method"] if scope["method"] in METHODS else "OTHER"
+            route = route_template(scope, root_path, stats)
+            metrics.request_finished(
+                app, method, route, status, time.perf_counter() - start, stats
+            )
+            if stats.profile is not None:
+                stats.profile.report(
+                    method, route, status, stats.queries, stats.db_time
+                )
+
+
+@router.get("/metrics", name="Metrics", include_in_schema=False)
+async def metrics_endpoint() -> PlainTextResponse:
+    """Prometheus text exposition of this process' metrics"""
+    limiter = anyio.to_thread.current_default_thread_limiter()
+    metrics.threadpool_threads.set(limiter.borrowed_tokens, "busy")
+    metrics.threadpool_threads.set(limiter.total_tokens, "limit")
+    metrics.threadpool_waiting.set(limiter.statistics().tasks_waiting)
+    return PlainTextResponse(
+        metrics.registry.render(), media_type="text/plain; version=0.0.4"
+    )
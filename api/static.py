@@ -0,0 +1,145 @@
+"""Static, media & frontend file serving
+"""
+
+import hashlib
+import mimetypes
+import os
+import stat
+import threading
+from pathlib import Path
+
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import StaticFiles, NotModifiedResponse
+from starlette.types import Scope
+from pharmacy.assets import ENCODINGS, MANIFEST, compress, read_manifest
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "public, no-cache"
+
+
+def accepted_encodings(headers: Headers) -> list[str]:
+    """Encodings of `ENCODINGS` the client accepts, preferred first"""
+    accepted = set()
+    for item in headers.get("accept-encoding", "").split(","):
+        encoding, _, params = item.strip().partition(";")
+        if params.strip().replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            continue
+        accepted.add(encoding.strip().lower())
+    if "*" in accepted:
+        return list(ENCODINGS)
+    return [encoding for encoding in ENCODINGS if encoding in accepted]
+
+
+class PrecompressedStaticFiles(StaticFiles):
+    """`StaticFiles` serving `.br`/`.gz` siblings (see `pharmacy.assets`)
+    to clients accepting them, with immutable caching of the fingerprinted
+    files `precompress_assets` listed and revalidation of the rest.
+    `immutable=False` revalidates everything e.g uploads."""
+
+    def __init__(self, *args, immutable: bool = True, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.immutable = immutable
+        self._root = os.path.realpath(self.directory) if self.directory else None
+        self._manifest: tuple[int | None, frozenset[str]] = (None, frozenset())
+
+    def immutable_files(self) -> frozenset[str]:
+        """Files listed by `precompress_assets`, reread when it reruns"""
+        try:
+            mtime = os.stat(os.path.join(self._root, MANIFEST)).st_mtime_ns
+        except (OSError, TypeError):
+            return frozenset()
+        if mtime != self._manifest[0]:
+            self._manifest = (mtime, read_manifest(self._root))
+        return self._manifest[1]
+
+    def is_immutable(self, full_path: os.PathLike) -> bool:
+        if not self.immutable:
+            return False
+        relative = os.path.relpath(full_path, self._root).replace(os.sep, "/")
+        return relative in self.immutable_files()
+
+    def file_response(
+        self,
+        full_path: os.PathLike,
+        stat_result: os.stat_result,
+        scope: Scope,
+        status_code: int = 200,
+    ) -> Response:
+        request_headers = Headers(scope=scope)
+        headers = {
+            "Cache-Control": IMMUTABLE if self.is_immutable(full_path) else REVALIDATE,
+            "Vary": "Accept-Encoding",
+        }
+        path, encoded_stat = full_path, stat_result
+        for encoding in accepted_encodings(request_headers):
+            try:
+                candidate = f"{full_path}{ENCODINGS[encoding]}"
+                candidate_stat = os.stat(candidate)
+            except OSError:
+                continue
+            # Stale siblings are ignored rather than served
+            if stat.S_ISREG(candidate_stat.st_mode) and (
+                candidate_stat.st_mtime >= stat_result.st_mtime
+            ):
+                path, encoded_stat = candidate, candidate_stat
+                headers["Content-Encoding"] = encoding
+                break
+        response = FileResponse(
+            path,
+            status_code=status_code,
+            stat_result=encoded_stat,
+            headers=headers,
+            # Type of the original, not of the sibling
+            media_type=mimetypes.guess_type(full_path)[0] or "text/plain",
+        )
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        return response
+
+
+class InMemoryFile:
+    """A small file (e.g SPA `index.html`) kept in memory in every
+    encoding, reloaded whenever it changes on disk"""
+
+    def __init__(self, path: Path, media_type: str):
+        self.path = path
+        self.media_type = media_type
+        self._signature = None
+        self._bodies: dict[str | None, bytes] = {}
+        self._etag = ""
+        self._lock = threading.Lock()
+
+    def load(self) -> bool:
+        """Reloads file if it changed. Returns False if it is missing."""
+        try:
+            stat_result = os.stat(self.path)
+        except OSError:
+            return False
+        signature = (stat_result.st_mtime_ns, stat_result.st_size)
+        if signature != self._signature:
+            with self._lock:
+                if signature != self._signature:
+                    data = self.path.read_bytes()
+                    bodies = {None: data}
+                    for encoding in ENCODINGS:
+                        bodies[encoding] = compress(data, encoding)
+                    self._bodies = bodies
+                    self._etag = hashlib.blake2b(data, digest_size=8).hexdigest()
+                    self._signature = signature
+        return True
+
+    def response(self, request_headers: Headers) -> Response:
+        if not self.load():
+            return Response(content=f"{self.path.name} not found", status_code=404)
+        bodies, etag = self._bodies, self._etag
+        headers = {"Cache-Control": REVALIDATE, "Vary": "Accept-Encoding"}
+        encoding = next(
+            (e for e in accepted_encodings(request_headers) if e in bodies), None
+        )
+        if encoding:
+            headers["Content-Encoding"] = encoding
+        headers["ETag"] = f'"{etag}-{encoding}"' if encoding else f'"{etag}"'
+        if headers["ETag"] in request_headers.get("if-none-match", ""):
+            return Response(status_code=304, headers=headers)
+        return Response(bodies[encoding], media_type=self.media_type, headers=headers)
@@ -1,4 +1,9 @@
 """V1 implementation of Assignment-MS
 """
 
+from api.v1 import inventory, analytics, exports
 from api.v1.routes import router
+
+router.include_router(inventory.router)
+router.include_router(analytics.router)
+router.include_router(exports.router)
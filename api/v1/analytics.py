@@ -0,0 +1,80 @@
+"""Staff-only sales analytics of v1
+"""
+
+from fastapi import APIRouter, status, HTTPException, Depends, Query
+from django.utils import timezone
+from users.models import CustomUser
+from pharmacy import analytics
+from api.v1.routes import get_staff_user
+from api.v1.models import TopSeller, CategoryRevenue, SalesVelocity, CustomerCohort
+from datetime import date, timedelta
+from typing import Annotated, Literal
+
+router = APIRouter(
+    prefix="/analytics",
+    tags=["Analytics"],
+    dependencies=[Depends(get_staff_user)],
+)
+
+
+def period(
+    start: Annotated[
+        date, Query(description="First day of the period, defaults to 30 days ago")
+    ] = None,
+    end: Annotated[
+        date, Query(description="Last day of the period, defaults to today")
+    ] = None,
+) -> tuple[date, date]:
+    end = end or timezone.localdate()
+    start = start or end - timedelta(days=29)
+    if start > end:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Start date must not be later than end date.",
+        )
+    if (end - start).days >= analytics.MAX_DAYS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Period must not exceed {analytics.MAX_DAYS} days.",
+        )
+    return start, end
+
+
+@router.get("/top-sellers", name="Best selling medicines")
+def top_sellers(
+    period: Annotated[tuple[date, date], Depends(period)],
+    by: Annotated[
+        Literal["quantity", "revenue"], Query(description="Rank by units or revenue")
+    ] = "quantity",
+    limit: Annotated[int, Query(description="Medicines amount", gt=0, le=100)] = 10,
+) -> list[TopSeller]:
+    return analytics.top_sellers(*period, limit=limit, by=by)
+
+
+@router.get("/revenue", name="Revenue by medicine category")
+def revenue_by_category(
+    period: Annotated[tuple[date, date], Depends(period)],
+    bucket: Annotated[
+        Literal["day", "week"], Query(description="Group revenue by day or week")
+    ] = "day",
+) -> list[CategoryRevenue]:
+    return analytics.revenue_by_category(*period, period=bucket)
+
+
+@router.get("/velocity", name="Sales velocity per medicine")
+def sales_velocity(
+    period: Annotated[tuple[date, date], Depends(period)],
+    limit: Annotated[int, Query(description="Medicines amount", gt=0, le=1000)] = 100,
+) -> list[SalesVelocity]:
+    return analytics.sales_velocity(*period, limit=limit)
+
+
+@router.get("/cohorts", name="Customer cohorts by month joined")
+def customer_cohorts(
+    period: Annotated[tuple[date, date], Depends(period)],
+) -> list[CustomerCohort]:
+    start, end = period
+    try:
+        return analytics.customer_cohorts(start, end)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
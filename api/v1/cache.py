@@ -0,0 +1,215 @@
+"""In-process caches for v1
+"""
+
+import copy
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Any
+
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from django.core.cache import cache
+from django.utils.http import parse_etags
+from django.db.models.signals import post_save, post_delete
+from users.models import CustomUser, Account
+from users.signals import balance_changed
+from pharmacy.cache import catalog_version
+from pharmacy_ms.settings import (
+    API_USER_CACHE_SIZE,
+    API_USER_CACHE_TTL,
+    API_CATALOG_CACHE_TTL,
+)
+
+
+class TokenUserCache:
+    """Bounded LRU cache of token -> `CustomUser` (with `Account` preloaded).
+
+    Entries expire after `ttl` seconds so that changes made by other
+    processes are picked up eventually. Changes made in this process
+    evict the affected entries straight away (see receivers below), other
+    workers keep accepting a rotated token or deleted user's token until
+    then.
+    """
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.version = 0  # Bumped on every eviction
+        self._entries: OrderedDict[str, tuple[float, CustomUser]] = OrderedDict()
+        self._token_by_user: dict[int, str] = {}
+        self._token_by_account: dict[int, str] = {}
+        self._lock = threading.Lock()
+
+    def get(self, token: str) -> CustomUser | None:
+        """Returns a private copy of the cached user or None"""
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    self._pop(token)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(token)
+            self.hits += 1
+            user = entry[1]
+        return self._copy(user)
+
+    def set(self, token: str, user: CustomUser, version: int):
+        """Stores `user` unless an eviction happened since `version` was read"""
+        with self._lock:
+            if version != self.version:
+                return
+            self._pop(token)
+            user = self._copy(user)
+            self._entries[token] = (time.monotonic() + self.ttl, user)
+            self._token_by_user[user.pk] = token
+            self._token_by_account[user.account_id] = token
+            while len(self._entries) > self.max_size:
+                self._pop(next(iter(self._entries)))
+
+    def evict_user(self, user_id: int):
+        with self._lock:
+            self.version += 1
+            token = self._token_by_user.get(user_id)
+            if token is not None:
+                self._pop(token)
+
+    def evict_account(self, account_id: int):
+        with self._lock:
+            self.version += 1
+            token = self._token_by_account.get(account_id)
+            if token is not None:
+                self._pop(token)
+
+    def clear(self):
+        with self._lock:
+            self.version += 1
+            self._entries.clear()
+            self._token_by_user.clear()
+            self._token_by_account.clear()
+
+    def stats(self) -> dict:
+        """Hit/miss counters and current size"""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self._entries),
+                "max_size": self.max_size,
+            }
+
+    @staticmethod
+    def _copy(user: CustomUser) -> CustomUser:
+        # Handlers mutate `user.account` in place (orders, payments), and
+        # saves their loaded values (`ChangeTrackingMixin`), even those
+        # rolled back
+        user = copy.copy(user)
+        user.account = copy.copy(user.account)
+        for instance in (user, user.account):
+            if "_loaded_values" in instance.__dict__:
+                instance._loaded_values = dict(instance._loaded_values)
+        return user
+
+    def _pop(self, token: str):
+        entry = self._entries.pop(token, None)
+        if entry is not None:
+            user = entry[1]
+            self._token_by_user.pop(user.pk, None)
+            self._token_by_account.pop(user.account_id, None)
+
+
+user_cache = TokenUserCache(max_size=API_USER_CACHE_SIZE, ttl=API_USER_CACHE_TTL)
+
+
+def evict_user(sender, instance: CustomUser, **kwargs):
+    """Covers token changes, profile edits and user deletion"""
+    user_cache.evict_user(instance.pk)
+
+
+def evict_account(sender, instance: Account, **kwargs):
+    """Keeps cached account balance in step with orders & payments"""
+    user_cache.evict_account(instance.pk)
+
+
+post_save.connect(evict_user, sender=CustomUser, dispatch_uid="v1_user_cache_user")
+post_delete.connect(evict_user, sender=CustomUser, dispatch_uid="v1_user_cache_user")
+post_save.connect(evict_account, sender=Account, dispatch_uid="v1_user_cache_account")
+balance_changed.connect(
+    evict_account, sender=Account, dispatch_uid="v1_user_cache_account"
+)
+
+
+class CatalogCache:
+    """Conditional GET & serialized page cache for catalog endpoints.
+
+    ETags combine the catalog version stamp with the request URL, so a
+    matching `If-None-Match` is answered with 304 after reading the stamp
+    alone. `If-None-Match: *` is, once the page is known to exist: cached
+    or just built (a missing medicine is still a 404). Serialized bodies
+    are cached under the same key and dropped implicitly whenever the
+    catalog version moves on.
+    """
+
+    cache_control = "public, no-cache"
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+
+    def etag(self, request: Request) -> str:
+        query = "&".join(sorted(f"{k}={v}" for k, v in request.query_params.items()))
+        digest = hashlib.blake2b(
+            f"{request.url.path}?{query}".encode(), digest_size=8
+        ).hexdigest()
+        return f'"{catalog_version()}-{digest}"'
+
+    def lookup(self, request: Request) -> tuple[str, Response | None]:
+        """Returns ETag of the request and a ready response, if any"""
+        etag = self.etag(request)
+        if_none_match = parse_etags(request.headers.get("if-none-match", ""))
+        if self.matches(etag, if_none_match):
+            return etag, self.not_modified(etag)
+        cached = cache.get(self.key(etag))
+        if cached is not None:
+            if if_none_match == ["*"]:
+                return etag, self.not_modified(etag)
+            body, headers = cached
+            return etag, Response(body, media_type="application/json", headers=headers)
+        return etag, None
+
+    def store(
+        self,
+        request: Request,
+        etag: str,
+        content: Any,
+        headers: dict[str, str] | None = None,
+    ) -> Response:
+        """Serializes `content` once, caches and returns it"""
+        headers = {**(headers or {}), **self.headers(etag)}
+        response = JSONResponse(jsonable_encoder(content), headers=headers)
+        cache.set(self.key(etag), (response.body, headers), self.ttl)
+        if parse_etags(request.headers.get("if-none-match", "")) == ["*"]:
+            return self.not_modified(etag)
+        return response
+
+    @staticmethod
+    def matches(etag: str, if_none_match: list[str]) -> bool:
+        """Weak comparison of `etag` with parsed `If-None-Match` etags"""
+        return any(other.removeprefix("W/") == etag for other in if_none_match)
+
+    def not_modified(self, etag: str) -> Response:
+        return Response(status_code=304, headers=self.headers(etag))
+
+    def headers(self, etag: str) -> dict[str, str]:
+        return {"ETag": etag, "Cache-Control": self.cache_control}
+
+    @staticmethod
+    def key(etag: str) -> str:
+        return f"v1_catalog:{etag}"
+
+
+catalog_cache = CatalogCache(ttl=API_CATALOG_CACHE_TTL)
@@ -0,0 +1,187 @@
+"""Staff-only bulk exports of v1
+"""
+
+import csv
+import io
+import json
+import zlib
+from datetime import datetime
+from decimal import Decimal
+from enum import Enum
+from typing import Annotated, AsyncIterator, Iterator
+
+from fastapi import APIRouter, status, HTTPException, Depends, Query, Path
+from django.db.models import QuerySet
+from users.models import Payment
+from pharmacy.models import Order, Inventory
+from api.v1.routes import get_staff_user, stream_thread, BoundedStreamingResponse
+
+EXPORT_CHUNK_SIZE = 2_000
+
+router = APIRouter(
+    prefix="/exports",
+    tags=["Exports"],
+    dependencies=[Depends(get_staff_user)],
+)
+
+
+class Dataset(str, Enum):
+    ORDERS = "orders"
+    PAYMENTS = "payments"
+    INVENTORY = "inventory"
+
+
+class ExportFormat(str, Enum):
+    NDJSON = "ndjson"
+    CSV = "csv"
+
+
+# Dataset -> (queryset, timestamp field, {column: model field lookup})
+DATASETS: dict[Dataset, tuple[QuerySet, str, dict[str, str]]] = {
+    Dataset.ORDERS: (
+        Order.objects.all(),
+        "created_at",
+        {
+            "id": "id",
+            "customer": "customer__username",
+            "medicine_id": "medicine_id",
+            "medicine": "medicine__name",
+            "quantity": "quantity",
+            "total_price": "total_price",
+            "status": "status",
+            "prescription": "prescription",
+            "created_at": "created_at",
+            "updated_at": "updated_at",
+        },
+    ),
+    Dataset.PAYMENTS: (
+        Payment.objects.all(),
+        "created_at",
+        {
+            "id": "id",
+            "user": "user__username",
+            "amount": "amount",
+            "method": "method",
+            "reference": "reference",
+            "created_at": "created_at",
+        },
+    ),
+    Dataset.INVENTORY: (
+        Inventory.objects.all(),
+        "timestamp",
+        {
+            "id": "id",
+            "medicine_id": "medicine_id",
+            "medicine": "medicine__name",
+            "change": "change",
+            "reason": "reason",
+            "timestamp": "timestamp",
+        },
+    ),
+}
+
+MEDIA_TYPES = {
+    ExportFormat.NDJSON: "application/x-ndjson",
+    ExportFormat.CSV: "text/csv",
+}
+
+
+def export_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def render(
+    query: QuerySet,
+    lookups: list[str],
+    columns: list[str],
+    format: ExportFormat,
+    compress: bool,
+) -> Iterator[bytes]:
+    """Encoded (and gzipped) rows of `query`, by id, `EXPORT_CHUNK_SIZE`
+    rows at a time"""
+    compressor = zlib.compressobj(wbits=31) if compress else None
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if format == ExportFormat.CSV:
+        writer.writerow(columns)
+    last = None
+    while True:
+        # A query per chunk, seeking past the last id, so no cursor stays
+        # open for the length of the download
+        chunk = query if last is None else query.filter(id__gt=last)
+        rows = list(
+            chunk.order_by("id").values_list(*lookups, "id")[:EXPORT_CHUNK_SIZE]
+        )
+        for *row, last in rows:
+            row = [export_value(value) for value in row]
+            if format == ExportFormat.CSV:
+                writer.writerow(row)
+            else:
+                buffer.write(json.dumps(dict(zip(columns, row))) + "\n")
+        data = buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+        if compressor:
+            data = compressor.compress(data)
+            if len(rows) < EXPORT_CHUNK_SIZE:
+                data += compressor.flush()
+        if data:
+            yield data
+        if len(rows) < EXPORT_CHUNK_SIZE:
+            return
+
+
+async def stream(chunks: Iterator[bytes]) -> AsyncIterator[bytes]:
+    """Pulls `chunks` one at a time on a thread of the export's own, so
+    that neither the event loop nor Django's shared sync thread waits on
+    the export"""
+    # Closed even if the client went away mid-export
+    async with stream_thread(chunks.close) as run:
+        while (chunk := await run(next, chunks, None)) is not None:
+            yield chunk
+
+
+@router.get("/{dataset}", name="Export orders, payments or inventory")
+async def export_dataset(
+    dataset: Annotated[Dataset, Path(description="Records to export")],
+    format: Annotated[ExportFormat, Query(description="Output format")] = (
+        ExportFormat.NDJSON
+    ),
+    fields: Annotated[
+        str, Query(description="Comma separated columns, defaults to all")
+    ] = None,
+    since: Annotated[
+        datetime, Query(description="Records at or after this time")
+    ] = None,
+    until: Annotated[datetime, Query(description="Records before this time")] = None,
+    gzip: Annotated[bool, Query(description="Gzip the output")] = False,
+) -> BoundedStreamingResponse:
+    """Streams every matching record, oldest first"""
+    query, timestamp, available = DATASETS[dataset]
+    columns = fields.split(",") if fields else list(available)
+    unknown = [column for column in columns if column not in available]
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown fields {', '.join(unknown)}. "
+            f"Choose from {', '.join(available)}.",
+        )
+    if since:
+        query = query.filter(**{f"{timestamp}__gte": since})
+    if until:
+        query = query.filter(**{f"{timestamp}__lt": until})
+    lookups = [available[column] for column in columns]
+    filename = f"{dataset.value}.{format.value}"
+    media_type = MEDIA_TYPES[format]
+    if gzip:
+        filename += ".gz"
+        media_type = "application/gzip"
+    return BoundedStreamingResponse(
+        stream(render(query, lookups, columns, format, gzip)),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
@@ -0,0 +1,176 @@
+"""`Idempotency-Key` support for v1 endpoints that place orders.
+
+Clients send the same key with every retry of a request. The first
+request to arrive claims the key and runs. Its response is kept for
+`API_IDEMPOTENCY_TTL` seconds and replayed to retries, which therefore
+place no further orders. Duplicates arriving while the first is still
+running wait for its response rather than racing it.
+
+Only successful responses are kept; a failed request changed nothing,
+so its key is released for the retry to run afresh. Keys are scoped per
+user and held in the database (`IdempotencyKey`), unique per user, so
+every worker sees the same claims. A claim is renewed for as long as its
+request runs and lapses `CLAIM_TTL` seconds after a worker died holding
+it. Purge lapsed keys with `manage.py purge_idempotency_keys`.
+"""
+
+import asyncio
+import functools
+import hashlib
+import json
+import time
+from datetime import timedelta
+from typing import Annotated
+
+from fastapi import Header, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from pharmacy.models import IdempotencyKey as Claim
+from pharmacy_ms.settings import API_IDEMPOTENCY_TTL, API_IDEMPOTENCY_WAIT
+
+IdempotencyKey = Annotated[
+    str,
+    Header(
+        alias="Idempotency-Key",
+        max_length=255,
+        description="Unique per operation, resent with its retries",
+    ),
+]
+
+# Seconds an unfinished claim outlives a worker that died holding it,
+# renewed every third of it while the request runs
+CLAIM_TTL = 60
+
+POLL_INTERVAL = 0.05  # seconds
+
+
+def fingerprint(func, kwargs: dict) -> str:
+    """Digest of the endpoint & its arguments, keys must not be reused
+    for different requests"""
+    arguments = {
+        name: jsonable_encoder(value)
+        for name, value in kwargs.items()
+        if name not in ("user", "idempotency_key")
+    }
+    request = json.dumps([func.__name__, arguments], sort_keys=True)
+    return hashlib.sha256(request.encode()).hexdigest()
+
+
+def expiry(seconds: float):
+    return timezone.now() + timedelta(seconds=seconds)
+
+
+def claim(user_id: int, key: str, digest: str) -> int | None:
+    """Id of a new claim on `key`, None where it is held already"""
+    # Lapsed claims & responses go first, the key is free again
+    Claim.objects.filter(
+        user_id=user_id, key=key, expires_at__lt=timezone.now()
+    ).delete()
+    try:
+        with transaction.atomic():
+            return Claim.objects.create(
+                user_id=user_id,
+                key=key,
+                fingerprint=digest,
+                expires_at=expiry(CLAIM_TTL),
+            ).pk
+    except IntegrityError:
+        return None
+
+
+def held(user_id: int, key: str) -> Claim | None:
+    return Claim.objects.filter(user_id=user_id, key=key).first()
+
+
+def renew(claim_id: int):
+    Claim.objects.filter(pk=claim_id, status_code=None).update(
+        expires_at=expiry(CLAIM_TTL)
+    )
+
+
+def release(claim_id: int):
+    Claim.objects.filter(pk=claim_id).delete()
+
+
+def complete(claim_id: int, body):
+    Claim.objects.filter(pk=claim_id).update(
+        status_code=status.HTTP_200_OK,
+        response=body,
+        expires_at=expiry(API_IDEMPOTENCY_TTL),
+    )
+
+
+def check(record: Claim, digest: str) -> JSONResponse | None:
+    """Stored response of a completed request, None while pending"""
+    if record.fingerprint != digest:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Idempotency-Key was already used for a different request.",
+        )
+    if record.status_code is not None:
+        return JSONResponse(
+            record.response,
+            status_code=record.status_code,
+            headers={"Idempotent-Replayed": "true"},
+        )
+    return None
+
+
+def in_progress() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_409_CONFLICT,
+        detail="A request with this Idempotency-Key is still in progress. Retry later.",
+    )
+
+
+async def hold(claim_id: int):
+    """Renews claim `claim_id` until cancelled"""
+    while True:
+        await asyncio.sleep(CLAIM_TTL / 3)
+        await run_in_threadpool(renew, claim_id)
+
+
+async def settle(endpoint, kwargs: dict, claim_id: int):
+    """Runs `endpoint` holding claim `claim_id`, then keeps its response or
+    releases the claim"""
+    renewal = asyncio.create_task(hold(claim_id))
+    try:
+        result = await endpoint(**kwargs)
+    except BaseException:
+        await run_in_threadpool(release, claim_id)
+        raise
+    finally:
+        renewal.cancel()
+    await run_in_threadpool(complete, claim_id, jsonable_encoder(result))
+    return result
+
+
+def idempotent(endpoint):
+    """Makes async `endpoint`, which takes `user` and an `idempotency_key`
+    (`IdempotencyKey`) parameter, replay its response to retries"""
+
+    @functools.wraps(endpoint)
+    async def wrapper(**kwargs):
+        if not kwargs.get("idempotency_key"):
+            return await endpoint(**kwargs)
+        user_id, key = kwargs["user"].pk, kwargs["idempotency_key"]
+        digest = fingerprint(endpoint, kwargs)
+        deadline = time.monotonic() + API_IDEMPOTENCY_WAIT
+        # Off the shared sync thread of `API_ASYNC_ORM`, which the
+        # original request may be holding
+        while not (claim_id := await run_in_threadpool(claim, user_id, key, digest)):
+            record = await run_in_threadpool(held, user_id, key)
+            if record is None:  # Released meanwhile
+                continue
+            if response := check(record, digest):
+                return response
+            if time.monotonic() > deadline:
+                raise in_progress()
+            await asyncio.sleep(POLL_INTERVAL)
+        # Settled even if the client goes away, its order may be placed yet
+        return await asyncio.shield(settle(endpoint, kwargs, claim_id))
+
+    return wrapper
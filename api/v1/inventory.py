@@ -0,0 +1,84 @@
+"""Staff-only stock history & reorder suggestions of v1
+"""
+
+from fastapi import APIRouter, status, HTTPException, Depends, Query, Path
+from django.utils import timezone
+from users.models import CustomUser
+from pharmacy.models import Medicine, DemandForecast
+from django.db.models import F
+from pharmacy.inventory import stock_at, stock_history
+from api.v1.routes import get_staff_user
+from api.v1.models import StockLevel, ReorderSuggestion
+from datetime import datetime
+from typing import Annotated
+
+router = APIRouter(prefix="/inventory", tags=["Inventory"])
+
+
+def ensure_medicine_exists(medicine_id: int):
+    if not Medicine.objects.filter(id=medicine_id).exists():
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Medicine with id {medicine_id} does not exist.",
+        )
+
+
+def aware(value: datetime | None) -> datetime | None:
+    """Times without an offset are taken as of the server's time zone"""
+    if value is not None and timezone.is_naive(value):
+        return timezone.make_aware(value)
+    return value
+
+
+@router.get("/reorder", name="Reorder suggestions")
+def reorder_suggestions(
+    staff: Annotated[CustomUser, Depends(get_staff_user)],
+    low_only: Annotated[
+        bool, Query(description="Only medicines at or below reorder point")
+    ] = True,
+    limit: Annotated[int, Query(description="Medicines amount", gt=0, le=1000)] = 100,
+) -> list[ReorderSuggestion]:
+    forecasts = DemandForecast.objects.select_related("medicine").order_by(
+        "medicine__stock", "medicine_id"
+    )
+    if low_only:
+        forecasts = forecasts.filter(medicine__stock__lte=F("reorder_point"))
+    return [
+        ReorderSuggestion(
+            medicine_id=forecast.medicine_id,
+            name=forecast.medicine.name,
+            stock=forecast.medicine.stock,
+            daily_demand=round(forecast.demand, 2),
+            reorder_point=forecast.reorder_point,
+            suggested_quantity=forecast.suggested_quantity,
+            is_low=forecast.is_low,
+            updated_at=forecast.updated_at,
+        )
+        for forecast in forecasts[:limit]
+    ]
+
+
+@router.get("/{medicine_id}/stock", name="Stock of a medicine at a time")
+def medicine_stock_at(
+    medicine_id: Annotated[int, Path(description="Medicine id")],
+    staff: Annotated[CustomUser, Depends(get_staff_user)],
+    at: Annotated[datetime, Query(description="Point in time, defaults to now")] = None,
+) -> StockLevel:
+    ensure_medicine_exists(medicine_id)
+    at = aware(at) or timezone.now()
+    return StockLevel(timestamp=at, stock=stock_at(medicine_id, at))
+
+
+@router.get("/{medicine_id}/history", name="Stock of a medicine over a period")
+def medicine_stock_history(
+    medicine_id: Annotated[int, Path(description="Medicine id")],
+    start: Annotated[datetime, Query(description="Start of the period")],
+    staff: Annotated[CustomUser, Depends(get_staff_user)],
+    end: Annotated[datetime, Query(description="End of the period")] = None,
+) -> list[StockLevel]:
+    ensure_medicine_exists(medicine_id)
+    start, end = aware(start), aware(end) or timezone.now()
+    return [
+        StockLevel(timestamp=timestamp, stock=stock)
+        for timestamp, stock in stock_history(medicine_id, start, end)
+    ]
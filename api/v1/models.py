@@ -3,12 +3,14 @@ from pydantic import (
     Field,
     PositiveInt,
     field_validator,
+    model_validator,
     PositiveFloat,
 )
 from typing import Optional, Any
-from datetime import datetime
+from datetime import datetime, date
 from pharmacy_ms.settings import MEDIA_URL
 from pharmacy.models import Medicine, Order
+from pharmacy import images
 from os import path
 
 
@@ -49,6 +51,7 @@ class Profile(BaseModel):
     location: Optional[str] = None
     account_balance: float
     profile: Optional[Any] = None
+    profile_srcset: dict[str, str] = {}
     is_staff: Optional[bool] = False
 
     model_config = {
@@ -61,11 +64,29 @@ class Profile(BaseModel):
                 "location": "Nairobi",
                 "account_balance": 1200.15,
                 "profile": "/media/profiles/johndoe.jpg",
+                "profile_srcset": {
+                    "image/webp": "/media/profiles/johndoe.160w.webp 160w, "
+                    "/media/profiles/johndoe.320w.webp 320w",
+                    "image/jpeg": "/media/profiles/johndoe.160w.jpg 160w, "
+                    "/media/profiles/johndoe.320w.jpg 320w",
+                },
                 "is_staff": False,
             }
         }
     }
 
+    @model_validator(mode="before")
+    @classmethod
+    def add_srcset(cls, data: Any) -> Any:
+        if isinstance(data, dict) and "profile_srcset" not in data:
+            data = {
+                **data,
+                "profile_srcset": images.srcset(
+                    data.get("profile"), data.get("profile_variants")
+                ),
+            }
+        return data
+
     @field_validator("profile")
     def validate_file(value):
         if value:
@@ -82,6 +103,7 @@ class MedicineAvailable(BaseModel):
     price: PositiveFloat
     stock: PositiveInt
     picture: str
+    picture_srcset: dict[str, str] = {}
     updated_at: datetime
 
     model_config = {
@@ -95,11 +117,29 @@ class MedicineAvailable(BaseModel):
                 "price": 5.99,
                 "stock": 100,
                 "picture": "/media/medicines/aspirin.jpg",
+                "picture_srcset": {
+                    "image/webp": "/media/medicines/aspirin.160w.webp 160w, "
+                    "/media/medicines/aspirin.320w.webp 320w",
+                    "image/jpeg": "/media/medicines/aspirin.160w.jpg 160w, "
+                    "/media/medicines/aspirin.320w.jpg 320w",
+                },
                 "updated_at": "2023-10-01T12:00:00",
             }
         }
     }
 
+    @model_validator(mode="before")
+    @classmethod
+    def add_srcset(cls, data: Any) -> Any:
+        if isinstance(data, dict) and "picture_srcset" not in data:
+            data = {
+                **data,
+                "picture_srcset": images.srcset(
+                    data.get("picture"), data.get("picture_variants")
+                ),
+            }
+        return data
+
     @field_validator("picture")
     def validate_file(value):
         if value:
@@ -107,6 +147,22 @@ class MedicineAvailable(BaseModel):
         return value
 
 
+class MedicineSuggestion(BaseModel):
+    id: int
+    name: str
+    short_name: str | None = None
+
+    model_config = {
+        "json_schema_extra": {
+            "example": {
+                "id": 1,
+                "name": "Amoxicillin",
+                "short_name": "AMX",
+            }
+        }
+    }
+
+
 class ClientMedicineOrder(BaseModel):
     quantity: PositiveInt
 
@@ -119,6 +175,26 @@ class ClientMedicineOrder(BaseModel):
     }
 
 
+class CheckoutItem(BaseModel):
+    medicine_id: PositiveInt
+    quantity: PositiveInt
+
+
+class ClientCheckout(BaseModel):
+    items: list[CheckoutItem] = Field(min_length=1, max_length=100)
+
+    model_config = {
+        "json_schema_extra": {
+            "example": {
+                "items": [
+                    {"medicine_id": 1, "quantity": 2},
+                    {"medicine_id": 3, "quantity": 1},
+                ],
+            }
+        }
+    }
+
+
 class MedicineOrder(BaseModel):
     id: int
     medicine_name: str
@@ -143,3 +219,115 @@ class MedicineOrder(BaseModel):
             }
         }
         from_attributes = True
+
+
+class StockLevel(BaseModel):
+    timestamp: datetime
+    stock: int
+
+    model_config = {
+        "json_schema_extra": {
+            "example": {
+                "timestamp": "2023-10-01T12:00:00",
+                "stock": 100,
+            }
+        }
+    }
+
+
+class TopSeller(BaseModel):
+    medicine_id: int
+    name: str
+    quantity: int
+    revenue: float
+    orders: int
+
+    model_config = {
+        "json_schema_extra": {
+            "example": {
+                "medicine_id": 1,
+                "name": "Aspirin",
+                "quantity": 320,
+                "revenue": 1916.8,
+                "orders": 150,
+            }
+        }
+    }
+
+
+class CategoryRevenue(BaseModel):
+    period: date
+    revenue: dict[str, float]
+    total: float
+
+    model_config = {
+        "json_schema_extra": {
+            "example": {
+                "period": "2023-10-02",
+                "revenue": {"Antibiotics": 1200.5, "Pain Relief": 350.0},
+                "total": 1550.5,
+            }
+        }
+    }
+
+
+class SalesVelocity(BaseModel):
+    medicine_id: int
+    name: str
+    units_per_day: float
+    stock: int
+    days_of_stock: Optional[float] = None
+
+    model_config = {
+        "json_schema_extra": {
+            "example": {
+                "medicine_id": 1,
+                "name": "Aspirin",
+                "units_per_day": 12.5,
+                "stock": 100,
+                "days_of_stock": 8.0,
+            }
+        }
+    }
+
+
+class CustomerCohort(BaseModel):
+    cohort: date
+    customers: int
+    active: list[int]
+
+    model_config = {
+        "json_schema_extra": {
+            "example": {
+                "cohort": "2023-08-01",
+                "customers": 40,
+                "active": [32, 18, 15],
+            }
+        }
+    }
+
+
+class ReorderSuggestion(BaseModel):
+    medicine_id: int
+    name: str
+    stock: int
+    daily_demand: float
+    reorder_point: int
+    suggested_quantity: int
+    is_low: bool
+    updated_at: datetime
+
+    model_config = {
+        "json_schema_extra": {
+            "example": {
+                "medicine_id": 1,
+                "name": "Aspirin",
+                "stock": 20,
+                "daily_demand": 4.5,
+                "reorder_point": 38,
+                "suggested_quantity": 50,
+                "is_low": True,
+                "updated_at": "2023-10-01T12:00:00",
+            }
+        }
+    }
@@ -1,26 +1,68 @@
-from fastapi import APIRouter, status, HTTPException, Depends, Query, Path
+from fastapi import (
+    APIRouter,
+    status,
+    HTTPException,
+    Depends,
+    Query,
+    Path,
+    Response,
+    Request,
+)
 from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
 from fastapi.security.oauth2 import OAuth2PasswordBearer, OAuth2PasswordRequestForm
+from starlette.concurrency import run_in_threadpool
+from asgiref.sync import sync_to_async
+from django.db import connection
 from users.models import CustomUser
 from pharmacy.models import Medicine, Order
-from pharmacy.exceptions import InsufficientBalanceError
+from pharmacy import search
+from pharmacy.exceptions import InsufficientBalanceError, InsufficientStockError
 from pydantic import PositiveInt
+from django.db.models import QuerySet, Q, F
+from pharmacy_ms.settings import API_ASYNC_ORM, API_MAX_STREAMS
 
 # from django.contrib.auth.hashers import check_password
-from api.v1.utils import token_id, generate_token
+from api.v1.utils import (
+    token_id,
+    generate_token,
+    keyset_filter,
+    next_cursor,
+    encode_cursor,
+)
+from api.v1.cache import user_cache, catalog_cache
+from api.v1.idempotency import idempotent, IdempotencyKey
 from api.v1.models import (
     TokenAuth,
     Profile,
     Feedback,
     MedicineAvailable,
+    MedicineSuggestion,
     MedicineOrder,
     ClientMedicineOrder,
+    ClientCheckout,
 )
 import asyncio
-from typing import Annotated
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import Annotated, AsyncIterator, Callable
 
 router = APIRouter(prefix="/v1", tags=["v1"])
 
+ORDER_FIELDS = (
+    "id",
+    "quantity",
+    "prescription",
+    "total_price",
+    "status",
+    "updated_at",
+    "created_at",
+)
+
+ORDERS_CHUNK_SIZE = 100
+
 
 v1_auth_scheme = OAuth2PasswordBearer(
     tokenUrl="/api/v1/token",
@@ -28,16 +70,116 @@ v1_auth_scheme = OAuth2PasswordBearer(
 )
 
 
+async def run_orm(func: Callable, *args, **kwargs):
+    """Runs `func`, which queries the database, off the event loop.
+
+    On the threadpool, or with `API_ASYNC_ORM` the way Django's async ORM
+    does, one call at a time on its shared sync thread.
+    """
+    if API_ASYNC_ORM:
+        return await sync_to_async(func)(*args, **kwargs)
+    return await run_in_threadpool(func, *args, **kwargs)
+
+
+@asynccontextmanager
+async def stream_thread(*cleanup: Callable) -> AsyncIterator[Callable]:
+    """`run_orm` of a streamed response, every call on one thread of its
+    own whose database connection is closed once the stream ends, after
+    `cleanup` calls.
+
+    Chunks queried between sends then share a connection without holding
+    a threadpool or the shared sync thread for the length of the stream.
+    """
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="v1_stream")
+    loop = asyncio.get_running_loop()
+
+    async def run(func: Callable, *args):
+        return await loop.run_in_executor(executor, func, *args)
+
+    try:
+        yield run
+    finally:
+        # Queued, not awaited, as a stream may end by being cancelled
+        for func in cleanup + (connection.close,):
+            executor.submit(func)
+        executor.shutdown(wait=False)
+
+
+# Slots of the streamed responses in progress
+stream_slots = threading.BoundedSemaphore(API_MAX_STREAMS)
+
+
+class BoundedStreamingResponse(StreamingResponse):
+    """`StreamingResponse` holding one of `API_MAX_STREAMS` slots until it
+    has been sent. Raises 503 where all of them are taken."""
+
+    def __init__(self, *args, **kwargs):
+        if not stream_slots.acquire(blocking=False):
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Too many responses are streaming. Retry later.",
+                headers={"Retry-After": "1"},
+            )
+        try:
+            super().__init__(*args, **kwargs)
+        except BaseException:
+            stream_slots.release()
+            raise
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            stream_slots.release()
+
+
+def order_response(order: Order) -> MedicineOrder:
+    return MedicineOrder(
+        id=order.id,
+        medicine_name=order.medicine.name,
+        quantity=order.quantity,
+        prescription=order.prescription,
+        total_price=order.total_price,
+        status=order.status,
+        updated_at=order.updated_at,
+        created_at=order.created_at,
+    )
+
+
+def paginate(query: QuerySet, cursor: str | None) -> QuerySet:
+    """Applies keyset pagination from an `X-Next-Cursor` value"""
+    try:
+        return keyset_filter(query, cursor)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid pagination cursor.",
+        )
+
+
+def set_next_cursor(response: Response, rows: list, limit: int):
+    """Trims look-ahead row and advertises the next page, if any"""
+    cursor = next_cursor(rows, limit)
+    if cursor:
+        response.headers["X-Next-Cursor"] = cursor
+
+
 async def get_user(token: Annotated[str, Depends(v1_auth_scheme)]) -> CustomUser:
     """Ensures token passed match the one set"""
     if token:
         try:
             if token.startswith(token_id):
+                user = user_cache.get(token)
+                if user is not None:
+                    return user
 
                 def fetch_user(token):
-                    return CustomUser.objects.get(token=token)
+                    version = user_cache.version
+                    user = CustomUser.objects.select_related("account").get(token=token)
+                    user_cache.set(token, user, version)
+                    return user
 
-                return await asyncio.to_thread(fetch_user, token)
+                return await run_orm(fetch_user, token)
 
         except CustomUser.DoesNotExist:
             pass
@@ -49,30 +191,45 @@ async def get_user(token: Annotated[str, Depends(v1_auth_scheme)]) -> CustomUser
     )
 
 
+async def get_staff_user(user: Annotated[CustomUser, Depends(get_user)]) -> CustomUser:
+    """Ensures token passed belongs to a staff member"""
+    if not user.is_staff:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only staff can access this resource.",
+        )
+    return user
+
+
 @router.post("/token", name="User token")
-def fetch_token(
+async def fetch_token(
     form_data: Annotated[OAuth2PasswordRequestForm, Depends()]
 ) -> TokenAuth:
     """
     - `username` : User username
     - `password` : User password.
     """
-    try:
+
+    def issue_token(username: str, password: str) -> str:
         user = CustomUser.objects.get(
-            username=form_data.username
+            username=username
         )  # Temporarily restrict to students only
-        if user.check_password(form_data.password):
+        if user.check_password(password):
             if user.token is None:
                 user.token = generate_token()
                 user.save()
-            return TokenAuth(
-                access_token=user.token,
-                token_type="bearer",
-            )
+            return user.token
         else:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED, detail="Incorrect password."
             )
+
+    try:
+        token = await run_orm(issue_token, form_data.username, form_data.password)
+        return TokenAuth(
+            access_token=token,
+            token_type="bearer",
+        )
     except CustomUser.DoesNotExist:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -81,21 +238,35 @@ def fetch_token(
 
 
 @router.patch("/token", name="Generate new token")
-def generate_new_token(user: Annotated[CustomUser, Depends(get_user)]) -> TokenAuth:
+async def generate_new_token(
+    user: Annotated[CustomUser, Depends(get_user)]
+) -> TokenAuth:
     user.token = generate_token()
-    user.save()
+    await run_orm(user.save)
     return TokenAuth(access_token=user.token)
 
 
 @router.get("/profile", name="Profile information")
-def profile_information(user: Annotated[CustomUser, Depends(get_user)]) -> Profile:
-    user_data = jsonable_encoder(user)
-    user_data["account_balance"] = user.account.balance
-    return Profile(**user_data)
+async def profile_information(
+    user: Annotated[CustomUser, Depends(get_user)]
+) -> Profile:
+    # `jsonable_encoder(user)` recurses through the preloaded account
+    return Profile(
+        username=user.username,
+        first_name=user.first_name,
+        last_name=user.last_name,
+        email=user.email,
+        location=user.location,
+        account_balance=user.account.balance,
+        profile=user.profile.name if user.profile else None,
+        profile_variants=user.profile_variants,
+        is_staff=user.is_staff,
+    )
 
 
 @router.get("/medicine", name="medicine available")
-def medicine_available(
+async def medicine_available(
+    request: Request,
     name: Annotated[str, Query(description="Medicine name filter")] = None,
     category: Annotated[
         Medicine.MedicineCategory, Query(description="Medicine category filter")
@@ -105,33 +276,109 @@ def medicine_available(
     limit: Annotated[
         PositiveInt, Query(description="Total medicines not to exceed", ge=1, le=100)
     ] = 100,
-    offset: Annotated[int, Query(description="Medicine id to offset from")] = -1,
+    cursor: Annotated[
+        str, Query(description="`X-Next-Cursor` value of the previous page")
+    ] = None,
+    offset: Annotated[
+        int,
+        Query(description="Medicine id to offset from, use `cursor`", deprecated=True),
+    ] = -1,
 ) -> list[MedicineAvailable]:
-    query = Medicine.objects.order_by("-created_at")
+    etag, cached_response = await run_orm(catalog_cache.lookup, request)
+    if cached_response:
+        return cached_response
+
+    query = Medicine.objects.all()
 
     if name:
         query = query.filter(name__icontains=name)
     if category:
-        query = query.filter(category__icontains=category.replace(" ", "_"))
+        # Admin saves choice names, the API values
+        query = query.filter(category__in=[category.name, category.value])
     if short_name:
         query = query.filter(short_name__icontains=short_name)
     if price:
         query = query.filter(price__lt=price)
     if offset >= 0:
         query = query.filter(id__gt=offset)
+    query = paginate(query, cursor)
+
+    medicines = await run_orm(list, query[: limit + 1])
+    cursor = next_cursor(medicines, limit)
+    return catalog_cache.store(
+        request,
+        etag,
+        [MedicineAvailable(**jsonable_encoder(med)) for med in medicines],
+        headers={"X-Next-Cursor": cursor} if cursor else None,
+    )
 
-    query = query.all()[:limit]
 
-    return [MedicineAvailable(**jsonable_encoder(med)) for med in query]
+def search_medicines(q: str, limit: int) -> list[Medicine]:
+    """Ranked & typo tolerant lookup, `icontains` where index is missing"""
+    if search.is_available():
+        ids = search.search(q, limit)
+        medicines = Medicine.objects.in_bulk(ids)
+        return [medicines[id] for id in ids if id in medicines]
+    return list(
+        Medicine.objects.filter(
+            Q(name__icontains=q) | Q(short_name__icontains=q)
+        ).order_by("name")[:limit]
+    )
+
+
+def suggest_medicines(q: str, limit: int) -> list[dict]:
+    """Medicines whose name or short name starts with `q`"""
+    query = Medicine.objects.only("id", "name", "short_name")
+    if search.is_available():
+        ids = search.suggest(q, limit)
+        medicines = query.in_bulk(ids)
+        medicines = [medicines[id] for id in ids if id in medicines]
+    else:
+        medicines = query.filter(
+            Q(name__istartswith=q) | Q(short_name__istartswith=q)
+        ).order_by("name")[:limit]
+    return [
+        dict(id=med.id, name=med.name, short_name=med.short_name) for med in medicines
+    ]
+
+
+@router.get("/medicine/search", name="Search medicine")
+async def medicine_search(
+    q: Annotated[str, Query(description="Search terms", min_length=1)],
+    limit: Annotated[
+        PositiveInt, Query(description="Total medicines not to exceed", ge=1, le=100)
+    ] = 20,
+) -> list[MedicineAvailable]:
+    """Searches name, abbreviated name, description and category.
+    Misspelt names e.g *amoxcilin* still match."""
+    medicines = await run_orm(search_medicines, q, limit)
+    return [MedicineAvailable(**jsonable_encoder(med)) for med in medicines]
+
+
+@router.get("/medicine/suggest", name="Suggest medicine names")
+async def medicine_suggest(
+    q: Annotated[str, Query(description="Name prefix", min_length=1)],
+    limit: Annotated[
+        PositiveInt, Query(description="Total suggestions not to exceed", ge=1, le=20)
+    ] = 10,
+) -> list[MedicineSuggestion]:
+    medicines = await run_orm(suggest_medicines, q, limit)
+    return [MedicineSuggestion(**med) for med in medicines]
 
 
 @router.get("/medicine/{medicine_id}", name="Details about a particular medicine")
-def get_specific_medicine_details(
-    medicine_id: Annotated[int, Path(description="Specific medicine id")]
+async def get_specific_medicine_details(
+    request: Request,
+    medicine_id: Annotated[int, Path(description="Specific medicine id")],
 ) -> MedicineAvailable:
+    etag, cached_response = await run_orm(catalog_cache.lookup, request)
+    if cached_response:
+        return cached_response
     try:
-        target_medicine = Medicine.objects.get(id=medicine_id)
-        return MedicineAvailable(**jsonable_encoder(target_medicine))
+        target_medicine = await run_orm(Medicine.objects.get, id=medicine_id)
+        return catalog_cache.store(
+            request, etag, MedicineAvailable(**jsonable_encoder(target_medicine))
+        )
     except Medicine.DoesNotExist:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -140,34 +387,27 @@ def get_specific_medicine_details(
 
 
 @router.post("/order/{medicine_id}", name="Place a medicine order")
-def make_medicine_order(
+@idempotent
+async def make_medicine_order(
     medicine_id: Annotated[int, Path(description="Medicine id")],
     client_medicine_order: ClientMedicineOrder,
     user: Annotated[CustomUser, Depends(get_user)],
+    idempotency_key: IdempotencyKey = None,
 ) -> MedicineOrder:
     try:
-        target_medicine = Medicine.objects.get(id=medicine_id)
-        new_order = Order.objects.create(
+        target_medicine = await run_orm(Medicine.objects.get, id=medicine_id)
+        new_order = await run_orm(
+            Order.objects.create,
             customer=user,
             medicine=target_medicine,
             quantity=client_medicine_order.quantity,
             prescription="--",
         )
-        new_order.save()
         # order_response = jsonable_encoder(new_order)
         # order_response["medicine_name"] = new_order.medicine.name
         # This approach fails most times with error : RecursionError: maximum recursion depth exceeded
         # return MedicineOrder(**order_response)
-        return MedicineOrder(
-            id=new_order.id,
-            medicine_name=new_order.medicine.name,
-            quantity=new_order.quantity,
-            prescription=new_order.prescription,
-            total_price=new_order.total_price,
-            status=new_order.status,
-            updated_at=new_order.updated_at,
-            created_at=new_order.created_at,
-        )
+        return order_response(new_order)
     except Medicine.DoesNotExist:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -181,29 +421,57 @@ def make_medicine_order(
                 "Recharge your account and retry."
             ),
         )
+    except InsufficientStockError:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Not enough stock available for the requested quantity.",
+        )
+
+
+@router.post("/orders/checkout", name="Place several medicine orders")
+@idempotent
+async def checkout(
+    client_checkout: ClientCheckout,
+    user: Annotated[CustomUser, Depends(get_user)],
+    idempotency_key: IdempotencyKey = None,
+) -> list[MedicineOrder]:
+    """Orders every item in one go. Either all items are ordered or none."""
+    try:
+        orders = await run_orm(
+            Order.checkout,
+            user,
+            [(item.medicine_id, item.quantity) for item in client_checkout.items],
+        )
+        return [order_response(order) for order in orders]
+    except Medicine.DoesNotExist as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+    except InsufficientBalanceError:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail=(
+                f"You do not have enough funds to place these orders. "
+                "Recharge your account and retry."
+            ),
+        )
+    except InsufficientStockError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
 
 
 @router.patch("/order/{order_id}", name="Edit an order")
-def edit_an_order(
+async def edit_an_order(
     order_id: Annotated[int, Path(description="Order id")],
     client_medicine_order: ClientMedicineOrder,
     user: Annotated[CustomUser, Depends(get_user)],
 ) -> MedicineOrder:
     try:
-        target_order = Order.objects.get(id=order_id)
-        if target_order.customer == user:
+        target_order = await run_orm(
+            Order.objects.select_related("medicine").get, id=order_id
+        )
+        if target_order.customer_id == user.id:
+            target_order.customer = user
             target_order.quantity = client_medicine_order.quantity
-            target_order.save()
-            return MedicineOrder(
-                id=target_order.id,
-                medicine_name=target_order.medicine.name,
-                quantity=target_order.quantity,
-                prescription=target_order.prescription,
-                total_price=target_order.total_price,
-                status=target_order.status,
-                updated_at=target_order.updated_at,
-                created_at=target_order.created_at,
-            )
+            await run_orm(target_order.save)
+            return order_response(target_order)
         else:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
@@ -214,17 +482,33 @@ def edit_an_order(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Order with id {order_id} does not exist.",
         )
+    except InsufficientBalanceError:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail=(
+                f"You do not have enough funds to make this change. "
+                "Recharge your account and retry."
+            ),
+        )
+    except InsufficientStockError:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Not enough stock available for the requested quantity.",
+        )
 
 
 @router.delete("/order/{order_id}", name="Delete an order")
-def delete_an_order(
+async def delete_an_order(
     order_id: Annotated[int, Path(description="Order id")],
     user: Annotated[CustomUser, Depends(get_user)],
 ) -> Feedback:
     try:
-        target_order = Order.objects.get(id=order_id)
-        if target_order.customer == user:
-            target_order.delete()
+        target_order = await run_orm(
+            Order.objects.select_related("medicine").get, id=order_id
+        )
+        if target_order.customer_id == user.id:
+            target_order.customer = user
+            await run_orm(target_order.delete)
             return Feedback(detail="Order deleted successfully.")
         else:
             raise HTTPException(
@@ -238,13 +522,95 @@ def delete_an_order(
         )
 
 
+def customer_orders(
+    user: CustomUser,
+    order_status: Order.OrderStatus | None = None,
+    created_after: datetime | None = None,
+    created_before: datetime | None = None,
+) -> QuerySet:
+    """Customer's orders projected to `MedicineOrder` fields in one join"""
+    query = Order.objects.filter(customer=user)
+    if order_status:
+        # Admin saves choice names, the API values
+        query = query.filter(status__in=[order_status.name, order_status.value])
+    if created_after:
+        query = query.filter(created_at__gte=created_after)
+    if created_before:
+        query = query.filter(created_at__lt=created_before)
+    return query.values(*ORDER_FIELDS, medicine_name=F("medicine__name"))
+
+
+def stream_cursor(query: QuerySet, limit: int) -> str | None:
+    """Next page cursor of a streamed response, probed off the index"""
+    rows = list(query.values_list("created_at", "id")[limit - 1 : limit + 1])
+    if len(rows) == 2:
+        return encode_cursor(*rows[0])
+    return None
+
+
+async def stream_orders(query: QuerySet, limit: int | None) -> AsyncIterator[str]:
+    """JSON array of orders fetched in keyset chunks of `ORDERS_CHUNK_SIZE`,
+    all of them without a `limit`"""
+    yield "["
+    cursor = None
+    async with stream_thread() as run:
+        while limit is None or limit > 0:
+            size = ORDERS_CHUNK_SIZE if limit is None else min(limit, ORDERS_CHUNK_SIZE)
+            chunk = await run(list, paginate(query, cursor)[:size])
+            for index, order in enumerate(chunk):
+                separator = "," if cursor or index else ""
+                yield separator + MedicineOrder(**order).model_dump_json()
+            if len(chunk) < size:
+                break
+            if limit is not None:
+                limit -= size
+            cursor = encode_cursor(chunk[-1]["created_at"], chunk[-1]["id"])
+    yield "]"
+
+
 @router.get("/orders", name="Orders already placed")
-def orders_placed(
-    user: Annotated[CustomUser, Depends(get_user)]
+async def orders_placed(
+    user: Annotated[CustomUser, Depends(get_user)],
+    order_status: Annotated[
+        Order.OrderStatus, Query(alias="status", description="Order status filter")
+    ] = None,
+    created_after: Annotated[
+        datetime, Query(description="Orders placed at or after this time")
+    ] = None,
+    created_before: Annotated[
+        datetime, Query(description="Orders placed before this time")
+    ] = None,
+    limit: Annotated[
+        PositiveInt,
+        Query(
+            description="Total orders not to exceed, 100 by default with a `cursor`",
+            ge=1,
+            le=10_000,
+        ),
+    ] = None,
+    cursor: Annotated[
+        str, Query(description="`X-Next-Cursor` value of the previous page")
+    ] = None,
+    response: Response = None,
 ) -> list[MedicineOrder]:
-    # print(user.orders)
-    orders_list = []
-    for order in Order.objects.filter(customer=user).order_by("-created_at").all():
-        order.medicine_name = order.medicine.name
-        orders_list.append(MedicineOrder.model_validate(order))
-    return orders_list
+    """Orders above 100 per request are streamed, all of them unless
+    paginated by `limit` or `cursor`"""
+    query = customer_orders(user, order_status, created_after, created_before)
+    if limit is None and cursor is None:
+        # Clients from before pagination expect the whole history
+        return BoundedStreamingResponse(
+            stream_orders(query, None), media_type="application/json"
+        )
+    limit = limit or ORDERS_CHUNK_SIZE
+    if limit > ORDERS_CHUNK_SIZE:
+        query = paginate(query, cursor)
+        cursor = await run_orm(stream_cursor, query, limit)
+        return BoundedStreamingResponse(
+            stream_orders(query, limit),
+            media_type="application/json",
+            headers={"X-Next-Cursor": cursor} if cursor else None,
+        )
+    orders = await run_orm(list, paginate(query, cursor)[: limit + 1])
+    orders = [MedicineOrder(**order) for order in orders]
+    set_next_cursor(response, orders, limit)
+    return orders
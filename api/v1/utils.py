@@ -2,8 +2,13 @@
 """
 
 import uuid
+import json
+import base64
+import binascii
 import random
+from datetime import datetime
 from string import ascii_lowercase
+from django.db.models import QuerySet
 
 token_id = "pms_"
 
@@ -11,3 +16,40 @@ token_id = "pms_"
 def generate_token() -> str:
     """Generates api token"""
     return token_id + str(uuid.uuid4()).replace("-", random.choice(ascii_lowercase))
+
+
+def encode_cursor(created_at: datetime, id: int) -> str:
+    """Opaque keyset cursor for `(created_at, id)` descending pages"""
+    raw = json.dumps([created_at.isoformat(), id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    """Reverses `encode_cursor`. Raises `ValueError` on tampered values"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, id = json.loads(raw)
+        return datetime.fromisoformat(created_at), int(id)
+    except (TypeError, ValueError, binascii.Error) as e:
+        raise ValueError(f"Invalid cursor {cursor!r}") from e
+
+
+def keyset_filter(query: QuerySet, cursor: str | None) -> QuerySet:
+    """Orders `query` newest first and skips rows up to `cursor`"""
+    query = query.order_by("-created_at", "-id")
+    if cursor:
+        created_at, id = decode_cursor(cursor)
+        # A range the index seeks to, which OR-ed conditions are not, then
+        # rows of the same `created_at` up to `id` are skipped
+        query = query.filter(created_at__lte=created_at).exclude(
+            created_at=created_at, id__gte=id
+        )
+    return query
+
+
+def next_cursor(rows: list, limit: int) -> str | None:
+    """Trims the extra look-ahead row fetched and returns cursor to next page"""
+    if len(rows) > limit:
+        del rows[limit:]
+        return encode_cursor(rows[-1].created_at, rows[-1].id)
+    return None
@@ -0,0 +1,160 @@
+"""Page times of the admin changelists.
+
+Opens each changelist of a copy of the database, as is and as filtered
+from its sidebar, date hierarchy and search, as a superuser, and reports
+the median milliseconds and the queries per page i.e
+
+    python manage.py seed --scale 100000 --seed 1
+    python benchmarks/admin_changelists.py --repeat 5
+
+Pages are listed slowest first, those slower than `--budget` are flagged.
+"""
+
+import argparse
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from urllib.parse import urlencode
+
+BASE_DIR = Path(__file__).parent.parent
+
+
+def setup_django(database: str):
+    sys.path.insert(0, str(BASE_DIR))
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "pharmacy_ms.settings")
+    from pharmacy_ms import settings
+
+    settings.DATABASES["default"]["NAME"] = database
+    settings.ALLOWED_HOSTS = ["*"]
+    import django
+
+    django.setup()
+
+
+def pages() -> list[tuple[str, dict]]:
+    """Changelist URL & query parameters to open"""
+    from django.db.models import Max
+    from django.urls import reverse
+    from django.utils import timezone
+    from users.models import CustomUser, Payment, Account, LedgerEntry
+    from pharmacy.models import Medicine, Order, Inventory
+
+    def url(model) -> str:
+        return reverse(
+            f"admin:{model._meta.app_label}_{model._meta.model_name}_changelist"
+        )
+
+    medicine = Medicine.objects.order_by("-id").first()
+    customer = CustomUser.objects.filter(is_staff=False).order_by("-id").first()
+    if medicine is None or customer is None:
+        raise SystemExit("Nothing to list, seed the database first")
+    latest = timezone.localtime(
+        Order.objects.aggregate(latest=Max("created_at"))["latest"] or timezone.now()
+    )
+    year = {"created_at__year": latest.year}
+    month = {**year, "created_at__month": latest.month}
+    day = {**month, "created_at__day": latest.day}
+    return [
+        (url(Medicine), {}),
+        (url(Medicine), {"q": medicine.name[:4]}),
+        (url(Order), {}),
+        (url(Order), {"p": 100}),
+        (url(Order), {"status__exact": Order.OrderStatus.PENDING.value}),
+        (url(Order), {"medicine__id__exact": medicine.id}),
+        (url(Order), {"customer__id__exact": customer.id}),
+        (url(Order), year),
+        (url(Order), month),
+        (url(Order), day),
+        (url(Order), {"q": customer.username}),
+        (url(Inventory), {}),
+        (url(Inventory), {"medicine__id__exact": medicine.id}),
+        (url(Inventory), {"timestamp__year": latest.year}),
+        (url(Payment), {}),
+        (url(Payment), {"user__id__exact": customer.id}),
+        (url(Account), {}),
+        (url(LedgerEntry), {}),
+        (url(CustomUser), {}),
+        (url(CustomUser), {"q": customer.username}),
+        (url(CustomUser), {"date_joined__year": latest.year}),
+        (
+            reverse("admin:autocomplete"),
+            {
+                "app_label": "pharmacy",
+                "model_name": "order",
+                "field_name": "medicine",
+                "term": medicine.name[:4],
+            },
+        ),
+    ]
+
+
+def measure(repeat: int) -> list[dict]:
+    from django.db import connection
+    from django.test import Client
+    from django.test.utils import CaptureQueriesContext
+    from users.models import CustomUser
+
+    admin, _ = CustomUser.objects.get_or_create(
+        username="changelist_bench", defaults={"is_staff": True, "is_superuser": True}
+    )
+    client = Client()
+    client.force_login(admin)
+    results = []
+    for path, params in pages():
+        # Templates compile & caches fill on the first view
+        client.get(path, params)
+        times = []
+        for _ in range(repeat):
+            with CaptureQueriesContext(connection) as queries:
+                start = time.perf_counter()
+                response = client.get(path, params)
+                times.append(time.perf_counter() - start)
+            if response.status_code != 200:
+                raise SystemExit(f"{path} {params}: HTTP {response.status_code}")
+        results.append(
+            {
+                "page": f"{path}?{urlencode(params)}" if params else path,
+                "ms": statistics.median(times) * 1000,
+                "queries": len(queries),
+            }
+        )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--database",
+        default=str(BASE_DIR / "db.sqlite3"),
+        help="Database to copy for the run",
+    )
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument(
+        "--budget", type=float, default=200, help="Milliseconds a page may take"
+    )
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        database = os.path.join(directory, "db.sqlite3")
+        with sqlite3.connect(args.database) as source, sqlite3.connect(
+            database
+        ) as target:
+            source.backup(target)
+        sqlite3.connect(database).execute("PRAGMA journal_mode=DELETE").close()
+        setup_django(database)
+        results = measure(args.repeat)
+
+    print(f"{'Page':<72} {'ms':>9} {'queries':>8}")
+    for result in sorted(results, key=lambda result: result["ms"], reverse=True):
+        flag = "  SLOW" if result["ms"] > args.budget else ""
+        print(
+            f"{result['page'][:72]:<72} {result['ms']:9.1f} {result['queries']:8}{flag}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,479 @@
+"""End-to-end load test of the v1 API.
+
+Boots `api.app` against a copy of the database, in-process (HTTP over
+ASGI) or under uvicorn on localhost, and lets virtual shoppers loose on
+it: token login, catalog browsing & search, ordering, order edits and
+deletes. Reports throughput and p50/p95/p99 latency per operation and
+saves them as JSON for comparison across commits i.e
+
+    python benchmarks/load_v1.py --server uvicorn --shoppers 16 --seconds 30
+    python benchmarks/load_v1.py --baseline benchmarks/results/load_v1-3f2a1c9.json
+
+Exits with status 1 when throughput falls, or overall p95 latency rises,
+by more than `--threshold` of the baseline's.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timezone
+from decimal import Decimal
+from pathlib import Path
+
+import httpx
+
+BASE_DIR = Path(__file__).parent.parent
+
+RESULTS_DIR = BASE_DIR / "benchmarks" / "results"
+
+PASSWORD = "load-test-password"
+
+# Operation: weight, per mix
+MIXES = {
+    "shop": {
+        "login": 2,
+        "catalog": 20,
+        "catalog_next": 8,
+        "category": 8,
+        "detail": 15,
+        "search": 10,
+        "suggest": 10,
+        "order": 10,
+        "edit_order": 5,
+        "delete_order": 4,
+        "orders": 8,
+    },
+    "browse": {
+        "login": 1,
+        "catalog": 30,
+        "catalog_next": 15,
+        "category": 15,
+        "detail": 20,
+        "search": 10,
+        "suggest": 10,
+        "orders": 2,
+    },
+    "checkout": {
+        "login": 2,
+        "detail": 20,
+        "order": 40,
+        "edit_order": 15,
+        "delete_order": 13,
+        "orders": 10,
+    },
+}
+
+
+def setup_django(database: str):
+    sys.path.insert(0, str(BASE_DIR))
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "pharmacy_ms.settings")
+    from pharmacy_ms import settings
+
+    settings.DATABASES["default"]["NAME"] = database
+    import django
+
+    django.setup()
+
+
+def prepare(shoppers: int) -> dict:
+    """Shoppers with funds, and stock for them to buy"""
+    from django.db import connection
+    from users.models import CustomUser, LedgerEntry
+    from pharmacy.models import Medicine
+
+    Medicine.objects.update(stock=10**6)
+    medicines = list(Medicine.objects.values("id", "name", "category"))
+    if not medicines:
+        raise SystemExit("No medicines to load test with, add some first")
+    usernames = []
+    for index in range(shoppers):
+        username = f"load_shopper_{index}"
+        user = CustomUser.objects.filter(username=username).first()
+        if user is None:
+            # No profile picture, hence no image variants to make
+            user = CustomUser.objects.create(
+                username=username, password=PASSWORD, profile=""
+            )
+        user.account.credit(
+            Decimal(900_000) - user.account.balance,
+            LedgerEntry.EntryKind.ADJUSTMENT,
+            "Load test",
+        )
+        usernames.append(username)
+    connection.close()
+    return {
+        "usernames": usernames,
+        "medicine_ids": [medicine["id"] for medicine in medicines],
+        "categories": [category.value for category in Medicine.MedicineCategory],
+        "terms": sorted(
+            {
+                word.lower()
+                for medicine in medicines
+                for word in medicine["name"].split()
+            }
+        ),
+    }
+
+
+class Shopper:
+    def __init__(self, client, username: str, data: dict, rng: random.Random):
+        self.client = client
+        self.username = username
+        self.data = data
+        self.rng = rng
+        self.headers = {}
+        self.cursor = None
+        self.orders: list[int] = []
+
+    async def login(self):
+        response = await self.client.post(
+            "/api/v1/token", data={"username": self.username, "password": PASSWORD}
+        )
+        if response.status_code == 200:
+            token = response.json()["access_token"]
+            self.headers = {"Authorization": f"Bearer {token}"}
+        return response
+
+    async def catalog(self):
+        response = await self.client.get("/api/v1/medicine", params={"limit": 20})
+        self.cursor = response.headers.get("X-Next-Cursor")
+        return response
+
+    async def catalog_next(self):
+        if not self.cursor:
+            return await self.catalog()
+        response = await self.client.get(
+            "/api/v1/medicine", params={"limit": 20, "cursor": self.cursor}
+        )
+        self.cursor = response.headers.get("X-Next-Cursor")
+        return response
+
+    async def category(self):
+        return await self.client.get(
+            "/api/v1/medicine",
+            params={"category": self.rng.choice(self.data["categories"]), "limit": 20},
+        )
+
+    async def detail(self):
+        medicine_id = self.rng.choice(self.data["medicine_ids"])
+        return await self.client.get(f"/api/v1/medicine/{medicine_id}")
+
+    async def search(self):
+        return await self.client.get(
+            "/api/v1/medicine/search", params={"q": self.rng.choice(self.data["terms"])}
+        )
+
+    async def suggest(self):
+        term = self.rng.choice(self.data["terms"])
+        return await self.client.get(
+            "/api/v1/medicine/suggest", params={"q": term[: self.rng.randint(1, 4)]}
+        )
+
+    async def order(self):
+        medicine_id = self.rng.choice(self.data["medicine_ids"])
+        response = await self.client.post(
+            f"/api/v1/order/{medicine_id}",
+            json={"quantity": self.rng.randint(1, 3)},
+            headers={**self.headers, "Idempotency-Key": str(uuid.uuid4())},
+        )
+        if response.status_code == 200:
+            self.orders.append(response.json()["id"])
+        return response
+
+    async def edit_order(self):
+        if not self.orders:
+            return await self.order()
+        return await self.client.patch(
+            f"/api/v1/order/{self.rng.choice(self.orders)}",
+            json={"quantity": self.rng.randint(1, 3)},
+            headers=self.headers,
+        )
+
+    async def delete_order(self):
+        if not self.orders:
+            return await self.order()
+        order_id = self.orders.pop(self.rng.randrange(len(self.orders)))
+        return await self.client.delete(
+            f"/api/v1/order/{order_id}", headers=self.headers
+        )
+
+    async def orders_(self):
+        return await self.client.get(
+            "/api/v1/orders", params={"limit": 20}, headers=self.headers
+        )
+
+    async def run(self, mix: dict, deadline: float, samples: list):
+        operations = list(mix)
+        weights = list(mix.values())
+        await self.login()
+        while time.perf_counter() < deadline:
+            operation = self.rng.choices(operations, weights)[0]
+            method = getattr(self, "orders_" if operation == "orders" else operation)
+            start = time.perf_counter()
+            try:
+                status = (await method()).status_code
+            except httpx.HTTPError:
+                status = 0
+            samples.append((operation, time.perf_counter() - start, status))
+
+
+async def load(client, data: dict, mix: str, shoppers: int, seconds: float, seed):
+    """(operation, seconds, status code) of every request made, status 0
+    where no response came"""
+    samples = []
+    deadline = time.perf_counter() + seconds
+    await asyncio.gather(
+        *(
+            Shopper(client, username, data, random.Random(seed + index)).run(
+                MIXES[mix], deadline, samples
+            )
+            for index, username in enumerate(data["usernames"][:shoppers])
+        )
+    )
+    return samples
+
+
+def percentiles(timings: list[float]) -> dict:
+    """Milliseconds"""
+    if len(timings) < 2:
+        value = round(sum(timings) * 1000, 3)
+        return {"p50": value, "p95": value, "p99": value}
+    cuts = statistics.quantiles(timings, n=100)
+    return {f"p{n}": round(cuts[n - 1] * 1000, 3) for n in (50, 95, 99)}
+
+
+def failed(status: int) -> bool:
+    return not 200 <= status < 400
+
+
+def summarize(samples: list, seconds: float) -> dict:
+    operations = {}
+    for operation in sorted({operation for operation, *_ in samples}):
+        timings = [elapsed for name, elapsed, _ in samples if name == operation]
+        errors = [
+            status
+            for name, _, status in samples
+            if name == operation and failed(status)
+        ]
+        operations[operation] = {
+            "requests": len(timings),
+            "errors": len(errors),
+            "error_statuses": {
+                str(status): errors.count(status) for status in sorted(set(errors))
+            },
+            **percentiles(timings),
+        }
+    return {
+        "requests": len(samples),
+        "errors": sum(1 for *_, status in samples if failed(status)),
+        "throughput": round(len(samples) / seconds, 2),
+        "latency_ms": percentiles([elapsed for _, elapsed, _ in samples]),
+        "operations": operations,
+    }
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def serve(database: str, port: int):
+    """Runs the app under uvicorn, in this process"""
+    setup_django(database)
+    import uvicorn
+
+    uvicorn.run("api:app", host="127.0.0.1", port=port, log_level="warning")
+
+
+async def run_uvicorn(database: str, args) -> list:
+    port = free_port()
+    server = subprocess.Popen(
+        [
+            sys.executable,
+            __file__,
+            "--serve",
+            f"--database={database}",
+            f"--port={port}",
+        ]
+    )
+    try:
+        async with httpx.AsyncClient(
+            base_url=f"http://127.0.0.1:{port}",
+            timeout=60,
+            limits=httpx.Limits(max_connections=args.shoppers),
+        ) as client:
+            for _ in range(300):
+                try:
+                    await client.get("/api/metrics")
+                    break
+                except httpx.TransportError:
+                    await asyncio.sleep(0.1)
+            else:
+                raise SystemExit("Server did not start")
+            return await load(
+                client, args.data, args.mix, args.shoppers, args.seconds, args.seed
+            )
+    finally:
+        server.terminate()
+        server.wait()
+
+
+async def run_in_process(args) -> list:
+    from api import app
+
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app, raise_app_exceptions=False),
+        base_url="http://test",
+        timeout=60,
+    ) as client:
+        return await load(
+            client, args.data, args.mix, args.shoppers, args.seconds, args.seed
+        )
+
+
+def commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=BASE_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def regressions(result: dict, baseline: dict, threshold: float) -> list[str]:
+    found = []
+    if result["throughput"] < baseline["throughput"] * (1 - threshold):
+        found.append(
+            f"throughput {result['throughput']}/s vs {baseline['throughput']}/s"
+        )
+    p95, before = result["latency_ms"]["p95"], baseline["latency_ms"]["p95"]
+    if p95 > before * (1 + threshold):
+        found.append(f"p95 {p95}ms vs {before}ms")
+    return found
+
+
+def slower_operations(result: dict, baseline: dict, threshold: float) -> list[str]:
+    """Informative only, few samples per operation make for noisy p95s"""
+    found = []
+    for operation, stats in result["operations"].items():
+        before = baseline["operations"].get(operation)
+        if before and stats["p95"] > before["p95"] * (1 + threshold):
+            found.append(f"{operation} p95 {stats['p95']}ms vs {before['p95']}ms")
+    return found
+
+
+def report(result: dict):
+    print(
+        f"{'operation':<14} {'requests':>8} {'errors':>6} "
+        f"{'p50':>9} {'p95':>9} {'p99':>9}"
+    )
+    rows = [
+        *result["operations"].items(),
+        ("total", {**result, **result["latency_ms"]}),
+    ]
+    for operation, stats in rows:
+        print(
+            f"{operation:<14} {stats['requests']:>8} {stats['errors']:>6} "
+            f"{stats['p50']:>7.1f}ms {stats['p95']:>7.1f}ms {stats['p99']:>7.1f}ms"
+        )
+    print(f"Throughput {result['throughput']:.1f} requests/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--database",
+        default=str(BASE_DIR / "db.sqlite3"),
+        help="Database to copy for the run",
+    )
+    parser.add_argument(
+        "--server", choices=("in-process", "uvicorn"), default="in-process"
+    )
+    parser.add_argument("--mix", choices=MIXES, default="shop")
+    parser.add_argument("--shoppers", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--output", help="Results file, in benchmarks/results by default"
+    )
+    parser.add_argument("--baseline", help="Results file of an earlier run to compare")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="Tolerated throughput fall & p95 rise, as a fraction of the baseline",
+    )
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        return serve(args.database, args.port)
+
+    with tempfile.TemporaryDirectory() as directory:
+        database = os.path.join(directory, "db.sqlite3")
+        with sqlite3.connect(args.database) as source, sqlite3.connect(
+            database
+        ) as target:
+            source.backup(target)
+        # WAL sticks to the file, start each run from rollback journaling
+        sqlite3.connect(database).execute("PRAGMA journal_mode=DELETE").close()
+        setup_django(database)
+        args.data = prepare(args.shoppers)
+        if args.server == "uvicorn":
+            samples = asyncio.run(run_uvicorn(database, args))
+        else:
+            samples = asyncio.run(run_in_process(args))
+
+    result = {
+        "commit": commit(),
+        "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "config": {
+            "server": args.server,
+            "mix": args.mix,
+            "shoppers": args.shoppers,
+            "seconds": args.seconds,
+            "seed": args.seed,
+            "database_profile": os.environ.get("PHARMACY_DB_PROFILE", "development"),
+        },
+        **summarize(samples, args.seconds),
+    }
+    report(result)
+    output = Path(args.output or RESULTS_DIR / f"load_v1-{result['commit']}.json")
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(result, indent=2))
+    print(f"Saved to {output}")
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text())
+        if baseline["config"] != result["config"]:
+            print(f"Warning: baseline ran with {baseline['config']}")
+        slower = slower_operations(result, baseline, args.threshold)
+        if slower:
+            print("Slower operations:")
+            print("\n".join(f"  {operation}" for operation in slower))
+        found = regressions(result, baseline, args.threshold)
+        if found:
+            print(f"Regressed beyond {args.threshold:.0%} of {args.baseline}:")
+            print("\n".join(f"  {regression}" for regression in found))
+            sys.exit(1)
+        print(f"Within {args.threshold:.0%} of {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""Time request metrics add to every request.
+
+Drives a bare ASGI app, with and without `MetricsMiddleware`, straight
+from the event loop so that only the middleware's own work differs,
+and reports microseconds per request, along with the part of them
+spent recording metrics i.e
+
+    python benchmarks/metrics_overhead.py --requests 200000
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).parent.parent
+
+
+async def endpoint(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b""})
+
+
+async def drive(app, requests: int) -> float:
+    """Seconds per request"""
+
+    class Route:
+        path = "/api/v1/medicine/{medicine_id}"
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        pass
+
+    start = time.perf_counter()
+    for _ in range(requests):
+        scope = {
+            "type": "http",
+            "method": "GET",
+            "path": "/api/v1/medicine/1",
+            "root_path": "",
+            "route": Route,
+        }
+        await app(scope, receive, send)
+    return (time.perf_counter() - start) / requests
+
+
+def recording(requests: int) -> float:
+    """Seconds per request taken by the metrics calls alone"""
+    from pharmacy import metrics
+
+    stats = metrics.RequestStats()
+    start = time.perf_counter()
+    for _ in range(requests):
+        metrics.request_started("api")
+        metrics.request_finished(
+            "api", "GET", "/api/v1/medicine/{medicine_id}", 200, 0.01, stats
+        )
+    return (time.perf_counter() - start) / requests
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200_000)
+    args = parser.parse_args()
+
+    sys.path.insert(0, str(BASE_DIR))
+    from api.metrics import MetricsMiddleware
+
+    measured = MetricsMiddleware(endpoint, wsgi_mounts=("/d",))
+    # Warm up, then take the best of five runs of each
+    asyncio.run(drive(measured, 1000))
+    bare = min(asyncio.run(drive(endpoint, args.requests)) for _ in range(5))
+    with_metrics = min(asyncio.run(drive(measured, args.requests)) for _ in range(5))
+    print(f"Bare app         {bare * 1e6:8.2f} µs/request")
+    print(f"With metrics     {with_metrics * 1e6:8.2f} µs/request")
+    print(f"Overhead         {(with_metrics - bare) * 1e6:8.2f} µs/request")
+    print(f"Recording        {recording(args.requests) * 1e6:8.2f} µs/request")
+
+
+if __name__ == "__main__":
+    main()
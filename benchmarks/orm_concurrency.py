@@ -0,0 +1,202 @@
+"""Latency of v1 under concurrency, threadpool vs `API_ASYNC_ORM`.
+
+Serves `api:app` under uvicorn against a copy of the database, once per
+mode, and has 50 to 500 concurrent clients (`--clients`) list a
+customer's orders and suggest medicine names for `--seconds` each.
+Reports requests per second, p50 and p99 latency per mode and level of
+concurrency i.e
+
+    python benchmarks/orm_concurrency.py --clients 50 100 200 500 --seconds 10
+"""
+
+import argparse
+import asyncio
+import os
+import socket
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+BASE_DIR = Path(__file__).parent.parent
+
+MODES = {"threadpool": False, "async_orm": True}
+
+
+def setup_django(database: str, async_orm: bool = False):
+    sys.path.insert(0, str(BASE_DIR))
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "pharmacy_ms.settings")
+    from pharmacy_ms import settings
+
+    settings.DATABASES["default"]["NAME"] = database
+    settings.API_ASYNC_ORM = async_orm
+    import django
+
+    django.setup()
+
+
+def prepare(orders: int) -> dict:
+    """Token of a customer with `orders` orders placed, and name prefixes"""
+    from django.db import connection
+    from users.models import CustomUser
+    from pharmacy.models import Medicine, Order
+    from api.v1.utils import generate_token
+
+    medicines = list(Medicine.objects.values_list("id", "name", "price"))
+    if not medicines:
+        raise SystemExit("No medicines to order, add some first")
+    user = CustomUser.objects.filter(username="orm_concurrency_bench").first()
+    if user is None:
+        # No profile picture, hence no image variants to make
+        user = CustomUser.objects.create(
+            username="orm_concurrency_bench", profile="", token=generate_token()
+        )
+    # Listed only, hence neither paid for nor taken off stock
+    placed = []
+    for index in range(orders - user.orders.count()):
+        medicine_id, _, price = medicines[index % len(medicines)]
+        placed.append(
+            Order(
+                customer=user,
+                medicine_id=medicine_id,
+                quantity=1,
+                prescription="--",
+                total_price=price,
+            )
+        )
+    Order.objects.bulk_create(placed)
+    connection.close()
+    return {
+        "token": user.token,
+        "prefixes": sorted({name[:2].lower() for _, name, _ in medicines}),
+    }
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def serve(database: str, port: int, async_orm: bool):
+    """Runs the app under uvicorn, in this process"""
+    setup_django(database, async_orm)
+    import uvicorn
+
+    uvicorn.run("api:app", host="127.0.0.1", port=port, log_level="warning")
+
+
+async def client_loop(client, data: dict, index: int, deadline: float, timings):
+    headers = {"Authorization": f"Bearer {data['token']}"}
+    prefixes = data["prefixes"]
+    while time.perf_counter() < deadline:
+        index += 1
+        start = time.perf_counter()
+        if index % 2:
+            response = await client.get(
+                "/api/v1/orders", params={"limit": 20}, headers=headers
+            )
+        else:
+            response = await client.get(
+                "/api/v1/medicine/suggest",
+                params={"q": prefixes[index % len(prefixes)]},
+            )
+        if response.status_code != 200:
+            raise SystemExit(f"{response.url}: HTTP {response.status_code}")
+        timings.append(time.perf_counter() - start)
+
+
+async def measure(port: int, data: dict, levels: list[int], seconds: float) -> dict:
+    results = {}
+    async with httpx.AsyncClient(
+        base_url=f"http://127.0.0.1:{port}",
+        timeout=120,
+        limits=httpx.Limits(max_connections=max(levels)),
+    ) as client:
+        for _ in range(300):
+            try:
+                await client.get("/api/metrics")
+                break
+            except httpx.TransportError:
+                await asyncio.sleep(0.1)
+        else:
+            raise SystemExit("Server did not start")
+        for clients in levels:
+            timings = []
+            deadline = time.perf_counter() + seconds
+            await asyncio.gather(
+                *(
+                    client_loop(client, data, index, deadline, timings)
+                    for index in range(clients)
+                )
+            )
+            cuts = statistics.quantiles(timings, n=100)
+            results[clients] = {
+                "rps": len(timings) / seconds,
+                "p50": cuts[49] * 1000,
+                "p99": cuts[98] * 1000,
+            }
+    return results
+
+
+def run(database: str, async_orm: bool, data: dict, args) -> dict:
+    port = free_port()
+    command = [sys.executable, __file__, "--serve", f"--database={database}"]
+    command += [f"--port={port}"] + (["--async-orm"] if async_orm else [])
+    server = subprocess.Popen(command)
+    try:
+        return asyncio.run(measure(port, data, args.clients, args.seconds))
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--database",
+        default=str(BASE_DIR / "db.sqlite3"),
+        help="Database to copy for the run",
+    )
+    parser.add_argument("--clients", type=int, nargs="+", default=[50, 100, 200, 500])
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument(
+        "--orders", type=int, default=20, help="Orders placed by the customer"
+    )
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--async-orm", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        return serve(args.database, args.port, args.async_orm)
+
+    with tempfile.TemporaryDirectory() as directory:
+        database = os.path.join(directory, "db.sqlite3")
+        with sqlite3.connect(args.database) as source, sqlite3.connect(
+            database
+        ) as target:
+            source.backup(target)
+        setup_django(database)
+        data = prepare(args.orders)
+        results = {
+            mode: run(database, async_orm, data, args)
+            for mode, async_orm in MODES.items()
+        }
+
+    print(f"{'Mode':<12} {'clients':>8} {'req/s':>9} {'p50 ms':>9} {'p99 ms':>9}")
+    for mode, levels in results.items():
+        for clients, result in levels.items():
+            print(
+                f"{mode:<12} {clients:8} {result['rps']:9.1f}"
+                f" {result['p50']:9.2f} {result['p99']:9.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""Latency of medicine search & suggestions against their budget.
+
+Runs `pharmacy.search.suggest` and `search`, as the v1 routes call
+them, on a copy of the database for prefixes and words of the medicine
+names, and reports the p50 and p99 milliseconds per kind and length of
+query i.e
+
+    python manage.py seed --scale 100000 --seed 1 --orders-per-user 0
+    python benchmarks/search_latency.py --budget 10
+
+Exits with status 1 when a p99 exceeds `--budget` milliseconds.
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).parent.parent
+
+
+def setup_django(database: str):
+    sys.path.insert(0, str(BASE_DIR))
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "pharmacy_ms.settings")
+    from pharmacy_ms import settings
+
+    settings.DATABASES["default"]["NAME"] = database
+    import django
+
+    django.setup()
+
+
+def queries(names: list[str], samples: int, rng: random.Random) -> dict:
+    """Queries to time, by kind"""
+    words = [word for name in names for word in name.split() if word.isalpha()]
+    return {
+        **{
+            f"suggest {length} chars": [
+                word[:length] for word in rng.choices(words, k=samples)
+            ]
+            for length in (1, 2, 3, 4)
+        },
+        "search word": rng.choices(words, k=samples),
+        # Dropped letter, found through the trigram index
+        "search typo": [
+            word[:index] + word[index + 1 :]
+            for word in rng.choices(
+                [word for word in words if len(word) > 5], k=samples
+            )
+            for index in [rng.randrange(1, len(word) - 1)]
+        ],
+    }
+
+
+def measure(samples: int, limit: int, seed: int) -> dict:
+    from pharmacy import search
+    from pharmacy.models import Medicine
+
+    if not search.is_available():
+        raise SystemExit("No search index, run `python manage.py migrate` first")
+    total = Medicine.objects.count()
+    names = list(Medicine.objects.values_list("name", flat=True)[:10_000])
+    if not names:
+        raise SystemExit("No medicines to search, seed the database first")
+    functions = {"suggest": search.suggest, "search": search.search}
+    results = {"medicines": total}
+    for kind, terms in queries(names, samples, random.Random(seed)).items():
+        function = functions[kind.split()[0]]
+        function(terms[0], limit)  # Warm up
+        timings = []
+        for term in terms:
+            start = time.perf_counter()
+            function(term, limit)
+            timings.append(time.perf_counter() - start)
+        cuts = statistics.quantiles(timings, n=100)
+        results[kind] = {"p50": cuts[49] * 1000, "p99": cuts[98] * 1000}
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--database",
+        default=str(BASE_DIR / "db.sqlite3"),
+        help="Database to copy for the run",
+    )
+    parser.add_argument("--samples", type=int, default=200, help="Queries per kind")
+    parser.add_argument("--limit", type=int, default=10, help="Results per query")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--budget", type=float, default=10, help="Milliseconds a p99 may take"
+    )
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        database = os.path.join(directory, "db.sqlite3")
+        with sqlite3.connect(args.database) as source, sqlite3.connect(
+            database
+        ) as target:
+            source.backup(target)
+        setup_django(database)
+        results = measure(args.samples, args.limit, args.seed)
+
+    print(f"{results.pop('medicines')} medicines, {args.limit} results per query")
+    print(f"{'Query':<18} {'p50 ms':>8} {'p99 ms':>8}")
+    over = []
+    for kind, result in results.items():
+        flag = "  SLOW" if result["p99"] > args.budget else ""
+        print(f"{kind:<18} {result['p50']:8.2f} {result['p99']:8.2f}{flag}")
+        if flag:
+            over.append(kind)
+    if over:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""Bytes & latency of a cold (empty cache) load of the React app.
+
+Fetches `/` and every script, stylesheet and module preload it links,
+in-process, once per `Accept-Encoding` and reports transferred bytes
+and latency percentiles i.e
+
+    python benchmarks/spa_cold_load.py --rounds 50
+"""
+
+import argparse
+import re
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from fastapi.testclient import TestClient
+from api import app
+
+ASSET_LINK = re.compile(rb'(?:src|href)="(/[^"]+\.(?:js|css))"')
+
+ENCODINGS = ("identity", "gzip", "br, gzip")
+
+
+def cold_load(client: TestClient, encoding: str) -> tuple[int, float]:
+    """Transferred bytes & seconds taken to load the page and its assets"""
+    headers = {"Accept-Encoding": encoding}
+    start = time.perf_counter()
+    response = client.get("/", headers=headers)
+    total = int(response.headers["content-length"])
+    for path in ASSET_LINK.findall(response.content):
+        asset = client.get(path.decode(), headers=headers)
+        assert asset.status_code == 200, f"{path} - {asset.status_code}"
+        total += int(asset.headers["content-length"])
+    return total, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=20, help="Loads per encoding")
+    args = parser.parse_args()
+    client = TestClient(app)
+    print(f"{'Accept-Encoding':<16} {'bytes':>10} {'p50 ms':>8} {'p95 ms':>8}")
+    for encoding in ENCODINGS:
+        cold_load(client, encoding)  # Warm up
+        timings = []
+        for _ in range(args.rounds):
+            total, elapsed = cold_load(client, encoding)
+            timings.append(elapsed * 1000)
+        p95 = statistics.quantiles(timings, n=20)[-1] if len(timings) > 1 else 0
+        print(
+            f"{encoding:<16} {total:>10,} "
+            f"{statistics.median(timings):>8.1f} {p95:>8.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+"""Mixed read/write throughput of the SQLite database profiles.
+
+Runs the same workload, threads placing orders while others page the
+catalog, against a copy of the database once per `PHARMACY_DB_PROFILE`
+and reports operations per second, latency percentiles and "database is
+locked" failures i.e
+
+    python benchmarks/sqlite_profile.py --threads 8 --seconds 10
+"""
+
+import argparse
+import json
+import os
+import random
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).parent.parent
+
+PROFILES = ("development", "production")
+
+
+def work(database: str, threads: int, seconds: float, write_ratio: float) -> dict:
+    """Runs the workload in this process, against `database`"""
+    sys.path.insert(0, str(BASE_DIR))
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "pharmacy_ms.settings")
+    from pharmacy_ms import settings
+
+    settings.DATABASES["default"]["NAME"] = database
+    import django
+
+    django.setup()
+
+    from django.db import OperationalError, close_old_connections, connection
+    from users.models import CustomUser, Account
+    from pharmacy.models import Medicine, Order
+
+    customer, _ = CustomUser.objects.get_or_create(username="sqlite_profile_bench")
+    Account.objects.filter(pk=customer.account_id).update(balance=999_999)
+    medicine_ids = list(
+        Medicine.objects.order_by("price").values_list("id", flat=True)[:50]
+    )
+    if not medicine_ids:
+        medicine_ids = [
+            Medicine.objects.create(name="Benchmark medicine", price=1, stock=0).id
+        ]
+    Medicine.objects.filter(id__in=medicine_ids).update(stock=10**7)
+    connection.close()
+
+    deadline = time.perf_counter() + seconds
+    lock = threading.Lock()
+    results = {"reads": [], "writes": [], "locked": 0}
+
+    def run(seed: int):
+        rng = random.Random(seed)
+        reads, writes, locked = [], [], 0
+        customer_ = CustomUser.objects.select_related("account").get(pk=customer.pk)
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                if rng.random() < write_ratio:
+                    Order.checkout(customer_, [(rng.choice(medicine_ids), 1)])
+                    writes.append(time.perf_counter() - start)
+                else:
+                    list(
+                        Medicine.objects.filter(stock__gt=0)
+                        .order_by("name")
+                        .values("id", "name", "price", "stock")[:20]
+                    )
+                    Order.objects.filter(customer=customer_).count()
+                    reads.append(time.perf_counter() - start)
+            except OperationalError as e:
+                if "locked" not in str(e):
+                    raise
+                locked += 1
+            finally:
+                # What Django does at the end of each request
+                close_old_connections()
+        connection.close()
+        with lock:
+            results["reads"] += reads
+            results["writes"] += writes
+            results["locked"] += locked
+
+    workers = [threading.Thread(target=run, args=(seed,)) for seed in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return results
+
+
+def percentile(timings: list[float], n: int) -> float:
+    if len(timings) < 2:
+        return sum(timings) * 1000
+    return statistics.quantiles(timings, n=100)[n - 1] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--database",
+        default=str(BASE_DIR / "db.sqlite3"),
+        help="Database to copy for each run",
+    )
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--write-ratio", type=float, default=0.2)
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        results = work(args.database, args.threads, args.seconds, args.write_ratio)
+        print(json.dumps(results))
+        return
+
+    print(
+        f"{'profile':<12} {'ops/s':>8} {'reads/s':>8} {'writes/s':>8} "
+        f"{'read p95':>9} {'write p95':>9} {'locked':>7}"
+    )
+    for profile in PROFILES:
+        with tempfile.TemporaryDirectory() as directory:
+            database = os.path.join(directory, "db.sqlite3")
+            with sqlite3.connect(args.database) as source, sqlite3.connect(
+                database
+            ) as target:
+                source.backup(target)
+            # WAL sticks to the file, start each run from rollback journaling
+            sqlite3.connect(database).execute("PRAGMA journal_mode=DELETE").close()
+            output = subprocess.run(
+                [
+                    sys.executable,
+                    __file__,
+                    "--worker",
+                    f"--database={database}",
+                    f"--threads={args.threads}",
+                    f"--seconds={args.seconds}",
+                    f"--write-ratio={args.write_ratio}",
+                ],
+                env={**os.environ, "PHARMACY_DB_PROFILE": profile},
+                capture_output=True,
+                text=True,
+                check=True,
+            ).stdout
+            results = json.loads(output.splitlines()[-1])
+        reads, writes = results["reads"], results["writes"]
+        print(
+            f"{profile:<12} {(len(reads) + len(writes)) / args.seconds:>8.0f} "
+            f"{len(reads) / args.seconds:>8.0f} {len(writes) / args.seconds:>8.0f} "
+            f"{percentile(reads, 95):>7.1f}ms {percentile(writes, 95):>7.1f}ms "
+            f"{results['locked']:>7}"
+        )
+
+
+if __name__ == "__main__":
+    main()
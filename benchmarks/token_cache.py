@@ -0,0 +1,153 @@
+"""Requests per second of v1 token routes, with and without the user cache.
+
+Serves `api.app` in-process (HTTP over ASGI) against a copy of the
+database and lets `--clients` concurrent clients call `/v1/profile` and
+`/v1/orders` with one bearer token for `--seconds` each, first with
+`TokenUserCache` as configured, then with it holding nothing, so that
+every request looks its user up by token again i.e
+
+    python benchmarks/token_cache.py --clients 16 --seconds 10
+"""
+
+import argparse
+import asyncio
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from decimal import Decimal
+from pathlib import Path
+
+import httpx
+
+BASE_DIR = Path(__file__).parent.parent
+
+ROUTES = {
+    "profile": ("/api/v1/profile", {}),
+    "orders": ("/api/v1/orders", {"limit": 20}),
+}
+
+
+def setup_django(database: str):
+    sys.path.insert(0, str(BASE_DIR))
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "pharmacy_ms.settings")
+    from pharmacy_ms import settings
+
+    settings.DATABASES["default"]["NAME"] = database
+    import django
+
+    django.setup()
+
+
+def prepare(orders: int) -> str:
+    """Token of a customer with `orders` orders placed"""
+    from django.db import connection
+    from users.models import CustomUser, LedgerEntry
+    from pharmacy.models import Medicine, Order
+    from api.v1.utils import generate_token
+
+    medicine = Medicine.objects.order_by("id").first()
+    if medicine is None:
+        raise SystemExit("No medicines to order, add some first")
+    Medicine.objects.filter(pk=medicine.pk).update(stock=10**6)
+    user = CustomUser.objects.filter(username="token_cache_bench").first()
+    if user is None:
+        # No profile picture, hence no image variants to make
+        user = CustomUser.objects.create(
+            username="token_cache_bench", profile="", token=generate_token()
+        )
+    user.account.credit(
+        Decimal(100_000) - user.account.balance,
+        LedgerEntry.EntryKind.ADJUSTMENT,
+        "Token cache benchmark",
+    )
+    for _ in range(orders - user.orders.count()):
+        Order.objects.create(customer=user, medicine=medicine, quantity=1)
+    connection.close()
+    return user.token
+
+
+async def client_loop(client, path, params, headers, deadline, timings):
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        response = await client.get(path, params=params, headers=headers)
+        if response.status_code != 200:
+            raise SystemExit(f"{path}: HTTP {response.status_code}")
+        timings.append(time.perf_counter() - start)
+
+
+async def measure(token: str, clients: int, seconds: float, cache_size: int) -> dict:
+    from api import app
+    from api.v1.cache import user_cache
+
+    headers = {"Authorization": f"Bearer {token}"}
+    results = {}
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app), base_url="http://test", timeout=60
+    ) as client:
+        for name, (path, params) in ROUTES.items():
+            # With no room, `set` keeps nothing and every request misses
+            user_cache.max_size = cache_size
+            user_cache.clear()
+            await client.get(path, params=params, headers=headers)
+            timings = []
+            deadline = time.perf_counter() + seconds
+            await asyncio.gather(
+                *(
+                    client_loop(client, path, params, headers, deadline, timings)
+                    for _ in range(clients)
+                )
+            )
+            lookups = user_cache.hits + user_cache.misses
+            results[name] = {
+                "rps": len(timings) / seconds,
+                "p50": statistics.median(timings) * 1000,
+                "hit_rate": user_cache.hits / max(lookups, 1),
+            }
+            user_cache.hits = user_cache.misses = 0
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--database",
+        default=str(BASE_DIR / "db.sqlite3"),
+        help="Database to copy for the run",
+    )
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument(
+        "--orders", type=int, default=20, help="Orders placed by the customer"
+    )
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        database = os.path.join(directory, "db.sqlite3")
+        with sqlite3.connect(args.database) as source, sqlite3.connect(
+            database
+        ) as target:
+            source.backup(target)
+        setup_django(database)
+        token = prepare(args.orders)
+        from api.v1.cache import user_cache
+
+        size = user_cache.max_size
+        cached = asyncio.run(measure(token, args.clients, args.seconds, size))
+        uncached = asyncio.run(measure(token, args.clients, args.seconds, 0))
+
+    print(f"{'Route':<10} {'cache':>6} {'req/s':>9} {'p50 ms':>8} {'hits':>6}")
+    for name in ROUTES:
+        for label, result in (("on", cached[name]), ("off", uncached[name])):
+            print(
+                f"{name:<10} {label:>6} {result['rps']:9.1f} {result['p50']:8.2f}"
+                f" {result['hit_rate']:6.0%}"
+            )
+        gain = cached[name]["rps"] / uncached[name]["rps"] - 1
+        print(f"{name:<10} {'gain':>6} {gain:9.0%}")
+
+
+if __name__ == "__main__":
+    main()
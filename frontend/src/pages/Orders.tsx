@@ -15,8 +15,17 @@ export default function Orders() {
 
   const fetchOrders = async () => {
     try {
-      const response = await api.get('/v1/orders');
-      setOrders(response.data);
+      // Pages of 100, each advertising the next in `X-Next-Cursor`
+      const allOrders: Order[] = [];
+      let cursor: string | undefined;
+      do {
+        const response = await api.get('/v1/orders', {
+          params: { limit: 100, cursor },
+        });
+        allOrders.push(...response.data);
+        cursor = response.headers['x-next-cursor'];
+      } while (cursor);
+      setOrders(allOrders);
     } catch (error) {
       console.error('Failed to fetch orders:', error);
       toast.error('Failed to load orders');
@@ -1,7 +1,16 @@
 from django.contrib import admin
-from pharmacy.models import Medicine, Order, Inventory
+from pharmacy.models import (
+    Medicine,
+    Order,
+    Inventory,
+    InventorySnapshot,
+    DemandForecast,
+)
 from pharmacy.forms import OrderForm
+from pharmacy.cache import bump_catalog_version
+from pharmacy.changelist import AutocompleteFilter, LargeTableAdmin
 from django.utils.html import format_html
+from django.db.models import F
 
 
 # Register your models here.
@@ -17,7 +26,7 @@ class MedicineAdmin(admin.ModelAdmin):
         "created_at",
     )
     search_fields = ("name", "short_name", "category")
-    list_filter = ("category", "name", "stock", "price", "created_at")
+    list_filter = ("category", "created_at")
     ordering = ("-created_at",)
     list_editable = ("stock",)
 
@@ -29,9 +38,13 @@ class MedicineAdmin(admin.ModelAdmin):
         ("Stock & Price", {"fields": ("stock", "price")}),
     )
 
+    def delete_queryset(self, request, queryset):
+        super().delete_queryset(request, queryset)
+        bump_catalog_version()
+
 
 @admin.register(Order)
-class OrderAdmin(admin.ModelAdmin):
+class OrderAdmin(LargeTableAdmin):
     form = OrderForm
     list_display = (
         "customer",
@@ -42,8 +55,15 @@ class OrderAdmin(admin.ModelAdmin):
         "created_at",
         "updated_at",
     )
-    search_fields = ("customer__username", "medicine__name", "status")
-    list_filter = ("status", "medicine", "customer", "created_at")
+    search_fields = ("customer__username", "medicine__name")
+    list_filter = (
+        "status",
+        ("medicine", AutocompleteFilter),
+        ("customer", AutocompleteFilter),
+        "created_at",
+    )
+    list_select_related = ("customer", "medicine")
+    date_hierarchy = "created_at"
     ordering = ("-created_at",)
     fieldsets = (
         (None, {"fields": ("customer",)}),
@@ -78,13 +98,86 @@ class OrderAdmin(admin.ModelAdmin):
 
 
 @admin.register(Inventory)
-class InventoryAdmin(admin.ModelAdmin):
+class InventoryAdmin(LargeTableAdmin):
     list_display = ("medicine", "change", "reason", "timestamp")
-    search_fields = ("medicine", "reason")
+    search_fields = ("medicine__name", "reason")
     list_filter = (
-        "medicine",
-        "medicine__stock",
+        ("medicine", AutocompleteFilter),
         "reason",
         "timestamp",
     )
+    list_select_related = ("medicine",)
+    date_hierarchy = "timestamp"
     ordering = ("-timestamp",)
+
+
+@admin.register(InventorySnapshot)
+class InventorySnapshotAdmin(LargeTableAdmin):
+    list_display = ("medicine", "stock", "as_of", "created_at")
+    search_fields = ("medicine__name",)
+    list_filter = ("as_of",)
+    list_select_related = ("medicine",)
+    ordering = ("-as_of",)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+class LowStockFilter(admin.SimpleListFilter):
+    title = "Stock level"
+    parameter_name = "low_stock"
+
+    def lookups(self, request, model_admin):
+        return (("yes", "At or below reorder point"), ("no", "Above reorder point"))
+
+    def queryset(self, request, queryset):
+        if self.value() == "yes":
+            return queryset.filter(medicine__stock__lte=F("reorder_point"))
+        if self.value() == "no":
+            return queryset.filter(medicine__stock__gt=F("reorder_point"))
+
+
+@admin.register(DemandForecast)
+class DemandForecastAdmin(admin.ModelAdmin):
+    list_display = (
+        "medicine",
+        "stock",
+        "reorder_point",
+        "suggested_quantity",
+        "daily_demand",
+        "days_observed",
+        "updated_at",
+    )
+    search_fields = ("medicine__name", "medicine__short_name")
+    list_filter = (LowStockFilter, "medicine__category")
+    list_select_related = ("medicine",)
+    ordering = ("medicine__stock",)
+
+    def stock(self, obj):
+        color = "red" if obj.is_low else "green"
+        return format_html(
+            '<span style="color: {};">{}</span>', color, obj.medicine.stock
+        )
+
+    stock.short_description = "Stock"
+    stock.admin_order_field = "medicine__stock"
+
+    def daily_demand(self, obj):
+        return round(obj.demand, 2)
+
+    daily_demand.short_description = "Daily demand"
+    daily_demand.admin_order_field = "demand"
+
+    def suggested_quantity(self, obj):
+        return obj.suggested_quantity
+
+    suggested_quantity.short_description = "Suggested quantity"
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
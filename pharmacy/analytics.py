@@ -0,0 +1,239 @@
+"""Sales analytics for staff.
+
+Orders are aggregated per day in a single pass with NumPy and each
+day's aggregate (a bucket) is cached under `pharmacy.cache.sales_day_key`.
+Reports over a period combine the cached buckets, so only days not seen
+before, or changed since, touch the orders table.
+"""
+
+import numpy as np
+from datetime import date, datetime, time, timedelta
+from django.core.cache import cache
+from django.db.models import FloatField
+from django.db.models.functions import Cast
+from django.utils import timezone
+from users.models import CustomUser
+from pharmacy.models import Medicine, Order
+from pharmacy.cache import sales_day_key
+from pharmacy_ms.settings import ANALYTICS_CACHE_TTL, ANALYTICS_TODAY_CACHE_TTL
+
+CHUNK_SIZE = 10_000
+
+MAX_DAYS = 366
+
+CATEGORIES = [category.value for category in Medicine.MedicineCategory]
+
+# Admin stores choice names, the API values
+CATEGORY_INDEX = {
+    **{category.name: i for i, category in enumerate(Medicine.MedicineCategory)},
+    **{category.value: i for i, category in enumerate(Medicine.MedicineCategory)},
+}
+
+
+def local_midnight(day: date) -> datetime:
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def aggregate_day(day: date) -> dict[str, np.ndarray]:
+    """Units, revenue and orders per medicine plus distinct customers
+    of a day"""
+    rows = (
+        Order.objects.filter(
+            created_at__gte=local_midnight(day),
+            created_at__lt=local_midnight(day + timedelta(days=1)),
+        )
+        .annotate(revenue=Cast("total_price", FloatField()))
+        .values_list("medicine_id", "customer_id", "quantity", "revenue")
+        .order_by()
+    )
+    columns = np.array(
+        list(rows.iterator(chunk_size=CHUNK_SIZE)), dtype=np.float64
+    ).reshape(-1, 4)
+    np.nan_to_num(columns, copy=False)
+    medicine_ids, medicines = np.unique(
+        columns[:, 0].astype(np.int64), return_inverse=True
+    )
+    size = len(medicine_ids)
+    return {
+        "medicine": medicine_ids,
+        "quantity": np.bincount(medicines, weights=columns[:, 2], minlength=size),
+        "revenue": np.bincount(medicines, weights=columns[:, 3], minlength=size),
+        "orders": np.bincount(medicines, minlength=size).astype(np.float64),
+        "customer": np.unique(columns[:, 1].astype(np.int64)),
+    }
+
+
+def daily_buckets(start: date, end: date) -> list[tuple[date, dict]]:
+    """Buckets of each day from `start` to `end` inclusive"""
+    days = (end - start).days + 1
+    if days < 1:
+        raise ValueError("Start date must not be later than end date.")
+    if days > MAX_DAYS:
+        raise ValueError(f"Period must not exceed {MAX_DAYS} days.")
+    days = [start + timedelta(days=n) for n in range(days)]
+    cached = cache.get_many([sales_day_key(day) for day in days])
+    today = timezone.localdate()
+    buckets = []
+    for day in days:
+        bucket = cached.get(sales_day_key(day))
+        if bucket is None:
+            bucket = aggregate_day(day)
+            if day < today:
+                cache.set(sales_day_key(day), bucket, ANALYTICS_CACHE_TTL)
+            elif day == today:
+                cache.set(sales_day_key(day), bucket, ANALYTICS_TODAY_CACHE_TTL)
+        buckets.append((day, bucket))
+    return buckets
+
+
+def combine(buckets: list[dict]) -> dict[str, np.ndarray]:
+    """Sums per medicine figures of several buckets"""
+    medicine_ids, medicines = np.unique(
+        np.concatenate([bucket["medicine"] for bucket in buckets]),
+        return_inverse=True,
+    )
+    return {
+        "medicine": medicine_ids,
+        **{
+            field: np.bincount(
+                medicines,
+                weights=np.concatenate([bucket[field] for bucket in buckets]),
+                minlength=len(medicine_ids),
+            )
+            for field in ("quantity", "revenue", "orders")
+        },
+    }
+
+
+def top_sellers(start: date, end: date, limit: int, by: str = "quantity") -> list:
+    """Best selling medicines of the period by units sold or revenue"""
+    sales = combine([bucket for day, bucket in daily_buckets(start, end)])
+    top = np.argsort(-sales[by], kind="stable")[:limit]
+    names = dict(
+        Medicine.objects.filter(id__in=sales["medicine"][top].tolist()).values_list(
+            "id", "name"
+        )
+    )
+    return [
+        {
+            "medicine_id": int(sales["medicine"][i]),
+            "name": names.get(int(sales["medicine"][i]), ""),
+            "quantity": int(sales["quantity"][i]),
+            "revenue": round(float(sales["revenue"][i]), 2),
+            "orders": int(sales["orders"][i]),
+        }
+        for i in top
+    ]
+
+
+def revenue_by_category(start: date, end: date, period: str = "day") -> list:
+    """Revenue per medicine category of each day or week (from Monday)"""
+    buckets = daily_buckets(start, end)
+    catalog = list(Medicine.objects.values_list("id", "category"))
+    other = CATEGORY_INDEX[Medicine.MedicineCategory.OTHER.value]
+    size = max(
+        [id for id, category in catalog]
+        + [int(bucket["medicine"].max(initial=0)) for day, bucket in buckets],
+        default=0,
+    )
+    category_of = np.full(size + 1, other, dtype=np.int64)
+    for id, category in catalog:
+        category_of[id] = CATEGORY_INDEX.get(category, other)
+
+    periods: dict[date, np.ndarray] = {}
+    for day, bucket in buckets:
+        key = day - timedelta(days=day.weekday()) if period == "week" else day
+        revenue = np.bincount(
+            category_of[bucket["medicine"]],
+            weights=bucket["revenue"],
+            minlength=len(CATEGORIES),
+        )
+        periods[key] = periods.get(key, 0) + revenue
+    return [
+        {
+            "period": key,
+            "revenue": dict(zip(CATEGORIES, np.round(revenue, 2).tolist())),
+            "total": round(float(revenue.sum()), 2),
+        }
+        for key, revenue in periods.items()
+    ]
+
+
+def sales_velocity(start: date, end: date, limit: int) -> list:
+    """Units sold per day of each medicine and days its stock would last"""
+    days = (end - start).days + 1
+    sales = combine([bucket for day, bucket in daily_buckets(start, end)])
+    catalog = list(Medicine.objects.order_by("id").values_list("id", "name", "stock"))
+    ids = np.array([id for id, name, stock in catalog], dtype=np.int64)
+    sold = np.zeros(len(ids))
+    # Medicines deleted since are ignored
+    positions = np.searchsorted(ids, sales["medicine"])
+    found = positions < len(ids)
+    found[found] = ids[positions[found]] == sales["medicine"][found]
+    sold[positions[found]] = sales["quantity"][found]
+    velocity = sold / days
+    fastest = np.argsort(-velocity, kind="stable")[:limit]
+    return [
+        {
+            "medicine_id": catalog[i][0],
+            "name": catalog[i][1],
+            "units_per_day": round(float(velocity[i]), 3),
+            "stock": catalog[i][2],
+            "days_of_stock": (
+                round(catalog[i][2] / float(velocity[i]), 1) if velocity[i] else None
+            ),
+        }
+        for i in fastest
+    ]
+
+
+def customer_cohorts(start: date, end: date) -> list:
+    """Customers grouped by month joined, with how many of them ordered in
+    each month from then on up to `end`.
+
+    Cohorts are whole months, orders are counted from `start` on only.
+    """
+    first_month = start.year * 12 + start.month - 1
+    months = end.year * 12 + end.month - first_month
+    customers = (
+        CustomUser.objects.filter(
+            is_staff=False,
+            date_joined__gte=local_midnight(start.replace(day=1)),
+            date_joined__lt=local_midnight(end + timedelta(days=1)),
+        )
+        .order_by("id")
+        .values_list("id", "date_joined")
+    )
+    ids, cohort_of = [], []
+    for id, date_joined in customers.iterator(chunk_size=CHUNK_SIZE):
+        date_joined = timezone.localtime(date_joined)
+        ids.append(id)
+        cohort_of.append(date_joined.year * 12 + date_joined.month - 1 - first_month)
+    ids = np.array(ids, dtype=np.int64)
+    cohort_of = np.array(cohort_of, dtype=np.int64)
+    sizes = np.bincount(cohort_of, minlength=months)
+
+    # active[cohort, month] customers of cohort who ordered in month
+    active = np.zeros((months, months), dtype=np.int64)
+    buckets = daily_buckets(start, end)
+    for month in range(months):
+        customer_ids = [
+            bucket["customer"]
+            for day, bucket in buckets
+            if day.year * 12 + day.month - 1 - first_month == month
+        ]
+        customer_ids = np.unique(np.concatenate(customer_ids))
+        positions = np.searchsorted(ids, customer_ids)
+        found = positions < len(ids)
+        found[found] = ids[positions[found]] == customer_ids[found]
+        active[:, month] = np.bincount(cohort_of[positions[found]], minlength=months)
+    return [
+        {
+            "cohort": date(
+                (first_month + cohort) // 12, (first_month + cohort) % 12 + 1, 1
+            ),
+            "customers": int(sizes[cohort]),
+            "active": active[cohort, cohort:].tolist(),
+        }
+        for cohort in range(months)
+    ]
@@ -1,6 +1,16 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_migrate, post_save
 
 
 class PharmacyConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "pharmacy"
+
+    def ready(self):
+        from pharmacy import search, images, metrics
+
+        post_migrate.connect(search.install, sender=self)
+        post_save.connect(images.schedule_variants, sender="pharmacy.Medicine")
+        post_save.connect(images.schedule_variants, sender="users.CustomUser")
+        connection_created.connect(metrics.install_query_recorder)
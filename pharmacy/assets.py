@@ -0,0 +1,112 @@
+"""Precompressed static & frontend assets.
+
+`precompress` writes `.br` and `.gz` siblings of compressible files, so
+that servers pick the smallest encoding a client accepts without
+compressing on every request. It also lists the fingerprinted files it
+finds in `MANIFEST`, the only ones servers may cache for good. Run it
+after `collectstatic` and after building the frontend (see
+`precompress_assets` command).
+"""
+
+import gzip
+import json
+import os
+import re
+from pathlib import Path
+
+import brotli
+
+COMPRESSIBLE = {
+    ".css",
+    ".html",
+    ".js",
+    ".json",
+    ".map",
+    ".mjs",
+    ".svg",
+    ".txt",
+    ".xml",
+    ".ico",
+    ".webmanifest",
+}
+
+# Smaller files gain less than the headers they cost
+MIN_SIZE = 512  # bytes
+
+# `Cart-BChxL--6.js` (Vite) or `base.3f2a1c9d8e7b.css` (Django manifest)
+FINGERPRINTED = re.compile(r"(-(?=[\w-]{0,7}[0-9A-Z])[\w-]{8}|\.[0-9a-f]{12})\.\w+$")
+
+ENCODINGS = {
+    # Content-Encoding: file suffix, in order of preference
+    "br": ".br",
+    "gzip": ".gz",
+}
+
+# Fingerprinted files under a precompressed directory, relative to it
+MANIFEST = "precompressed.json"
+
+
+def is_fingerprinted(name: str) -> bool:
+    """Whether the file name carries a content hash, hence never changes"""
+    return FINGERPRINTED.search(name) is not None
+
+
+def compress(data: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(data, quality=11)
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+def read_manifest(directory: Path) -> frozenset[str]:
+    """Fingerprinted files `precompress` listed under `directory`"""
+    try:
+        return frozenset(json.loads(Path(directory, MANIFEST).read_bytes()))
+    except (OSError, ValueError):
+        return frozenset()
+
+
+def precompress(directory: Path, force: bool = False) -> tuple[int, int, int]:
+    """Writes compressed siblings of compressible files under `directory`
+    and lists its fingerprinted files in `MANIFEST`.
+
+    Siblings newer than their source are left alone, as are those that
+    would not be smaller. Returns files seen, siblings written and bytes
+    saved.
+    """
+    seen = written = saved = 0
+    fingerprinted = []
+    for root, directories, files in os.walk(directory):
+        for name in files:
+            source = Path(root, name)
+            if is_fingerprinted(name):
+                fingerprinted.append(source.relative_to(directory).as_posix())
+            if source.suffix not in COMPRESSIBLE or source.name == MANIFEST:
+                continue
+            stat = source.stat()
+            if stat.st_size < MIN_SIZE:
+                continue
+            seen += 1
+            data = None
+            for encoding in ENCODINGS:
+                target = source.with_name(name + ENCODINGS[encoding])
+                if (
+                    not force
+                    and target.exists()
+                    and target.stat().st_mtime >= stat.st_mtime
+                ):
+                    continue
+                data = data or source.read_bytes()
+                compressed = compress(data, encoding)
+                if len(compressed) >= len(data):
+                    target.unlink(missing_ok=True)
+                    continue
+                temporary = target.with_name(f".{target.name}.tmp")
+                temporary.write_bytes(compressed)
+                os.replace(temporary, target)
+                written += 1
+                saved += len(data) - len(compressed)
+    manifest = Path(directory, MANIFEST)
+    temporary = manifest.with_name(f".{manifest.name}.tmp")
+    temporary.write_text(json.dumps(sorted(fingerprinted), indent=0))
+    os.replace(temporary, manifest)
+    return seen, written, saved
@@ -0,0 +1,61 @@
+"""Catalog version stamp & sales analytics buckets.
+
+Any change to what shoppers see in the catalog (medicine details or
+stock) bumps the stamp, which invalidates everything derived from it
+e.g API ETags and cached pages. Kept in the database (`CatalogVersion`),
+so every process reads the same stamp whatever `CACHES` points at.
+"""
+
+import time
+from datetime import date, datetime
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+CATALOG_VERSION_ID = 1
+
+
+def _seed() -> int:
+    """Creates the stamp row, if missing, and returns its version"""
+    from pharmacy.models import CatalogVersion
+
+    # Time based so stamps never repeat after the row is lost
+    version, _ = CatalogVersion.objects.get_or_create(
+        pk=CATALOG_VERSION_ID, defaults={"version": time.time_ns()}
+    )
+    return version.version
+
+
+def catalog_version() -> int:
+    """Current stamp, one primary key lookup"""
+    from pharmacy.models import CatalogVersion
+
+    version = (
+        CatalogVersion.objects.filter(pk=CATALOG_VERSION_ID)
+        .values_list("version", flat=True)
+        .first()
+    )
+    return _seed() if version is None else version
+
+
+def bump_catalog_version():
+    """Marks catalog as changed, committed or rolled back along with the
+    current transaction"""
+    from pharmacy.models import CatalogVersion
+
+    if not CatalogVersion.objects.filter(pk=CATALOG_VERSION_ID).update(
+        version=F("version") + 1
+    ):
+        _seed()
+
+
+def sales_day_key(day: date) -> str:
+    return f"pharmacy:sales:{day.isoformat()}"
+
+
+def forget_sales_day(when: datetime):
+    """Drops the cached sales aggregate of the day `when` falls on once
+    the current transaction commits"""
+    key = sales_day_key(timezone.localdate(when))
+    transaction.on_commit(lambda: cache.delete(key))
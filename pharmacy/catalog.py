@@ -0,0 +1,229 @@
+"""Bulk catalog import & export.
+
+Records are streamed in chunks, so memory use does not grow with the
+file. Each chunk is upserted by medicine name in a few queries and the
+matching `Inventory` rows (initial stock for new medicines, stock
+updates for existing ones) are written in bulk alongside.
+
+`Medicine.save` is bypassed, hence the catalog version is bumped once
+per import instead of once per medicine.
+"""
+
+import csv
+import json
+from dataclasses import dataclass
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+from typing import Iterable, Iterator, TextIO
+from django.db import connection, transaction, IntegrityError
+from django.utils import timezone
+from pharmacy.models import Medicine, Inventory
+from pharmacy.cache import bump_catalog_version
+from pharmacy.exceptions import CatalogImportError
+
+FIELDS = ("name", "short_name", "category", "description", "price", "stock")
+
+REQUIRED_FIELDS = ("name", "price")
+
+CHUNK_SIZE = 5_000
+
+# Admin stores choice names, the API values
+CATEGORIES = {
+    **{category.name.lower(): category.value for category in Medicine.MedicineCategory},
+    **{
+        category.value.lower(): category.value for category in Medicine.MedicineCategory
+    },
+}
+
+
+@dataclass
+class ImportStats:
+    rows: int = 0
+    created: int = 0
+    updated: int = 0
+    inventories: int = 0
+
+
+def read_csv(file: TextIO) -> Iterator[dict]:
+    yield from csv.DictReader(file)
+
+
+def read_jsonl(file: TextIO) -> Iterator[dict]:
+    record = 0
+    for number, line in enumerate(file, start=1):
+        if not line.strip():
+            continue
+        record += 1
+        try:
+            value = json.loads(line)
+        except json.JSONDecodeError as e:
+            raise CatalogImportError(f"Record {record} (line {number}): {e}")
+        if not isinstance(value, dict):
+            raise CatalogImportError(
+                f"Record {record} (line {number}): expected an object, "
+                f"not {type(value).__name__}"
+            )
+        yield value
+
+
+def write_csv(file: TextIO, rows: Iterable[tuple]):
+    writer = csv.writer(file)
+    writer.writerow(FIELDS)
+    writer.writerows(rows)
+
+
+def write_jsonl(file: TextIO, rows: Iterable[tuple]):
+    for row in rows:
+        file.write(json.dumps(dict(zip(FIELDS, row))) + "\n")
+
+
+READERS = {"csv": read_csv, "jsonl": read_jsonl}
+
+WRITERS = {"csv": write_csv, "jsonl": write_jsonl}
+
+
+def clean(record: dict, line: int) -> dict:
+    """Validated medicine fields of a record. Blank fields are left out."""
+    cleaned = {
+        field: record[field]
+        for field in FIELDS
+        if field in record and record[field] not in (None, "")
+    }
+    try:
+        for field in REQUIRED_FIELDS:
+            if field not in cleaned:
+                raise CatalogImportError(f"{field} is required")
+        cleaned["name"] = str(cleaned["name"]).strip()
+        cleaned["price"] = Decimal(str(cleaned["price"])).quantize(Decimal("0.01"))
+        if cleaned["price"] < 0:
+            raise CatalogImportError("price must not be negative")
+        if "short_name" in cleaned:
+            cleaned["short_name"] = str(cleaned["short_name"]).strip() or None
+        if "category" in cleaned:
+            category = CATEGORIES.get(str(cleaned["category"]).strip().lower())
+            if category is None:
+                raise CatalogImportError(f"unknown category {cleaned['category']!r}")
+            cleaned["category"] = category
+        if "stock" in cleaned:
+            cleaned["stock"] = int(cleaned["stock"])
+            if cleaned["stock"] < 0:
+                raise CatalogImportError("stock must not be negative")
+    except (CatalogImportError, InvalidOperation, ValueError, TypeError) as e:
+        raise CatalogImportError(f"Record {line}: {e or 'invalid value'}")
+    return cleaned
+
+
+def chunks(records: Iterable[dict], size: int) -> Iterator[list[tuple[int, dict]]]:
+    records = enumerate(records, start=1)
+    while chunk := list(islice(records, size)):
+        yield chunk
+
+
+def import_chunk(records: list[dict], stats: ImportStats):
+    """Upserts medicines of `records` and logs their stock changes.
+
+    Fields missing from a record keep their current value, or the
+    default for new medicines.
+    """
+    # Last record of a name wins
+    records = list({record["name"]: record for record in records}.values())
+    with transaction.atomic():
+        existing = {
+            row[1]: row
+            for row in Medicine.objects.filter(
+                name__in=[record["name"] for record in records]
+            ).values_list("id", *FIELDS)
+        }
+        now = timezone.now()
+        medicines, inventories = [], []
+        for record in records:
+            current = existing.get(record["name"])
+            if current is None:
+                fields = {"description": "", "stock": 0, **record}
+                change = fields["stock"]
+                reason = Inventory.ChangeReason.INITIAL_STOCK.value
+            else:
+                fields = {**dict(zip(FIELDS, current[1:])), **record}
+                change = fields["stock"] - current[-1]
+                reason = Inventory.ChangeReason.STOCK_UPDATE.value
+            medicines.append(Medicine(created_at=now, updated_at=now, **fields))
+            if change:
+                inventories.append((record["name"], change, reason))
+
+        update_fields = [field for field in FIELDS if field != "name"]
+        update_fields.append("updated_at")
+        if connection.features.supports_update_conflicts_with_target:
+            Medicine.objects.bulk_create(
+                medicines,
+                update_conflicts=True,
+                unique_fields=["name"],
+                update_fields=update_fields,
+            )
+        else:
+            for medicine in medicines:
+                medicine.id = existing.get(medicine.name, (None,))[0]
+            Medicine.objects.bulk_create(
+                [medicine for medicine in medicines if medicine.id is None]
+            )
+            Medicine.objects.bulk_update(
+                [medicine for medicine in medicines if medicine.name in existing],
+                fields=update_fields,
+            )
+        ids = {name: row[0] for name, row in existing.items()}
+        ids.update(
+            Medicine.objects.filter(
+                name__in=[name for name, change, reason in inventories]
+            )
+            .exclude(name__in=ids)
+            .values_list("name", "id")
+        )
+        Inventory.objects.bulk_create(
+            Inventory(medicine_id=ids[name], change=change, reason=reason)
+            for name, change, reason in inventories
+        )
+    stats.rows += len(records)
+    stats.created += len(records) - len(existing)
+    stats.updated += len(existing)
+    stats.inventories += len(inventories)
+
+
+def import_catalog(
+    file: TextIO, format: str, chunk_size: int = CHUNK_SIZE
+) -> ImportStats:
+    """Upserts medicines from a CSV/JSONL file, chunk by chunk.
+
+    A chunk is saved whole or not at all; chunks before an invalid
+    record stay saved.
+    """
+    stats = ImportStats()
+    try:
+        for chunk in chunks(READERS[format](file), chunk_size):
+            records = [clean(record, line) for line, record in chunk]
+            try:
+                import_chunk(records, stats)
+            except IntegrityError as e:
+                raise CatalogImportError(
+                    f"Records {chunk[0][0]}-{chunk[-1][0]}: {e}"
+                ) from e
+    finally:
+        if stats.rows:
+            bump_catalog_version()
+    return stats
+
+
+def export_catalog(file: TextIO, format: str, chunk_size: int = CHUNK_SIZE) -> int:
+    """Writes medicines to a CSV/JSONL file. Returns total exported."""
+    total = 0
+
+    def rows():
+        nonlocal total
+        for name, short_name, category, description, price, stock in (
+            Medicine.objects.order_by("id")
+            .values_list(*FIELDS)
+            .iterator(chunk_size=chunk_size)
+        ):
+            total += 1
+            yield name, short_name, category, description, str(price), stock
+
+    WRITERS[format](file, rows())
+    return total
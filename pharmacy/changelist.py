@@ -0,0 +1,226 @@
+"""Admin changelists of tables with millions of rows.
+
+Django's changelists cost a walk of the table, or worse, per page view:
+related field filters list every row of the related table, `COUNT(*)`
+runs twice and the date hierarchy truncates the date of every row.
+`LargeTableAdmin` and `AutocompleteFilter` keep each of them to index
+searches.
+"""
+
+from datetime import date, datetime, timedelta
+from django.contrib import admin
+from django.contrib.admin.utils import get_model_from_relation, lookup_spawns_duplicates
+from django.core.paginator import Paginator
+from django.db.models import Max, Min, Q
+from django.db.models.constants import LOOKUP_SEP
+from django.utils import timezone
+from django.utils.functional import cached_property
+from django.utils.text import smart_split, unescape_string_literal
+from pharmacy_ms.settings import USE_TZ
+
+
+# Lookup by `search_fields` prefix, as in `ModelAdmin.get_search_results`
+SEARCH_LOOKUPS = {"^": "istartswith", "=": "iexact", "@": "search"}
+
+
+class AutocompleteFilter(admin.RelatedFieldListFilter):
+    """`RelatedFieldListFilter` picking the related object by autocomplete.
+
+    Renders only the chosen object, the rest are looked up as typed from
+    the admin's autocomplete view, by the `search_fields` of the related
+    model's admin. Filters on foreign keys of the changelist's model only.
+    """
+
+    template = "admin/autocomplete_filter.html"
+
+    def __init__(self, field, request, params, model, model_admin, field_path):
+        super().__init__(field, request, params, model, model_admin, field_path)
+        # Source of the autocomplete view's queries
+        self.app_label = model._meta.app_label
+        self.model_name = model._meta.model_name
+        self.field_name = field_path
+
+    def has_output(self):
+        return True
+
+    def field_choices(self, field, request, model_admin):
+        if not self.lookup_val:
+            return []
+        related = get_model_from_relation(field)
+        return [
+            (instance.pk, str(instance))
+            for instance in related._default_manager.filter(pk__in=self.lookup_val)
+        ]
+
+
+class EstimatedCountPaginator(Paginator):
+    """`Paginator` estimating the count of a whole table from its ids.
+
+    Unfiltered, the count is the largest id, the last entry of the primary
+    key, rather than `COUNT(*)` of every row. Rows deleted since make it an
+    overestimate, the last pages may then come out short or empty.
+    Filtered lists are counted.
+    """
+
+    @cached_property
+    def count(self) -> int:
+        query = self.object_list.query
+        if query.where or query.distinct:
+            return super().count
+        return self.object_list.order_by().aggregate(last=Max("pk"))["last"] or 0
+
+
+class DatePeriods:
+    """Stands in for `cl.queryset` in Django's `date_hierarchy` tag.
+
+    Finds the years, months or days holding rows by looking up a row in
+    each, a search of the index on the date field, instead of truncating
+    the date of every row.
+    """
+
+    def __init__(self, queryset):
+        self.queryset = queryset
+        self.aggregates = {}
+
+    def aggregate(self, **kwargs):
+        return {
+            name: self.aggregated(name, aggregate) for name, aggregate in kwargs.items()
+        }
+
+    def aggregated(self, name: str, aggregate):
+        # A query each, SQLite reads the MIN or MAX of an index off its end
+        # only when it is the one aggregate of the query. The tag and
+        # `periods` both want the first & last dates, queried once.
+        key = (name, repr(aggregate))
+        if key not in self.aggregates:
+            self.aggregates[key] = self.queryset.aggregate(**{name: aggregate})[name]
+        return self.aggregates[key]
+
+    def dates(self, field_name: str, kind: str) -> list[date]:
+        return self.periods(field_name, kind, aware=False)
+
+    def datetimes(self, field_name: str, kind: str) -> list[datetime]:
+        return self.periods(field_name, kind, aware=True)
+
+    def exists(self, field_name: str, lower, upper) -> bool:
+        """Whether rows fall in [`lower`, `upper`)"""
+        # Of several bounds on a column, SQLite searches the index by the
+        # first, hence the period's must come before those of the filters
+        period = self.queryset.model._default_manager.filter(
+            **{f"{field_name}__gte": lower, f"{field_name}__lt": upper}
+        )
+        if self.queryset.query.distinct:
+            period = period.distinct()
+        return (period & self.queryset).exists()
+
+    def periods(self, field_name: str, kind: str, aware: bool) -> list:
+        bounds = self.aggregate(first=Min(field_name), last=Max(field_name))
+        if bounds["first"] is None:
+            return []
+        first, last = bounds["first"], bounds["last"]
+        if aware:
+            first, last = local_date(first), local_date(last)
+
+        periods = []
+        start = truncate(first, kind)
+        while start <= last:
+            end = following(start, kind)
+            lower, upper = (
+                (as_datetime(start), as_datetime(end)) if aware else (start, end)
+            )
+            if self.exists(field_name, lower, upper):
+                periods.append(lower)
+            start = end
+        return periods
+
+
+def truncate(day: date, kind: str) -> date:
+    if kind == "year":
+        return day.replace(month=1, day=1)
+    if kind == "month":
+        return day.replace(day=1)
+    return day
+
+
+def following(start: date, kind: str) -> date:
+    """Start of the period after the `kind` starting on `start`"""
+    if kind == "year":
+        return start.replace(year=start.year + 1)
+    if kind == "month":
+        return (start + timedelta(days=31)).replace(day=1)
+    return start + timedelta(days=1)
+
+
+def local_date(moment: datetime) -> date:
+    if timezone.is_aware(moment):
+        moment = timezone.localtime(moment)
+    return moment.date()
+
+
+def as_datetime(day: date) -> datetime:
+    """Midnight starting `day`, in the current time zone with `USE_TZ`"""
+    midnight = datetime(day.year, day.month, day.day)
+    return timezone.make_aware(midnight) if USE_TZ else midnight
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """`ModelAdmin` whose changelist stays fast at millions of rows.
+
+    - Counts are estimated when unfiltered, and not repeated for the
+      whole table when filtered (`show_full_result_count`).
+    - The date hierarchy looks up rows per period, see `DatePeriods`;
+      `date_hierarchy` should be an indexed field.
+    - `AutocompleteFilter` filters work in the sidebar.
+
+    - Search fields across relations are searched in the related table,
+      see `get_search_results`.
+
+    Filter on related fields with `AutocompleteFilter` & select related
+    objects shown per row in `list_select_related`.
+    """
+
+    change_list_template = "admin/large_table_change_list.html"
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    class Media:
+        js = ("pharmacy/js/autocomplete_filter.js",)
+
+    def get_search_results(self, request, queryset, search_term):
+        """Searches fields across relations in the related table.
+
+        `customer__username` is searched as `customer__in` the customers
+        whose username matches: the customers are walked once and this
+        table searched by its index on `customer`, rather than each row
+        joined to its customer and matched.
+        """
+        search_fields = self.get_search_fields(request)
+        if not (search_fields and search_term):
+            return queryset, False
+        lookups = [
+            (
+                *search_field.lstrip("^=@").partition(LOOKUP_SEP)[::2],
+                SEARCH_LOOKUPS.get(search_field[0], "icontains"),
+            )
+            for search_field in search_fields
+        ]
+        for bit in smart_split(search_term):
+            if bit.startswith(('"', "'")) and bit[0] == bit[-1]:
+                bit = unescape_string_literal(bit)
+            matches = Q()
+            for relation, field, lookup in lookups:
+                if not field:
+                    matches |= Q(**{f"{relation}__{lookup}": bit})
+                    continue
+                related = get_model_from_relation(self.opts.get_field(relation))
+                matching = related._default_manager.filter(
+                    **{f"{field}__{lookup}": bit}
+                )
+                matches |= Q(**{f"{relation}__in": matching.values("pk")})
+            queryset = queryset.filter(matches)
+        may_have_duplicates = any(
+            lookup_spawns_duplicates(self.opts, relation)
+            for relation, field, _ in lookups
+            if field
+        )
+        return queryset, may_have_duplicates
@@ -5,3 +5,12 @@ class PharmacyException(Exception):
 class InsufficientBalanceError(PharmacyException):
     """Raised when placing order while customer
     does not have enough funds"""
+
+
+class InsufficientStockError(PharmacyException, ValueError):
+    """Raised when ordering more than the medicine
+    stock available"""
+
+
+class CatalogImportError(PharmacyException, ValueError):
+    """Raised when a catalog file has an invalid record"""
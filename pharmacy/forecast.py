@@ -0,0 +1,188 @@
+"""Demand forecasts & reorder points.
+
+Daily sales of each medicine are read from the inventory log (sale and
+order quantity update rows) and folded into an exponentially smoothed
+demand and variance, a chunk of medicines at a time with NumPy. A day is
+folded once it is over; sales of the current day are accumulated until
+then.
+
+Each run resumes after the last inventory entry processed, so the log
+is read only once. Run it periodically (see `forecast_demand` command)
+from a single process at a time.
+"""
+
+import numpy as np
+from collections import defaultdict
+from datetime import date, datetime
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+from pharmacy.models import DemandForecast, Inventory, Medicine
+from pharmacy_ms.settings import FORECAST_SMOOTHING, REORDER_LEAD_TIME_DAYS
+
+CHUNK_SIZE = 10_000  # Inventory entries fetched at a time
+
+# Medicines forecast at a time, their sales a float per day each
+MEDICINES_PER_CHUNK = 1_000
+
+SALE_REASONS = (
+    Inventory.ChangeReason.INITIAL_SALE.value,
+    Inventory.ChangeReason.ORDER_QUANTITY_UPDATE.value,
+)
+
+
+def smooth(
+    sales: np.ndarray,
+    demand: np.ndarray,
+    variance: np.ndarray,
+    days_observed: np.ndarray,
+    start: np.ndarray,
+    alpha: float = FORECAST_SMOOTHING,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Folds `sales` (medicines x days) into demand, variance & days
+    observed of each medicine, from its `start` column on.
+
+    Medicines without observations take their first day as demand.
+    """
+    for day, column in enumerate(sales.T):
+        joined = start <= day
+        first = joined & (days_observed == 0)
+        error = column - demand
+        demand = np.where(joined, demand + alpha * error, demand)
+        demand = np.where(first, column, demand)
+        variance = np.where(
+            joined, (1 - alpha) * (variance + alpha * error**2), variance
+        )
+        variance = np.where(first, 0, variance)
+        days_observed = days_observed + joined
+    return demand, variance, days_observed
+
+
+def reorder_points(demand: np.ndarray, variance: np.ndarray) -> np.ndarray:
+    """Demand over lead time plus safety stock, rounded up"""
+    # Returns outnumbering sales make for negative demand
+    demand = np.maximum(demand, 0)
+    return np.ceil(
+        demand * REORDER_LEAD_TIME_DAYS + DemandForecast.safety_stock(variance)
+    ).astype(np.int64)
+
+
+def update_forecasts(today: date = None) -> int:
+    """Folds sales logged since the previous run into the forecasts.
+    Returns total forecasts updated."""
+    today = today or timezone.localdate()
+    last_id = (
+        DemandForecast.objects.aggregate(last_id=Max("last_inventory_id"))["last_id"]
+        or 0
+    )
+    # Units sold per medicine and day, summed as the log streams by
+    sold: dict[int, dict[date, int]] = defaultdict(lambda: defaultdict(int))
+    entries = (
+        Inventory.objects.filter(id__gt=last_id, reason__in=SALE_REASONS)
+        .order_by("id")
+        .values_list("id", "medicine_id", "change", "timestamp")
+        .iterator(chunk_size=CHUNK_SIZE)
+    )
+    for last_id, medicine_id, change, timestamp in entries:
+        # Sales are logged as negative stock changes
+        sold[medicine_id][timezone.localdate(timestamp)] -= change
+
+    new, updated = [], []
+    after = 0
+    while True:
+        medicines = list(
+            Medicine.objects.filter(id__gt=after)
+            .order_by("id")
+            .values_list("id", "created_at")[:MEDICINES_PER_CHUNK]
+        )
+        if not medicines:
+            break
+        after = medicines[-1][0]
+        rows = forecast_chunk(medicines, sold, last_id, today)
+        new += [row for row in rows if not row.pk]
+        updated += [row for row in rows if row.pk]
+
+    # Resumed from the largest `last_inventory_id`, so all chunks are
+    # written or none, in one transaction holding the write lock briefly
+    with transaction.atomic():
+        DemandForecast.objects.bulk_create(new, batch_size=1000)
+        DemandForecast.objects.bulk_update(
+            updated,
+            fields=[
+                "demand",
+                "variance",
+                "reorder_point",
+                "days_observed",
+                "open_day",
+                "open_day_sales",
+                "last_inventory_id",
+                "updated_at",
+            ],
+            batch_size=1000,
+        )
+    return len(new) + len(updated)
+
+
+def forecast_chunk(
+    medicines: list[tuple[int, datetime]],
+    sold: dict[int, dict[date, int]],
+    last_id: int,
+    today: date,
+) -> list[DemandForecast]:
+    """Forecasts of `medicines` (id, created_at) with `sold` folded in,
+    unsaved"""
+    forecasts = {
+        forecast.medicine_id: forecast
+        for forecast in DemandForecast.objects.filter(
+            medicine_id__in=[id for id, created_at in medicines]
+        )
+    }
+    # New medicines are observed from the day they were added
+    new = [
+        DemandForecast(
+            medicine_id=id,
+            open_day=min(
+                [timezone.localdate(created_at), today] + list(sold.get(id, ()))
+            ),
+        )
+        for id, created_at in medicines
+        if id not in forecasts
+    ]
+    forecasts.update({forecast.medicine_id: forecast for forecast in new})
+    rows = [forecasts[id] for id, created_at in medicines]
+    open_day = min(
+        [row.open_day for row in rows]
+        + [day for row in rows for day in sold.get(row.medicine_id, ())]
+    )
+
+    # Units sold per medicine (row) and day (column) from `open_day` on
+    days = (today - open_day).days + 1
+    sales = np.zeros((len(rows), days))
+    offsets = np.array([(row.open_day - open_day).days for row in rows])
+    sales[np.arange(len(rows)), offsets] = [row.open_day_sales for row in rows]
+    for i, row in enumerate(rows):
+        for day, units in sold.get(row.medicine_id, {}).items():
+            # Sales logged late fall on the open day
+            sales[i, min(max((day - open_day).days, offsets[i]), days - 1)] += units
+
+    # Days before today are over
+    demand, variance, days_observed = smooth(
+        sales[:, :-1],
+        np.array([row.demand for row in rows]),
+        np.array([row.variance for row in rows]),
+        np.array([row.days_observed for row in rows]),
+        offsets,
+    )
+    points = reorder_points(demand, variance)
+
+    now = timezone.now()
+    for i, row in enumerate(rows):
+        row.demand = float(demand[i])
+        row.variance = float(variance[i])
+        row.reorder_point = int(points[i])
+        row.days_observed = int(days_observed[i])
+        row.open_day = today
+        row.open_day_sales = int(sales[i, -1])
+        row.last_inventory_id = last_id
+        row.updated_at = now
+    return rows
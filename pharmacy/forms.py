@@ -45,10 +45,5 @@ class OrderForm(forms.ModelForm):
                     f"Customer's account balance is less by Ksh.{(total_price - initial_total_price) - user.account.balance} "
                     "to place this order."
                 )
-            # Refund customer if total_price has reduced
-            if total_price < initial_total_price:
-                refund_amount = initial_total_price - total_price
-                user.account.balance += refund_amount
-                user.account.save()
 
         return quantity
@@ -0,0 +1,160 @@
+"""Resized variants of uploaded images.
+
+Each original under `MEDIA_ROOT` gets a WebP and a JPEG copy per width
+in `IMAGE_VARIANT_WIDTHS`, stored next to it i.e
+`medicine/aspirin_1.jpg` -> `medicine/aspirin_1.320w.webp`.
+Originals narrower than a width are not upscaled.
+
+Resizing runs in a process pool once the upload is committed, so it
+neither holds up the request nor competes with it for the GIL. The
+widths made are then recorded on the model (`picture_variants`,
+`profile_variants`) as `{name: widths}`, which API models turn into
+`srcset` strings without touching the file system.
+"""
+
+import logging
+import multiprocessing
+import os
+from concurrent.futures import Future, ProcessPoolExecutor
+from functools import lru_cache
+from pathlib import Path
+from PIL import Image, ImageOps
+from django.db import connection, transaction
+from pharmacy.cache import bump_catalog_version
+from pharmacy_ms.settings import (
+    MEDIA_ROOT,
+    MEDIA_URL,
+    IMAGE_VARIANT_WIDTHS,
+    IMAGE_VARIANT_WORKERS,
+)
+
+logger = logging.getLogger(__name__)
+
+FORMATS = {
+    # mime type: (extension, Pillow format, save options)
+    "image/webp": ("webp", "WEBP", {"quality": 80, "method": 4}),
+    "image/jpeg": (
+        "jpg",
+        "JPEG",
+        {"quality": 80, "optimize": True, "progressive": True},
+    ),
+}
+
+
+def variant_name(name: str, width: int, extension: str) -> str:
+    root, _ = os.path.splitext(name)
+    return f"{root}.{width}w.{extension}"
+
+
+def make_variants(name: str, force: bool = False) -> tuple[list[int], int]:
+    """Writes missing variants of media file `name`. Returns the widths
+    it has variants of and the total written.
+
+    Runs in pool workers, hence touches nothing but the file system.
+    """
+    source = Path(MEDIA_ROOT, name)
+    widths, written = [], 0
+    with Image.open(source) as image:
+        image = ImageOps.exif_transpose(image)
+        for width in IMAGE_VARIANT_WIDTHS:
+            if width > image.width:
+                continue
+            height = max(round(image.height * width / image.width), 1)
+            resized = None
+            for extension, format, options in FORMATS.values():
+                target = Path(MEDIA_ROOT, variant_name(name, width, extension))
+                if target.exists() and not force:
+                    continue
+                if resized is None:
+                    resized = image.resize((width, height), Image.LANCZOS)
+                output = resized
+                if format == "JPEG" and output.mode != "RGB":
+                    output = output.convert("RGB")
+                elif output.mode not in ("RGB", "RGBA"):
+                    output = output.convert("RGBA")
+                # Readers never see half written files
+                temporary = target.with_name(f".{target.name}.{os.getpid()}.tmp")
+                output.save(temporary, format, **options)
+                os.replace(temporary, target)
+                written += 1
+            widths.append(width)
+    return widths, written
+
+
+def srcset(name: str | None, variants: dict | None) -> dict[str, str]:
+    """`srcset` per mime type of media file `name`, given its recorded
+    `variants`"""
+    widths = (variants or {}).get(name) if name else None
+    if not widths:
+        return {}
+    return {
+        mime_type: ", ".join(
+            f"{MEDIA_URL}{variant_name(name, width, extension)} {width}w"
+            for width in widths
+        )
+        for mime_type, (extension, format, options) in FORMATS.items()
+    }
+
+
+@lru_cache(maxsize=None)
+def pool() -> ProcessPoolExecutor:
+    # Forking a threaded server is unsafe, workers start afresh instead
+    return ProcessPoolExecutor(
+        max_workers=IMAGE_VARIANT_WORKERS,
+        mp_context=multiprocessing.get_context("spawn"),
+    )
+
+
+def has_variants(name: str, variants: dict | None) -> bool:
+    return bool(name) and name in (variants or {})
+
+
+def record_variants(name: str, widths: list[int]):
+    """Records `widths` as the variants of media file `name` wherever used"""
+    from pharmacy.models import Medicine
+    from users.models import CustomUser
+
+    variants = {name: widths}
+    # Default pictures are shared, rows recorded already are left alone
+    Medicine.objects.filter(picture=name).exclude(picture_variants=variants).update(
+        picture_variants=variants
+    )
+    # Saved one by one, user caches listen for it. Leaves `profile` as is
+    for user in CustomUser.objects.filter(profile=name).exclude(
+        profile_variants=variants
+    ):
+        user.profile_variants = variants
+        user.save(update_fields=["profile_variants"])
+
+
+def submit(name: str, force: bool = False) -> Future:
+    future = pool().submit(make_variants, name, force)
+    future.add_done_callback(lambda future: variants_made(name, future))
+    return future
+
+
+def variants_made(name: str, future: Future):
+    try:
+        widths, _ = future.result()
+    except Exception as e:
+        logger.warning(f"Image variants of {name} not made - {e}")
+        return
+    # Cached catalog pages list variants recorded back then. Runs on the
+    # pool's callback thread, whose connection is of no further use
+    try:
+        with transaction.atomic():
+            record_variants(name, widths)
+            bump_catalog_version()
+    finally:
+        connection.close()
+
+
+def schedule_variants(sender, instance, created=False, update_fields=None, **kwargs):
+    """`post_save` receiver queuing variants of a newly uploaded image"""
+    field = {"Medicine": "picture", "CustomUser": "profile"}[sender.__name__]
+    if update_fields is not None and field not in update_fields:
+        # e.g a login or stock change, the image is as it was
+        return
+    name = getattr(instance, field).name
+    if name and not has_variants(name, getattr(instance, f"{field}_variants")):
+        transaction.on_commit(lambda: submit(name))
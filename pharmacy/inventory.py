@@ -0,0 +1,86 @@
+"""Stock-at-time queries over the inventory log.
+
+`Inventory` only records changes, so stock at time T is the sum of all
+changes up to T. `take_snapshots` periodically checkpoints these sums
+per medicine, so that a query only adds the rows logged after the
+nearest checkpoint, however long the log grows.
+"""
+
+from datetime import datetime
+from django.db import transaction
+from django.db.models import Max, OuterRef, Subquery, Sum
+from pharmacy.models import Inventory, InventorySnapshot
+
+
+def take_snapshots() -> int:
+    """Checkpoints stock of medicines whose inventory changed since the
+    previous run. Returns total checkpoints written."""
+    last_entry = Inventory.objects.order_by("-id").values("id", "timestamp").first()
+    if last_entry is None:
+        return 0
+    previous_id = (
+        InventorySnapshot.objects.aggregate(last_id=Max("last_inventory_id"))["last_id"]
+        or 0
+    )
+    if previous_id >= last_entry["id"]:
+        return 0
+
+    latest_stock = Subquery(
+        InventorySnapshot.objects.filter(medicine=OuterRef("medicine"))
+        .order_by("-as_of")
+        .values("stock")[:1]
+    )
+    changes = (
+        Inventory.objects.filter(id__gt=previous_id, id__lte=last_entry["id"])
+        .values("medicine")
+        .annotate(change=Sum("change"), previous_stock=latest_stock)
+        .order_by()
+    )
+    snapshots = [
+        InventorySnapshot(
+            medicine_id=row["medicine"],
+            stock=(row["previous_stock"] or 0) + row["change"],
+            last_inventory_id=last_entry["id"],
+            as_of=last_entry["timestamp"],
+        )
+        for row in changes.iterator()
+    ]
+    with transaction.atomic():
+        InventorySnapshot.objects.bulk_create(snapshots, batch_size=1000)
+    return len(snapshots)
+
+
+def stock_at(medicine_id: int, when: datetime) -> int:
+    """Stock of a medicine at `when` as per the inventory log"""
+    snapshot = (
+        InventorySnapshot.objects.filter(medicine_id=medicine_id, as_of__lte=when)
+        .order_by("-as_of")
+        .values("stock", "last_inventory_id")
+        .first()
+    ) or {"stock": 0, "last_inventory_id": 0}
+    tail = Inventory.objects.filter(
+        medicine_id=medicine_id,
+        id__gt=snapshot["last_inventory_id"],
+        timestamp__lte=when,
+    ).aggregate(change=Sum("change"))["change"]
+    return snapshot["stock"] + (tail or 0)
+
+
+def stock_history(
+    medicine_id: int, start: datetime, end: datetime
+) -> list[tuple[datetime, int]]:
+    """Stock of a medicine at `start` followed by its level after each
+    inventory change up to `end`"""
+    stock = stock_at(medicine_id, start)
+    history = [(start, stock)]
+    changes = (
+        Inventory.objects.filter(
+            medicine_id=medicine_id, timestamp__gt=start, timestamp__lte=end
+        )
+        .order_by("timestamp", "id")
+        .values_list("timestamp", "change")
+    )
+    for timestamp, change in changes.iterator():
+        stock += change
+        history.append((timestamp, stock))
+    return history
@@ -0,0 +1,69 @@
+import sys
+import time
+from pathlib import Path
+from django.core.management.base import BaseCommand, CommandError
+from pharmacy.catalog import import_catalog, export_catalog, READERS, CHUNK_SIZE
+from pharmacy.exceptions import CatalogImportError
+
+
+class Command(BaseCommand):
+    help = (
+        "Imports (upserts by name) or exports medicines as CSV/JSONL. "
+        "Columns: name, short_name, category, description, price, stock."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("action", choices=["import", "export"])
+        parser.add_argument("path", help="File path, '-' for stdin/stdout")
+        parser.add_argument(
+            "--format",
+            choices=list(READERS),
+            help="File format, guessed from the file extension by default",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=CHUNK_SIZE,
+            help="Records per transaction/query batch",
+        )
+
+    def handle(self, *args, action, path, format, chunk_size, **options):
+        format = format or Path(path).suffix.lstrip(".").lower()
+        if format not in READERS:
+            raise CommandError("Specify --format as either csv or jsonl")
+        started = time.perf_counter()
+        if action == "import":
+            file = (
+                sys.stdin if path == "-" else open(path, newline="", encoding="utf-8")
+            )
+            try:
+                stats = import_catalog(file, format, chunk_size)
+            except CatalogImportError as e:
+                raise CommandError(str(e))
+            finally:
+                if file is not sys.stdin:
+                    file.close()
+            message = (
+                f"{stats.rows} medicines imported ({stats.created} created, "
+                f"{stats.updated} updated), {stats.inventories} inventory entries"
+            )
+            total = stats.rows
+        else:
+            file = (
+                sys.stdout
+                if path == "-"
+                else open(path, "w", newline="", encoding="utf-8")
+            )
+            try:
+                total = export_catalog(file, format, chunk_size)
+            finally:
+                if file is not sys.stdout:
+                    file.close()
+            message = f"{total} medicines exported"
+        elapsed = time.perf_counter() - started
+        # Keep stdout clean for exports piped elsewhere
+        self.stderr.write(
+            self.style.SUCCESS(
+                f"{message} in {elapsed:.2f}s ({total / elapsed:,.0f} rows/s)"
+            )
+        )
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from pharmacy.forecast import update_forecasts
+
+
+class Command(BaseCommand):
+    help = (
+        "Updates demand forecasts & reorder points with sales logged since "
+        "the previous run. Schedule it (e.g cron) at least once a day."
+    )
+
+    def handle(self, *args, **options):
+        total = update_forecasts()
+        self.stdout.write(self.style.SUCCESS(f"{total} demand forecasts updated"))
@@ -0,0 +1,48 @@
+from concurrent.futures import as_completed
+from django.core.management.base import BaseCommand
+from users.models import CustomUser
+from pharmacy.models import Medicine
+from pharmacy import images
+
+
+class Command(BaseCommand):
+    help = (
+        "Creates resized WebP/JPEG variants of existing medicine pictures "
+        "and profile pictures in a process pool, and records them."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--force", action="store_true", help="Recreate existing variants too"
+        )
+
+    def handle(self, *args, force, **options):
+        names = set(
+            Medicine.objects.exclude(picture="").values_list("picture", flat=True)
+        )
+        names.update(
+            CustomUser.objects.exclude(profile="")
+            .exclude(profile=None)
+            .values_list("profile", flat=True)
+        )
+        futures = {
+            images.pool().submit(images.make_variants, name, force): name
+            for name in names
+        }
+        written = failed = 0
+        for future in as_completed(futures):
+            try:
+                widths, count = future.result()
+            except Exception as e:
+                failed += 1
+                self.stderr.write(f"{futures[future]} - {e}")
+                continue
+            images.record_variants(futures[future], widths)
+            written += count
+        images.bump_catalog_version()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{written} variants written for {len(names) - failed} images"
+                + (f", {failed} failed" if failed else "")
+            )
+        )
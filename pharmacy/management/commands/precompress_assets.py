@@ -0,0 +1,37 @@
+from pathlib import Path
+from django.core.management.base import BaseCommand
+from pharmacy import assets
+from pharmacy_ms.settings import FRONTEND_DIR, STATIC_ROOT
+
+
+class Command(BaseCommand):
+    help = (
+        "Writes gzip and brotli compressed copies of static and frontend "
+        "assets, to be served in place of the originals, and lists "
+        "fingerprinted ones to be cached for good. "
+        "Run after collectstatic and frontend builds."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "directories",
+            nargs="*",
+            type=Path,
+            help="Directories to compress, defaults to frontend and static root",
+        )
+        parser.add_argument(
+            "--force", action="store_true", help="Recompress up to date files too"
+        )
+
+    def handle(self, *args, directories, force, **options):
+        for directory in directories or [FRONTEND_DIR, STATIC_ROOT]:
+            if not directory or not Path(directory).is_dir():
+                self.stderr.write(f"Skipping {directory} - not a directory")
+                continue
+            seen, written, saved = assets.precompress(directory, force)
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"{directory}: {written} compressed files written for "
+                    f"{seen} assets, {saved / 1024:.1f} KiB saved"
+                )
+            )
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from pharmacy.models import IdempotencyKey
+
+
+class Command(BaseCommand):
+    help = (
+        "Deletes Idempotency-Keys whose responses are no longer replayed. "
+        "Schedule it (e.g cron) to keep their table small."
+    )
+
+    def handle(self, *args, **options):
+        total, _ = IdempotencyKey.objects.filter(expires_at__lt=timezone.now()).delete()
+        self.stdout.write(self.style.SUCCESS(f"{total} idempotency keys purged"))
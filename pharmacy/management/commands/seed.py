@@ -0,0 +1,54 @@
+from datetime import datetime, time
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from pharmacy.seed import PASSWORD, seed as seed_database
+
+
+class Command(BaseCommand):
+    help = (
+        "Fills the database with SCALE medicines and users, their orders, "
+        "payments, ledger and inventory. Same seed, same data."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--scale", type=int, required=True, help="Medicines & users to create"
+        )
+        parser.add_argument("--seed", type=int, default=0, help="Random seed")
+        parser.add_argument(
+            "--orders-per-user",
+            type=int,
+            default=10,
+            help="Orders to create, on average, per user",
+        )
+        parser.add_argument(
+            "--days", type=int, default=365, help="Days the orders span"
+        )
+        parser.add_argument(
+            "--end",
+            type=datetime.fromisoformat,
+            help="Date the orders run up to (YYYY-MM-DD), today by default",
+        )
+
+    def handle(self, *args, scale, seed, orders_per_user, days, end, **options):
+        if end is not None:
+            end = timezone.make_aware(datetime.combine(end.date(), time()))
+        started = timezone.now()
+        totals = seed_database(
+            scale,
+            seed,
+            orders_per_user,
+            days,
+            end,
+            log=lambda message: self.stdout.write(f"{message}..."),
+        )
+        elapsed = (timezone.now() - started).total_seconds()
+        self.stdout.write(
+            ", ".join(f"{total} {name}" for name, total in totals.items())
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Seeded in {elapsed:.0f}s. Users log in with password "
+                f"'{PASSWORD}'. Run snapshot_inventory & forecast_demand next."
+            )
+        )
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from pharmacy.inventory import take_snapshots
+
+
+class Command(BaseCommand):
+    help = (
+        "Checkpoints per-medicine stock from the inventory log. "
+        "Schedule it (e.g cron) to keep stock-at-time queries cheap."
+    )
+
+    def handle(self, *args, **options):
+        total = take_snapshots()
+        self.stdout.write(self.style.SUCCESS(f"{total} inventory snapshots taken"))
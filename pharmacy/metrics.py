@@ -0,0 +1,284 @@
+"""In-process request metrics, exposed in Prometheus text format.
+
+The ASGI middleware (see `api/metrics.py`) opens a `RequestStats` per
+request in a context variable. Context variables follow the request
+into threadpool workers, `sync_to_async` and the WSGI-mounted Django,
+so database queries are attributed to the request that made them, and
+Django reports the URL pattern it resolved for use as the route label.
+
+Metrics live in this process only. Scrape every worker process when
+running several.
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+# Seconds, Prometheus client defaults
+LATENCY_BUCKETS = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.075,
+    0.1,
+    0.25,
+    0.5,
+    0.75,
+    1,
+    2.5,
+    5,
+    7.5,
+    10,
+)
+
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", r"\\").replace('"', r"\"").replace("\n", r"\n")
+
+
+def _labels(names: tuple[str, ...], values: tuple, **extra) -> str:
+    pairs = [*zip(names, values), *extra.items()]
+    if not pairs:
+        return ""
+    return (
+        "{" + ",".join(f'{name}="{_escape(str(value))}"' for name, value in pairs) + "}"
+    )
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    type = ""
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._series: dict[tuple, object] = {}
+        self._lock = threading.Lock()
+
+    def samples(self):
+        """(suffix, label values, extra labels, value) of each sample"""
+        raise NotImplementedError
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        for suffix, values, extra, value in self.samples():
+            lines.append(
+                f"{self.name}{suffix}{_labels(self.labels, values, **extra)} "
+                f"{_number(value)}"
+            )
+        return lines
+
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            self._inc(amount, labels)
+
+    def _inc(self, amount: float, labels: tuple):
+        self._series[labels] = self._series.get(labels, 0) + amount
+
+    def dec(self, *labels, amount: float = 1):
+        self.inc(*labels, amount=-amount)
+
+    def set(self, value: float, *labels):
+        with self._lock:
+            self._series[labels] = value
+
+    def samples(self):
+        with self._lock:
+            series = list(self._series.items())
+        return [("", labels, {}, value) for labels, value in sorted(series)]
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, *labels):
+        with self._lock:
+            self._observe(value, labels)
+
+    def _observe(self, value: float, labels: tuple):
+        series = self.series(labels)
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def series(self, labels: tuple) -> list:
+        """Count per bucket, the last for +Inf, then the sum, of `labels`.
+        Updated in place, callers may hold on to it."""
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0]
+        return series
+
+    def samples(self):
+        with self._lock:
+            series = [(labels, list(counts)) for labels, counts in self._series.items()]
+        samples = []
+        for labels, counts in sorted(series):
+            total = 0
+            for bound, count in zip((*self.buckets, float("inf")), counts):
+                total += count
+                samples.append(("_bucket", labels, {"le": _number(bound)}, total))
+            samples.append(("_sum", labels, {}, counts[-1]))
+            samples.append(("_count", labels, {}, total))
+        return samples
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: list[Metric] = []
+
+    def register(self, metric: Metric) -> Metric:
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        return (
+            "\n".join(line for metric in self.metrics for line in metric.render())
+            + "\n"
+        )
+
+
+registry = Registry()
+
+requests_in_flight = registry.register(
+    Gauge("http_requests_in_flight", "Requests being served", ("app",))
+)
+
+request_duration = registry.register(
+    Histogram(
+        "http_request_duration_seconds",
+        "Time taken to serve requests",
+        ("method", "route", "status"),
+    )
+)
+
+request_db_queries = registry.register(
+    Histogram(
+        "http_request_db_queries",
+        "Database queries made per request",
+        ("method", "route"),
+        QUERY_COUNT_BUCKETS,
+    )
+)
+
+request_db_duration = registry.register(
+    Histogram(
+        "http_request_db_duration_seconds",
+        "Time spent on database queries per request",
+        ("method", "route"),
+    )
+)
+
+threadpool_threads = registry.register(
+    Gauge(
+        "threadpool_threads",
+        "Worker threads serving sync endpoints and Django, busy or limit",
+        ("state",),
+    )
+)
+
+threadpool_waiting = registry.register(
+    Gauge("threadpool_waiting", "Calls queued for a worker thread")
+)
+
+
+class RequestStats:
+    __slots__ = ("queries", "db_time", "route", "profile")
+
+    def __init__(self, profile=None):
+        self.queries = 0
+        self.db_time = 0.0
+        self.route: str | None = None
+        # `pharmacy.profiler.QueryProfile` when profiling SQL
+        self.profile = profile
+
+
+current_request: ContextVar[RequestStats | None] = ContextVar(
+    "current_request", default=None
+)
+
+
+# Requests are recorded from the event loop thread, with no other thread
+# writing these metrics, hence without taking the lock
+
+
+def request_started(app: str):
+    requests_in_flight._inc(1, (app,))
+
+
+# Histogram series per (method, route, status), looked up once per
+# request rather than once per histogram
+_request_series: dict[tuple, tuple[list, list, list]] = {}
+
+
+def request_finished(
+    app: str, method: str, route: str, status: int, duration: float, stats
+):
+    requests_in_flight._inc(-1, (app,))
+    labels = (method, route, status)
+    series = _request_series.get(labels)
+    if series is None:
+        series = _request_series[labels] = (
+            request_duration.series(labels),
+            request_db_queries.series(labels[:2]),
+            request_db_duration.series(labels[:2]),
+        )
+    durations, queries, db_durations = series
+    durations[bisect_left(request_duration.buckets, duration)] += 1
+    durations[-1] += duration
+    queries[bisect_left(request_db_queries.buckets, stats.queries)] += 1
+    queries[-1] += stats.queries
+    db_durations[bisect_left(request_db_duration.buckets, stats.db_time)] += 1
+    db_durations[-1] += stats.db_time
+
+
+def record_query(execute, sql, params, many, context):
+    """Execute wrapper counting queries of the current request"""
+    stats = current_request.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - start
+        stats.db_time += elapsed
+        stats.queries += 1
+        if stats.profile is not None:
+            stats.profile.add(sql, elapsed)
+
+
+def install_query_recorder(sender, connection, **kwargs):
+    """`connection_created` receiver"""
+    connection.execute_wrappers.append(record_query)
+
+
+def route_middleware(get_response):
+    """Django middleware reporting the URL pattern served, `None` when
+    no pattern matched"""
+
+    def middleware(request):
+        response = get_response(request)
+        stats = current_request.get()
+        if stats is not None and request.resolver_match is not None:
+            stats.route = request.resolver_match.route
+        return response
+
+    return middleware
@@ -0,0 +1,238 @@
+# Generated by Django 5.1.5 on 2026-10-18 01:31
+
+import django.db.models.deletion
+import pharmacy.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = []
+
+    operations = [
+        migrations.CreateModel(
+            name="Medicine",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "name",
+                    models.CharField(
+                        help_text="Full name of the medicine",
+                        max_length=255,
+                        unique=True,
+                        verbose_name="Medicine Name",
+                    ),
+                ),
+                (
+                    "short_name",
+                    models.CharField(
+                        blank=True,
+                        help_text="Abbreviated name for the medicine",
+                        max_length=20,
+                        null=True,
+                        unique=True,
+                        verbose_name="Abbreviated name",
+                    ),
+                ),
+                (
+                    "category",
+                    models.CharField(
+                        choices=[
+                            ("ANTIBIOTICS", "Antibiotics"),
+                            ("PAIN_RELIEF", "Pain Relief"),
+                            ("FIRST_AID", "First Aid"),
+                            ("VITAMINS", "Vitamins"),
+                            ("SUPPLEMENTS", "Supplements"),
+                            ("COUGH_SYRUP", "Cough Syrup"),
+                            ("OTHER", "Other"),
+                        ],
+                        default="Other",
+                        help_text="Select the category of the medicine",
+                        max_length=50,
+                        verbose_name="Category",
+                    ),
+                ),
+                (
+                    "description",
+                    models.TextField(
+                        help_text="Provide a detailed description of the medicine",
+                        verbose_name="Description",
+                    ),
+                ),
+                (
+                    "price",
+                    models.DecimalField(
+                        decimal_places=2,
+                        help_text="Enter the price of the medicine in Kenyan Shillings",
+                        max_digits=10,
+                        verbose_name="Price in Ksh",
+                    ),
+                ),
+                (
+                    "stock",
+                    models.PositiveIntegerField(
+                        help_text="Enter the current stock level of the medicine",
+                        verbose_name="Stock Level",
+                    ),
+                ),
+                (
+                    "picture",
+                    models.ImageField(
+                        blank=True,
+                        default="default/ai-generated-medicine.jpg",
+                        help_text="Upload a photo of the medicine",
+                        upload_to=pharmacy.models.generate_document_filepath,
+                        verbose_name="Photo of the medicine",
+                    ),
+                ),
+                (
+                    "created_at",
+                    models.DateTimeField(
+                        auto_now_add=True,
+                        help_text="The date and time when the medicine was created",
+                        verbose_name="Created At",
+                    ),
+                ),
+                (
+                    "updated_at",
+                    models.DateTimeField(
+                        auto_now=True,
+                        help_text="The date and time when the medicine was last updated",
+                        verbose_name="Updated At",
+                    ),
+                ),
+            ],
+        ),
+        migrations.CreateModel(
+            name="Order",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "quantity",
+                    models.PositiveIntegerField(
+                        help_text="Enter the quantity of medicine ordered",
+                        verbose_name="Quantity",
+                    ),
+                ),
+                (
+                    "prescription",
+                    models.TextField(help_text="Enter the prescription details"),
+                ),
+                (
+                    "total_price",
+                    models.DecimalField(
+                        blank=True,
+                        decimal_places=2,
+                        help_text="Enter the total price of the order",
+                        max_digits=10,
+                        null=True,
+                        verbose_name="Total Price",
+                    ),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("PENDING", "Pending"),
+                            ("PROCESSED", "Processed"),
+                            ("DELIVERED", "Delivered"),
+                        ],
+                        default="Pending",
+                        help_text="Select the current status of the order",
+                        max_length=50,
+                        verbose_name="Status",
+                    ),
+                ),
+                (
+                    "created_at",
+                    models.DateTimeField(
+                        auto_now_add=True,
+                        help_text="The date and time when the order was created",
+                        verbose_name="Created At",
+                    ),
+                ),
+                (
+                    "updated_at",
+                    models.DateTimeField(
+                        auto_now=True,
+                        help_text="The date and time when the order was last updated",
+                        verbose_name="Updated At",
+                    ),
+                ),
+            ],
+        ),
+        migrations.CreateModel(
+            name="Inventory",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "change",
+                    models.IntegerField(
+                        help_text="Enter the change in stock level",
+                        verbose_name="Change in Stock",
+                    ),
+                ),
+                (
+                    "reason",
+                    models.CharField(
+                        choices=[
+                            ("Initial stock", "INITIAL_STOCK"),
+                            ("Stock update", "STOCK_UPDATE"),
+                            ("Initial sale", "INITIAL_SALE"),
+                            ("Order quantity update", "ORDER_QUANTITY_UPDATE"),
+                        ],
+                        default="Initial stock",
+                        help_text="Select reason for change",
+                        max_length=50,
+                        verbose_name="Reason",
+                    ),
+                ),
+                (
+                    "timestamp",
+                    models.DateTimeField(
+                        auto_now_add=True,
+                        help_text="The date and time when the inventory change was logged",
+                        verbose_name="Timestamp",
+                    ),
+                ),
+                (
+                    "medicine",
+                    models.ForeignKey(
+                        help_text="Select the medicine for which the inventory change is logged",
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="pharmacy.medicine",
+                        verbose_name="Medicine",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name_plural": "Inventories",
+            },
+        ),
+    ]
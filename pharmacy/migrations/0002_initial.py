@@ -0,0 +1,39 @@
+# Generated by Django 5.1.5 on 2026-10-18 01:31
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ("pharmacy", "0001_initial"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="order",
+            name="customer",
+            field=models.ForeignKey(
+                help_text="Select the customer who placed the order",
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="orders",
+                to=settings.AUTH_USER_MODEL,
+                verbose_name="Customer",
+            ),
+        ),
+        migrations.AddField(
+            model_name="order",
+            name="medicine",
+            field=models.ForeignKey(
+                help_text="Select the medicine being ordered",
+                on_delete=django.db.models.deletion.CASCADE,
+                to="pharmacy.medicine",
+                verbose_name="Medicine",
+            ),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.1.5 on 2026-10-18 01:34
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("pharmacy", "0002_initial"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="medicine",
+            index=models.Index(
+                fields=["-created_at", "-id"], name="medicine_created_id_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="order",
+            index=models.Index(
+                fields=["customer", "-created_at", "-id"],
+                name="order_customer_created_id_idx",
+            ),
+        ),
+    ]
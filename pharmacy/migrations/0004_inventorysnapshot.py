@@ -0,0 +1,76 @@
+# Generated by Django 5.1.5 on 2026-10-18 01:44
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("pharmacy", "0003_keyset_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="InventorySnapshot",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "stock",
+                    models.IntegerField(
+                        help_text="Sum of inventory changes up to the last inventory entry",
+                        verbose_name="Stock Level",
+                    ),
+                ),
+                (
+                    "last_inventory_id",
+                    models.PositiveBigIntegerField(
+                        help_text="Id of the last inventory entry covered by this checkpoint",
+                        verbose_name="Last inventory entry",
+                    ),
+                ),
+                (
+                    "as_of",
+                    models.DateTimeField(
+                        help_text="Timestamp of the last inventory entry covered",
+                        verbose_name="As of",
+                    ),
+                ),
+                (
+                    "created_at",
+                    models.DateTimeField(
+                        auto_now_add=True,
+                        help_text="The date and time when the checkpoint was taken",
+                        verbose_name="Created At",
+                    ),
+                ),
+                (
+                    "medicine",
+                    models.ForeignKey(
+                        help_text="Medicine whose stock is checkpointed",
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="snapshots",
+                        to="pharmacy.medicine",
+                        verbose_name="Medicine",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name_plural": "Inventory snapshots",
+                "indexes": [
+                    models.Index(
+                        fields=["medicine", "-as_of"],
+                        name="snapshot_medicine_as_of_idx",
+                    )
+                ],
+            },
+        ),
+    ]
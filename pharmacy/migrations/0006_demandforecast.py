@@ -0,0 +1,104 @@
+# Generated by Django 5.1.5 on 2026-10-18 02:02
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("pharmacy", "0005_order_created_at_idx"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DemandForecast",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "demand",
+                    models.FloatField(
+                        default=0,
+                        help_text="Exponentially smoothed units sold per day",
+                        verbose_name="Daily demand",
+                    ),
+                ),
+                (
+                    "variance",
+                    models.FloatField(
+                        default=0,
+                        help_text="Exponentially smoothed variance of units sold per day",
+                        verbose_name="Demand variance",
+                    ),
+                ),
+                (
+                    "reorder_point",
+                    models.PositiveIntegerField(
+                        default=0,
+                        help_text="Stock level at or below which the medicine should be reordered",
+                        verbose_name="Reorder point",
+                    ),
+                ),
+                (
+                    "days_observed",
+                    models.PositiveIntegerField(
+                        default=0,
+                        help_text="Number of days folded into the forecast",
+                        verbose_name="Days observed",
+                    ),
+                ),
+                (
+                    "open_day",
+                    models.DateField(
+                        help_text="Day whose sales are still being accumulated",
+                        verbose_name="Open day",
+                    ),
+                ),
+                (
+                    "open_day_sales",
+                    models.IntegerField(
+                        default=0,
+                        help_text="Units sold so far on the open day",
+                        verbose_name="Open day sales",
+                    ),
+                ),
+                (
+                    "last_inventory_id",
+                    models.PositiveBigIntegerField(
+                        default=0,
+                        help_text="Id of the last inventory entry processed",
+                        verbose_name="Last inventory entry",
+                    ),
+                ),
+                (
+                    "updated_at",
+                    models.DateTimeField(
+                        auto_now=True,
+                        help_text="The date and time when the forecast was last updated",
+                        verbose_name="Updated At",
+                    ),
+                ),
+                (
+                    "medicine",
+                    models.OneToOneField(
+                        help_text="Medicine whose demand is forecast",
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="forecast",
+                        to="pharmacy.medicine",
+                        verbose_name="Medicine",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name_plural": "Demand forecasts",
+            },
+        ),
+    ]
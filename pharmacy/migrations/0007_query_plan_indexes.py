@@ -0,0 +1,56 @@
+# Generated by Django 5.1.5 on 2026-10-18 02:19
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("pharmacy", "0006_demandforecast"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="inventory",
+            index=models.Index(
+                fields=["medicine", "-timestamp"], name="inventory_medicine_time_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="inventory",
+            index=models.Index(fields=["-timestamp"], name="inventory_timestamp_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="inventory",
+            index=models.Index(
+                fields=["reason", "-timestamp"], name="inventory_reason_time_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="inventorysnapshot",
+            index=models.Index(fields=["-as_of"], name="snapshot_as_of_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="medicine",
+            index=models.Index(
+                fields=["category", "-created_at", "-id"],
+                name="medicine_category_created_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="medicine",
+            index=models.Index(fields=["price"], name="medicine_price_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="medicine",
+            index=models.Index(fields=["stock"], name="medicine_stock_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="order",
+            index=models.Index(
+                fields=["status", "-created_at"], name="order_status_created_idx"
+            ),
+        ),
+    ]
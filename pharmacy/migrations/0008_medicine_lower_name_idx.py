@@ -0,0 +1,21 @@
+# Generated by Django 5.1.5 on 2026-10-18 03:17
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("pharmacy", "0007_query_plan_indexes"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="medicine",
+            index=models.Index(
+                django.db.models.functions.text.Lower("name"),
+                name="medicine_lower_name_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.1.5 on 2026-10-18 03:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("pharmacy", "0008_medicine_lower_name_idx"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CatalogVersion",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "version",
+                    models.BigIntegerField(
+                        help_text="Incremented on every change to medicine details or stock",
+                        verbose_name="Version",
+                    ),
+                ),
+            ],
+        ),
+    ]
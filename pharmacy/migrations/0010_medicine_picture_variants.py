@@ -0,0 +1,23 @@
+# Generated by Django 5.1.5 on 2026-10-18 03:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("pharmacy", "0009_catalogversion"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="medicine",
+            name="picture_variants",
+            field=models.JSONField(
+                default=dict,
+                editable=False,
+                help_text="Widths of the resized copies made of the picture",
+                verbose_name="Picture variants",
+            ),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.1.5 on 2026-10-18 03:44
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("pharmacy", "0010_medicine_picture_variants"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="medicine",
+            name="medicine_stock_idx",
+        ),
+        migrations.AlterField(
+            model_name="inventory",
+            name="medicine",
+            field=models.ForeignKey(
+                db_index=False,
+                help_text="Select the medicine for which the inventory change is logged",
+                on_delete=django.db.models.deletion.CASCADE,
+                to="pharmacy.medicine",
+                verbose_name="Medicine",
+            ),
+        ),
+    ]
@@ -0,0 +1,102 @@
+from django.db import router
+from django.db.models.fields.files import FieldFile
+from django.db.models.signals import pre_save, post_save
+
+
+class ChangeTrackingMixin:
+    """Remembers field values as loaded from the database.
+
+    Lets `save` diff against the loaded row instead of refetching it and
+    write only the columns that changed i.e `UPDATE ... SET changed`.
+    Must come before `models.Model` in the bases.
+    """
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def loaded_value(self, field_name: str):
+        """Value of `field_name` as last loaded from or saved to the database"""
+        attname = self._meta.get_field(field_name).attname
+        loaded = self.__dict__.setdefault("_loaded_values", {})
+        if attname not in loaded:
+            # Instance built by hand or field deferred
+            loaded[attname] = (
+                type(self)
+                ._base_manager.using(self._state.db)
+                .values_list(attname, flat=True)
+                .get(pk=self.pk)
+            )
+        return loaded[attname]
+
+    def set_loaded(self, **values):
+        """Takes `values` (by attname) as the row's, e.g after a re-read"""
+        self.__dict__.setdefault("_loaded_values", {}).update(values)
+
+    def changed_fields(self) -> list[str] | None:
+        """Names of fields that differ from the loaded row.
+
+        None when the instance was not loaded from the database.
+        """
+        loaded = getattr(self, "_loaded_values", None)
+        if self._state.adding or loaded is None:
+            return None
+        return [
+            field.name
+            for field in self._meta.concrete_fields
+            if field.attname in loaded
+            and getattr(self, field.attname) != loaded[field.attname]
+        ]
+
+    def save(self, *args, **kwargs):
+        if (
+            not args
+            and kwargs.get("update_fields") is None
+            and not kwargs.get("force_insert")
+        ):
+            changed = self.changed_fields()
+            if changed:
+                changed += [
+                    field.name
+                    for field in self._meta.concrete_fields
+                    if getattr(field, "auto_now", False) and field.name not in changed
+                ]
+            if changed is not None:
+                kwargs["update_fields"] = changed
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and not update_fields:
+            self._save_unchanged(kwargs.get("using"))
+            return
+        super().save(*args, **kwargs)
+        self._snapshot(update_fields)
+
+    def _save_unchanged(self, using=None):
+        """Sends the signals of a save with nothing to write, and no query.
+
+        Django returns before them for empty `update_fields`, receivers
+        e.g caches would miss a save made on their account.
+        """
+        using = using or router.db_for_write(type(self), instance=self)
+        for signal, extra in ((pre_save, {}), (post_save, {"created": False})):
+            signal.send(
+                sender=type(self),
+                instance=self,
+                raw=False,
+                using=using,
+                update_fields=frozenset(),
+                **extra,
+            )
+
+    def _snapshot(self, update_fields=None):
+        fields = self._meta.concrete_fields
+        if update_fields is not None:
+            fields = [field for field in fields if field.name in update_fields]
+        loaded = self.__dict__.setdefault("_loaded_values", {})
+        for field in fields:
+            value = getattr(self, field.attname)
+            if isinstance(value, FieldFile):
+                # Saved in place by `FieldFile.save`, keep the name only
+                value = value.name
+            loaded[field.attname] = value
@@ -1,12 +1,27 @@
-from django.db import models
-from users.models import CustomUser
-from pharmacy.exceptions import InsufficientBalanceError, PharmacyException
+from django.db import models, transaction
+from django.db.models import F
+from django.db.models.functions import Lower
+from django.utils import timezone
+from users.models import CustomUser, LedgerEntry
+from pharmacy.exceptions import (
+    InsufficientBalanceError,
+    InsufficientStockError,
+    PharmacyException,
+)
+from pharmacy.cache import bump_catalog_version, forget_sales_day
+from pharmacy.mixins import ChangeTrackingMixin
 
 
 # Create your models here.
 from django.utils.translation import gettext_lazy as _
 
+from pharmacy_ms.settings import (
+    REORDER_LEAD_TIME_DAYS,
+    REORDER_REVIEW_DAYS,
+    REORDER_SERVICE_FACTOR,
+)
 from os import path
+import math
 from enum import Enum
 
 # Create your models here.
@@ -17,7 +32,7 @@ def generate_document_filepath(instance: "Medicine", filename: str) -> str:
     return f"{instance.__class__.__name__.lower()}/{filename}_{instance.id}{extension}"
 
 
-class Medicine(models.Model):
+class Medicine(ChangeTrackingMixin, models.Model):
 
     class MedicineCategory(str, Enum):
         ANTIBIOTICS = "Antibiotics"
@@ -74,6 +89,12 @@ class Medicine(models.Model):
         help_text=_("Upload a photo of the medicine"),
         blank=True,
     )
+    picture_variants = models.JSONField(
+        default=dict,
+        editable=False,
+        verbose_name=_("Picture variants"),
+        help_text=_("Widths of the resized copies made of the picture"),
+    )
     created_at = models.DateTimeField(
         auto_now_add=True,
         verbose_name=_("Created At"),
@@ -88,26 +109,71 @@ class Medicine(models.Model):
     def __str__(self):
         return self.name
 
+    class Meta:
+        indexes = [
+            # Keyset pagination of the catalog
+            models.Index(fields=["-created_at", "-id"], name="medicine_created_id_idx"),
+            # Catalog by category, newest first
+            models.Index(
+                fields=["category", "-created_at", "-id"],
+                name="medicine_category_created_idx",
+            ),
+            models.Index(fields=["price"], name="medicine_price_idx"),
+            # Name suggestions, see `pharmacy.search.suggest`
+            models.Index(Lower("name"), name="medicine_lower_name_idx"),
+        ]
+
     def save(self, *args, **kwargs):
         change = 0
         if self.id:  # Update to existing one
-            original = Medicine.objects.get(pk=self.pk)
-            if original.stock != self.stock:
-                change = self.stock - original.stock
+            original_stock = self.loaded_value("stock")
+            if original_stock != self.stock:
+                change = self.stock - original_stock
                 reason = Inventory.ChangeReason.STOCK_UPDATE.value
         else:  # New entry
             change = self.stock
             reason = Inventory.ChangeReason.INITIAL_STOCK.value
+        changed = self.changed_fields() != []
         super().save(*args, **kwargs)
+        if changed:
+            bump_catalog_version()
         if change:
             Inventory.objects.create(
                 medicine=self,
                 change=change,
                 reason=reason,
-            ).save()
+            )
+
+    def delete(self, *args, **kwargs):
+        bump_catalog_version()
+        return super().delete(*args, **kwargs)
+
+    def decrease_stock(self, quantity: int):
+        """Takes `quantity` off stock in one conditional UPDATE.
+
+        Raises `InsufficientStockError` instead of overselling.
+        """
+        if not Medicine.objects.filter(pk=self.pk, stock__gte=quantity).update(
+            stock=F("stock") - quantity, updated_at=timezone.now()
+        ):
+            raise InsufficientStockError(
+                "Not enough stock available for the requested quantity."
+            )
+        self.stock -= quantity
+        self._snapshot(["stock"])
+        bump_catalog_version()
 
+    def increase_stock(self, quantity: int):
+        """Puts `quantity` back to stock in one UPDATE"""
+        Medicine.objects.filter(pk=self.pk).update(
+            stock=F("stock") + quantity, updated_at=timezone.now()
+        )
+        self.stock += quantity
+        self._snapshot(["stock"])
+        bump_catalog_version()
 
-class Order(models.Model):
+
+class Order(ChangeTrackingMixin, models.Model):
 
     class OrderStatus(Enum):
         PENDING = "Pending"
@@ -165,68 +231,168 @@ class Order(models.Model):
     )
 
     def save(self, *args, **kwargs):
-        if self.medicine.stock < self.quantity:
-            raise ValueError("Not enough stock available for the requested quantity.")
-        self.total_price = self.medicine.price * self.quantity
-        if not self.id:  # new
-            if self.customer.account.balance < self.total_price:
-                raise InsufficientBalanceError(
-                    f"Customer's account balance is less by Ksh.{self.total_price -self.customer.account.balance} "
-                    "to place this order"
+        if self.changed_fields() == []:
+            # Nothing to write, stock & balance stay as they are
+            return super().save(*args, **kwargs)
+        # Stock & balance are moved by conditional UPDATEs so that the
+        # database, not a stale in-memory copy, enforces the invariants
+        with transaction.atomic():
+            new = not self.id
+            if new:
+                self.total_price = self.medicine.price * self.quantity
+                self.medicine.decrease_stock(self.quantity)
+                Inventory.objects.create(
+                    medicine=self.medicine,
+                    change=-self.quantity,
+                    reason=Inventory.ChangeReason.INITIAL_SALE.value,
                 )
-            self.medicine.stock -= self.quantity
-            self.medicine.save()
-            Inventory.objects.create(
-                medicine=self.medicine,
-                change=-self.quantity,
-                reason=Inventory.ChangeReason.INITIAL_SALE.value,
-            ).save()
-            self.customer.account.balance -= self.total_price
-            self.customer.account.save()
-        else:  # update
-            original = Order.objects.get(pk=self.pk)
-            if original.quantity != self.quantity:
-                change = original.quantity - self.quantity
-                self.medicine.stock += change
-                self.medicine.save()
-                payment_made = original.total_price
-                new_payment_required = self.total_price
-                change = new_payment_required - payment_made
-                if change > 0:
-                    # Customer needs to pay more
-                    if change > self.customer.account.balance:
-                        raise InsufficientBalanceError(
-                            f"Customer's account balance is less by Ksh.{self.total_price - self.customer.account.balance} "
-                            "to place this order"
-                        )
+            else:  # update
+                # Locked re-read, the loaded copy may have been edited since
+                original = (
+                    Order.objects.select_for_update()
+                    .only("quantity", "total_price")
+                    .get(pk=self.pk)
+                )
+                self.set_loaded(
+                    quantity=original.quantity, total_price=original.total_price
+                )
+                change = self.quantity - original.quantity
+                if change:
+                    self.total_price = self.medicine.price * self.quantity
+                    if change > 0:
+                        self.medicine.decrease_stock(change)
                     else:
-                        self.customer.account.balance -= change
-                else:
-                    # Refund customer
-                    self.customer.account.balance -= change  # -- results to +
+                        self.medicine.increase_stock(-change)
+                    payment_change = self.total_price - original.total_price
+                    if payment_change > 0:
+                        # Customer needs to pay more
+                        self.customer.account.debit(
+                            payment_change,
+                            LedgerEntry.EntryKind.ORDER,
+                            f"Order {self.id}",
+                            f"Customer's account balance is insufficient to pay "
+                            f"Ksh.{payment_change} more for this order",
+                        )
+                    elif payment_change < 0:
+                        # Refund customer
+                        self.customer.account.credit(
+                            -payment_change,
+                            LedgerEntry.EntryKind.REFUND,
+                            f"Order {self.id}",
+                        )
+                    Inventory.objects.create(
+                        medicine=self.medicine,
+                        change=-change,
+                        reason=Inventory.ChangeReason.ORDER_QUANTITY_UPDATE.value,
+                    )
+            super().save(*args, **kwargs)
+            if new:
+                # After saving, so that the ledger entry names the order
+                self.customer.account.debit(
+                    self.total_price,
+                    LedgerEntry.EntryKind.ORDER,
+                    f"Order {self.id}",
+                    f"Customer's account balance is insufficient to pay "
+                    f"Ksh.{self.total_price} for this order",
+                )
+            forget_sales_day(self.created_at)
 
-                self.customer.account.save()
+    @classmethod
+    def checkout(
+        cls, customer: CustomUser, items: list[tuple[int, int]], prescription="--"
+    ) -> list["Order"]:
+        """Places an order per `(medicine_id, quantity)` item in one transaction.
+
+        Stock is taken per item but the account is debited once and the
+        orders & inventory rows are written in bulk. Nothing is saved
+        unless every item can be fulfilled.
+        """
+        with transaction.atomic():
+            medicines = Medicine.objects.in_bulk({id for id, quantity in items})
+            orders, inventories = [], []
+            for medicine_id, quantity in items:
+                medicine = medicines.get(medicine_id)
+                if medicine is None:
+                    raise Medicine.DoesNotExist(
+                        f"Medicine with id {medicine_id} does not exist."
+                    )
+                try:
+                    medicine.decrease_stock(quantity)
+                except InsufficientStockError:
+                    raise InsufficientStockError(
+                        f"Not enough stock of {medicine.name} for the requested quantity."
+                    )
+                orders.append(
+                    cls(
+                        customer=customer,
+                        medicine=medicine,
+                        quantity=quantity,
+                        prescription=prescription,
+                        total_price=medicine.price * quantity,
+                    )
+                )
+                inventories.append(
+                    Inventory(
+                        medicine=medicine,
+                        change=-quantity,
+                        reason=Inventory.ChangeReason.INITIAL_SALE.value,
+                    )
+                )
+            total_price = sum(order.total_price for order in orders)
+            orders = cls.objects.bulk_create(orders)
+            Inventory.objects.bulk_create(inventories)
+            customer.account.debit(
+                total_price,
+                LedgerEntry.EntryKind.ORDER,
+                "Orders " + ", ".join(str(order.id) for order in orders),
+                f"Customer's account balance is insufficient to pay "
+                f"Ksh.{total_price} for these orders",
+            )
+            forget_sales_day(timezone.now())
+        return orders
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            reference = f"Order {self.id}"
+            # Deleted first, so that an order cancelled twice at once is
+            # refunded by whichever delete removed the row
+            deleted = super().delete(*args, **kwargs)
+            if not deleted[0]:
+                return deleted
+            # Admin stores choice names, the API values
+            if self.status not in (
+                self.OrderStatus.DELIVERED.name,
+                self.OrderStatus.DELIVERED.value,
+            ):
+                self.medicine.increase_stock(self.quantity)
+                self.customer.account.credit(
+                    self.total_price, LedgerEntry.EntryKind.REFUND, reference
+                )
                 Inventory.objects.create(
                     medicine=self.medicine,
-                    change=change,
+                    change=self.quantity,
                     reason=Inventory.ChangeReason.ORDER_QUANTITY_UPDATE.value,
-                ).save()
-        super().save(*args, **kwargs)
-
-    def delete(self, *args, **kwargs):
-        if self.status != self.OrderStatus.DELIVERED.value:
-            self.customer.account.balance += self.total_price
-            self.customer.account.save()
-            Inventory.objects.create(
-                medicine=self.medicine,
-                change=self.quantity,
-                reason=Inventory.ChangeReason.ORDER_QUANTITY_UPDATE.value,
-            ).save()
-        super().delete(*args, **kwargs)
+                )
+            forget_sales_day(self.created_at)
+            return deleted
 
     def __str__(self):
         return f"Order {self.id} by {self.customer.username}"
 
+    class Meta:
+        indexes = [
+            # Keyset pagination of customer's orders
+            models.Index(
+                fields=["customer", "-created_at", "-id"],
+                name="order_customer_created_id_idx",
+            ),
+            # Daily sales aggregates
+            models.Index(fields=["created_at"], name="order_created_at_idx"),
+            models.Index(
+                fields=["status", "-created_at"], name="order_status_created_idx"
+            ),
+        ]
+
 
 class Inventory(models.Model):
 
@@ -245,6 +411,8 @@ class Inventory(models.Model):
         on_delete=models.CASCADE,
         verbose_name=_("Medicine"),
         help_text=_("Select the medicine for which the inventory change is logged"),
+        # Leads `inventory_medicine_time_idx`
+        db_index=False,
     )
     change = models.IntegerField(
         verbose_name=_("Change in Stock"),
@@ -271,3 +439,212 @@ class Inventory(models.Model):
 
     class Meta:
         verbose_name_plural = _("Inventories")
+        indexes = [
+            # Medicine's stock history
+            models.Index(
+                fields=["medicine", "-timestamp"], name="inventory_medicine_time_idx"
+            ),
+            models.Index(fields=["-timestamp"], name="inventory_timestamp_idx"),
+            models.Index(
+                fields=["reason", "-timestamp"], name="inventory_reason_time_idx"
+            ),
+        ]
+
+
+class InventorySnapshot(models.Model):
+    """Checkpoint of a medicine's stock as per the inventory log.
+
+    Stock at any time is the nearest earlier checkpoint plus the
+    inventory rows logged after it (see `pharmacy.inventory`).
+    """
+
+    medicine = models.ForeignKey(
+        Medicine,
+        on_delete=models.CASCADE,
+        verbose_name=_("Medicine"),
+        help_text=_("Medicine whose stock is checkpointed"),
+        related_name="snapshots",
+    )
+    stock = models.IntegerField(
+        verbose_name=_("Stock Level"),
+        help_text=_("Sum of inventory changes up to the last inventory entry"),
+    )
+    last_inventory_id = models.PositiveBigIntegerField(
+        verbose_name=_("Last inventory entry"),
+        help_text=_("Id of the last inventory entry covered by this checkpoint"),
+    )
+    as_of = models.DateTimeField(
+        verbose_name=_("As of"),
+        help_text=_("Timestamp of the last inventory entry covered"),
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name=_("Created At"),
+        help_text=_("The date and time when the checkpoint was taken"),
+    )
+
+    def __str__(self):
+        return f"Stock of {self.medicine_id} as of {self.as_of.strftime('%d-%b-%Y %H:%M:%S')}"
+
+    class Meta:
+        verbose_name_plural = _("Inventory snapshots")
+        indexes = [
+            models.Index(
+                fields=["medicine", "-as_of"], name="snapshot_medicine_as_of_idx"
+            ),
+            models.Index(fields=["-as_of"], name="snapshot_as_of_idx"),
+        ]
+
+
+class DemandForecast(models.Model):
+    """Smoothed daily demand of a medicine and the stock level at which it
+    should be reordered.
+
+    Maintained by `pharmacy.forecast.update_forecasts` from the sales
+    logged in `Inventory`, resuming after `last_inventory_id`.
+    """
+
+    medicine = models.OneToOneField(
+        Medicine,
+        on_delete=models.CASCADE,
+        verbose_name=_("Medicine"),
+        help_text=_("Medicine whose demand is forecast"),
+        related_name="forecast",
+    )
+    demand = models.FloatField(
+        default=0,
+        verbose_name=_("Daily demand"),
+        help_text=_("Exponentially smoothed units sold per day"),
+    )
+    variance = models.FloatField(
+        default=0,
+        verbose_name=_("Demand variance"),
+        help_text=_("Exponentially smoothed variance of units sold per day"),
+    )
+    reorder_point = models.PositiveIntegerField(
+        default=0,
+        verbose_name=_("Reorder point"),
+        help_text=_("Stock level at or below which the medicine should be reordered"),
+    )
+    days_observed = models.PositiveIntegerField(
+        default=0,
+        verbose_name=_("Days observed"),
+        help_text=_("Number of days folded into the forecast"),
+    )
+    open_day = models.DateField(
+        verbose_name=_("Open day"),
+        help_text=_("Day whose sales are still being accumulated"),
+    )
+    open_day_sales = models.IntegerField(
+        default=0,
+        verbose_name=_("Open day sales"),
+        help_text=_("Units sold so far on the open day"),
+    )
+    last_inventory_id = models.PositiveBigIntegerField(
+        default=0,
+        verbose_name=_("Last inventory entry"),
+        help_text=_("Id of the last inventory entry processed"),
+    )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name=_("Updated At"),
+        help_text=_("The date and time when the forecast was last updated"),
+    )
+
+    @property
+    def is_low(self) -> bool:
+        return self.medicine.stock <= self.reorder_point
+
+    @staticmethod
+    def safety_stock(variance):
+        """Units kept against demand above forecast over the lead time, of a
+        variance or a NumPy array of them"""
+        return REORDER_SERVICE_FACTOR * (variance * REORDER_LEAD_TIME_DAYS) ** 0.5
+
+    @property
+    def suggested_quantity(self) -> int:
+        """Units to order so that stock covers demand until the next review"""
+        if not self.is_low:
+            return 0
+        target = self.demand * (
+            REORDER_LEAD_TIME_DAYS + REORDER_REVIEW_DAYS
+        ) + self.safety_stock(self.variance)
+        return max(math.ceil(target - self.medicine.stock), 0)
+
+    def __str__(self):
+        return f"Demand forecast for {self.medicine.name}"
+
+    class Meta:
+        verbose_name_plural = _("Demand forecasts")
+
+
+class CatalogVersion(models.Model):
+    """Stamp of what shoppers see in the catalog, a single row.
+
+    Moved on by `pharmacy.cache.bump_catalog_version` in the transaction
+    changing the catalog, so every process reads the same stamp.
+    """
+
+    version = models.BigIntegerField(
+        verbose_name=_("Version"),
+        help_text=_("Incremented on every change to medicine details or stock"),
+    )
+
+    def __str__(self):
+        return f"Catalog version {self.version}"
+
+
+class IdempotencyKey(models.Model):
+    """An `Idempotency-Key` sent with an order placement, claimed while the
+    request runs and then holding its response (see `api.v1.idempotency`).
+
+    In the database, so every worker sees the same claims.
+    """
+
+    user = models.ForeignKey(
+        CustomUser,
+        on_delete=models.CASCADE,
+        verbose_name=_("User"),
+        help_text=_("User who sent the key"),
+        related_name="+",
+        # Leads `idempotency_user_key_unique`
+        db_index=False,
+    )
+    key = models.CharField(
+        max_length=255,
+        verbose_name=_("Key"),
+        help_text=_("Idempotency-Key header value"),
+    )
+    fingerprint = models.CharField(
+        max_length=64,
+        verbose_name=_("Fingerprint"),
+        help_text=_("Digest of the endpoint & arguments of the request"),
+    )
+    status_code = models.PositiveSmallIntegerField(
+        null=True,
+        verbose_name=_("Status code"),
+        help_text=_("Status of the response, none while the request runs"),
+    )
+    response = models.JSONField(
+        null=True,
+        verbose_name=_("Response"),
+        help_text=_("Body of the response replayed to retries"),
+    )
+    expires_at = models.DateTimeField(
+        verbose_name=_("Expires At"),
+        help_text=_("When the claim, or once done the response, lapses"),
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "key"], name="idempotency_user_key_unique"
+            ),
+        ]
+        indexes = [
+            # Purge of lapsed keys
+            models.Index(fields=["expires_at"], name="idempotency_expires_idx"),
+        ]
+
+    def __str__(self):
+        return f"Idempotency key {self.key} of user {self.user_id}"
@@ -0,0 +1,87 @@
+"""Opt-in SQL profiling of requests (`SQL_PROFILER`).
+
+Builds on the per request `RequestStats` of `pharmacy.metrics`, hence
+attributes queries to requests across the threadpool, `sync_to_async`
+and the WSGI-mounted Django alike. Profiled responses carry the
+`X-DB-Queries` and `X-DB-Time` (milliseconds) headers, and requests
+crossing a threshold are logged, one JSON object per line:
+
+- queries slower than `SQL_SLOW_QUERY_MS`
+- total query time over `SQL_SLOW_REQUEST_MS`
+- SQL run `SQL_DUPLICATE_THRESHOLD` times or more i.e N+1 queries
+
+Parameters are left out of the log, they may hold personal data.
+"""
+
+import json
+import logging
+from pharmacy_ms.settings import (
+    SQL_SLOW_QUERY_MS,
+    SQL_SLOW_REQUEST_MS,
+    SQL_DUPLICATE_THRESHOLD,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def milliseconds(seconds: float) -> float:
+    return round(seconds * 1000, 3)
+
+
+class QueryProfile:
+    """Queries of a single request, grouped by SQL"""
+
+    __slots__ = ("statements", "slow")
+
+    def __init__(self):
+        self.statements: dict[str, list] = {}  # SQL: [count, seconds]
+        self.slow: list[tuple[str, float]] = []
+
+    def add(self, sql: str, elapsed: float):
+        entry = self.statements.get(sql)
+        if entry is None:
+            entry = self.statements[sql] = [0, 0.0]
+        entry[0] += 1
+        entry[1] += elapsed
+        if elapsed * 1000 >= SQL_SLOW_QUERY_MS:
+            self.slow.append((sql, elapsed))
+
+    def duplicates(self) -> list[tuple[str, int, float]]:
+        """SQL, times run and seconds taken of repeated SQL, most run first"""
+        return sorted(
+            (
+                (sql, count, elapsed)
+                for sql, (count, elapsed) in self.statements.items()
+                if count >= SQL_DUPLICATE_THRESHOLD
+            ),
+            key=lambda duplicate: duplicate[1],
+            reverse=True,
+        )
+
+    def report(
+        self, method: str, route: str, status: int, queries: int, db_time: float
+    ) -> dict | None:
+        """Logs the request if it crossed a threshold. Returns the record."""
+        duplicates = self.duplicates()
+        slow_request = db_time * 1000 >= SQL_SLOW_REQUEST_MS
+        if not (self.slow or duplicates or slow_request):
+            return None
+        record = {
+            "event": "sql_profile",
+            "method": method,
+            "route": route,
+            "status": status,
+            "queries": queries,
+            "db_time_ms": milliseconds(db_time),
+            "slow_request": slow_request,
+            "slow_queries": [
+                {"sql": sql, "time_ms": milliseconds(elapsed)}
+                for sql, elapsed in self.slow
+            ],
+            "duplicate_queries": [
+                {"sql": sql, "count": count, "time_ms": milliseconds(elapsed)}
+                for sql, count, elapsed in duplicates
+            ],
+        }
+        logger.warning(json.dumps(record))
+        return record
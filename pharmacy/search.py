@@ -0,0 +1,244 @@
+"""Medicine search index.
+
+SQLite FTS5 tables mirroring `pharmacy_medicine`:
+
+- `pharmacy_medicine_fts` : word index over name, short name, description
+  and category. Used for ranked search and prefix suggestions.
+- `pharmacy_medicine_trigram` : trigram index over name and short name.
+  Used for typo tolerant matching e.g "amoxcilin" -> "amoxicillin".
+
+Both are external content tables kept in sync by triggers, so every
+`Medicine.save`, delete, queryset update or raw write is reflected
+without extra work in Python.
+"""
+
+import re
+import logging
+from django.db import connections, DEFAULT_DB_ALIAS
+
+logger = logging.getLogger(__name__)
+
+FTS_TABLE = "pharmacy_medicine_fts"
+TRIGRAM_TABLE = "pharmacy_medicine_trigram"
+
+# Matches ranked per search. Words common to more medicines are ranked
+# among the first this many, bm25 costs a few microseconds a match
+SEARCH_CANDIDATES = 1000
+FUZZY_CANDIDATES = 100
+FUZZY_MIN_SIMILARITY = 0.3
+
+SCHEMA = (
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        name, short_name, description, category,
+        content='pharmacy_medicine', content_rowid='id',
+        prefix='2 3', tokenize='unicode61 remove_diacritics 2'
+    )""",
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {TRIGRAM_TABLE} USING fts5(
+        name, short_name,
+        content='pharmacy_medicine', content_rowid='id',
+        tokenize='trigram'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai
+    AFTER INSERT ON pharmacy_medicine BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, name, short_name, description, category)
+        VALUES (new.id, new.name, new.short_name, new.description, new.category);
+        INSERT INTO {TRIGRAM_TABLE}(rowid, name, short_name)
+        VALUES (new.id, new.name, new.short_name);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad
+    AFTER DELETE ON pharmacy_medicine BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, short_name, description, category)
+        VALUES ('delete', old.id, old.name, old.short_name, old.description, old.category);
+        INSERT INTO {TRIGRAM_TABLE}({TRIGRAM_TABLE}, rowid, name, short_name)
+        VALUES ('delete', old.id, old.name, old.short_name);
+    END""",
+    # Stock & price updates leave the index alone
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au
+    AFTER UPDATE ON pharmacy_medicine
+    WHEN old.name IS NOT new.name
+        OR old.short_name IS NOT new.short_name
+        OR old.description IS NOT new.description
+        OR old.category IS NOT new.category
+    BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, short_name, description, category)
+        VALUES ('delete', old.id, old.name, old.short_name, old.description, old.category);
+        INSERT INTO {FTS_TABLE}(rowid, name, short_name, description, category)
+        VALUES (new.id, new.name, new.short_name, new.description, new.category);
+        INSERT INTO {TRIGRAM_TABLE}({TRIGRAM_TABLE}, rowid, name, short_name)
+        VALUES ('delete', old.id, old.name, old.short_name);
+        INSERT INTO {TRIGRAM_TABLE}(rowid, name, short_name)
+        VALUES (new.id, new.name, new.short_name);
+    END""",
+)
+
+_available: dict[str, bool] = {}
+
+
+def is_available(using: str = DEFAULT_DB_ALIAS) -> bool:
+    """Checks whether the search index exists on database `using`"""
+    if using not in _available:
+        connection = connections[using]
+        if connection.vendor != "sqlite":
+            _available[using] = False
+        else:
+            _available[using] = FTS_TABLE in connection.introspection.table_names(
+                include_views=True
+            )
+    return _available[using]
+
+
+def install(using: str = DEFAULT_DB_ALIAS, **kwargs):
+    """Creates the index tables and triggers then (re)builds them.
+
+    Connected to `post_migrate`, so `manage.py migrate` keeps it in place.
+    """
+    connection = connections[using]
+    if connection.vendor != "sqlite":
+        return
+    if "pharmacy_medicine" not in connection.introspection.table_names():
+        return
+    _available.pop(using, None)
+    try:
+        with connection.cursor() as cursor:
+            exists = FTS_TABLE in connection.introspection.table_names(cursor)
+            for statement in SCHEMA:
+                cursor.execute(statement)
+            if not exists:
+                rebuild(using)
+    except Exception as e:
+        # SQLite builds lacking FTS5/trigram fall back to `icontains`
+        logger.warning(f"Medicine search index not installed - {e}")
+
+
+def rebuild(using: str = DEFAULT_DB_ALIAS):
+    """Repopulates the index from `pharmacy_medicine`"""
+    with connections[using].cursor() as cursor:
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+        cursor.execute(
+            f"INSERT INTO {TRIGRAM_TABLE}({TRIGRAM_TABLE}) VALUES ('rebuild')"
+        )
+
+
+def words(query: str) -> list[str]:
+    return re.findall(r"\w+", query.lower())
+
+
+def trigrams(word: str) -> set[str]:
+    return {word[i : i + 3] for i in range(len(word) - 2)}
+
+
+def quote(term: str) -> str:
+    return '"' + term.replace('"', '""') + '"'
+
+
+def search(query: str, limit: int, using: str = DEFAULT_DB_ALIAS) -> list[int]:
+    """Ids of medicines matching `query`, best first.
+
+    Word matches ranked by bm25 come first, then near misses from the
+    trigram index ranked by similarity to the medicine name. At most
+    `SEARCH_CANDIDATES` word matches are ranked.
+    """
+    terms = words(query)
+    if not terms:
+        return []
+    match = " ".join(quote(term) + "*" for term in terms)
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            f"SELECT rowid FROM ("
+            f"SELECT rowid, bm25({FTS_TABLE}, 10.0, 8.0, 1.0, 2.0) AS score "
+            f"FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s LIMIT %s"
+            f") ORDER BY score LIMIT %s",
+            [match, SEARCH_CANDIDATES, limit],
+        )
+        ids = [row[0] for row in cursor.fetchall()]
+    if len(ids) < limit:
+        ids += [id for id in fuzzy(query, limit, using) if id not in ids]
+    return ids[:limit]
+
+
+def misspelt(word: str) -> str:
+    """Trigram index query matching `word` misspelt by a letter.
+
+    A letter added, dropped or changed breaks the three trigrams spanning
+    it at most, so from seven letters on either the first or the last two
+    trigrams are intact. Both must match, which few names do by chance.
+    """
+    ordered = [word[i : i + 3] for i in range(len(word) - 2)]
+    if len(ordered) < 5:
+        return " OR ".join(quote(trigram) for trigram in ordered)
+    start, end = ordered[:2], ordered[-2:]
+    return "({}) OR ({})".format(" ".join(map(quote, start)), " ".join(map(quote, end)))
+
+
+def fuzzy(query: str, limit: int, using: str = DEFAULT_DB_ALIAS) -> list[int]:
+    """Ids of medicines whose name or short name resembles `query`"""
+    query_words = [word for word in words(query) if len(word) >= 3]
+    if not query_words:
+        return []
+    match = " OR ".join(f"({misspelt(word)})" for word in query_words)
+    query_words = [trigrams(word) for word in query_words]
+    with connections[using].cursor() as cursor:
+        # Ranked by similarity below, bm25 would rank every match
+        cursor.execute(
+            f"SELECT rowid, name, short_name FROM {TRIGRAM_TABLE} "
+            f"WHERE {TRIGRAM_TABLE} MATCH %s LIMIT %s",
+            [match, FUZZY_CANDIDATES],
+        )
+        candidates = cursor.fetchall()
+
+    # Names share words, each is scored against the query once
+    scores: dict[str, list[float]] = {}
+
+    def word_scores(name_word: str) -> list[float]:
+        """Trigram Jaccard score of `name_word` per query word"""
+        if name_word not in scores:
+            other = trigrams(name_word)
+            scores[name_word] = [
+                len(word & other) / len(word | other) for word in query_words
+            ]
+        return scores[name_word]
+
+    def similarity(name: str, short_name: str | None) -> float:
+        """Mean of each query word's best trigram Jaccard score"""
+        name_scores = [
+            word_scores(word) for word in words(f"{name} {short_name or ''}")
+        ]
+        return sum(
+            max((word[index] for word in name_scores), default=0)
+            for index in range(len(query_words))
+        ) / len(query_words)
+
+    scored = [(similarity(name, short_name), id) for id, name, short_name in candidates]
+    scored.sort(reverse=True)
+    return [id for score, id in scored if score >= FUZZY_MIN_SIMILARITY][:limit]
+
+
+def suggest(prefix: str, limit: int, using: str = DEFAULT_DB_ALIAS) -> list[int]:
+    """Ids of medicines whose name starts with `prefix`, by name, then of
+    those whose short name or words do.
+
+    Names come in order off their index, a range search however many
+    match. Ordering every match in the word index by name or rank would
+    read them all, thousands for a letter or two.
+    """
+    terms = words(prefix)
+    if not terms:
+        return []
+    start = prefix.strip().lower()
+    match = "{name short_name} : (^%s)" % " ".join(quote(term) + "*" for term in terms)
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            "SELECT id FROM pharmacy_medicine "
+            "WHERE LOWER(name) >= %s AND LOWER(name) < %s "
+            "ORDER BY LOWER(name), id LIMIT %s",
+            [start, start + "\U0010ffff", limit],
+        )
+        ids = [row[0] for row in cursor.fetchall()]
+        if len(ids) < limit:
+            cursor.execute(
+                f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s "
+                f"ORDER BY rowid LIMIT %s",
+                [match, limit + len(ids)],
+            )
+            ids += [row[0] for row in cursor.fetchall() if row[0] not in ids]
+    return ids[:limit]
@@ -0,0 +1,400 @@
+"""Large, deterministic datasets for benchmarks & reproducing problems.
+
+`seed` writes `scale` medicines and users, and about `orders_per_user`
+orders per user spread over `days` up to `end`, along with the payments,
+ledger entries and inventory they imply. Rows are built in memory and
+written in bulk a chunk per transaction, bypassing the per-row `save`
+hooks, hence the bookkeeping those hooks do is done here:
+
+- Events are generated in time order, so ids follow time as they do in
+  production (inventory snapshots rely on it).
+- Customers top up their accounts just before an order they cannot
+  afford; every payment & order has its ledger entry and running balance.
+- Medicines are restocked just before an order they cannot fulfil;
+  every sale & restock has its inventory row.
+- Cached balances & stock are set from the ledger & inventory last.
+
+Medicines & users go through `bulk_create`. The history tables, ten
+times their size, are written by `executemany` of ready rows instead;
+compiling `bulk_create` SQL takes several times longer than running it.
+
+The same `seed` and `end` always produce the same data.
+"""
+
+import random
+from bisect import bisect_right
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Max, OuterRef, Subquery, Sum
+from django.utils import timezone
+from users.models import Account, CustomUser, LedgerEntry, Payment
+from pharmacy.models import Inventory, Medicine, Order
+from pharmacy.cache import bump_catalog_version, sales_day_key
+
+PASSWORD = "seed-password"  # Of every seeded user
+
+# Orders, with their payments & inventory, written per transaction
+CHUNK_SIZE = 50_000
+
+STEMS = (
+    "Amoxi Azithro Cipro Doxy Metro Ibupro Parace Diclo Napro Cetiri Lorata "
+    "Omepra Panto Metfor Amlodi Losar Atorva Simva Predni Salbu Dextro Guaife "
+    "Bromhe Zinco Ferro Calci Magne Vitamo Folo Cobala"
+).split()
+
+SUFFIXES = (
+    "cillin mycin floxacin zole fen tamol nac rizine dine prazole min pine "
+    "sartan statin sone mol phan nesin xine cal"
+).split()
+
+FORMS = ("Tablets", "Capsules", "Syrup", "Suspension", "Cream", "Drops")
+
+STRENGTHS = (5, 10, 20, 25, 50, 100, 125, 200, 250, 400, 500, 1000)
+
+TOP_UPS = (500, 1000, 2000, 5000)  # Ksh above what an order lacks
+
+PAYMENT_METHODS = [method.value for method in Payment.PaymentMethod]
+
+# Written by `insert`, in this column order
+COLUMNS = {
+    Payment: ("id", "user_id", "amount", "method", "reference", "created_at"),
+    Order: (
+        "id",
+        "customer_id",
+        "medicine_id",
+        "quantity",
+        "prescription",
+        "total_price",
+        "status",
+        "created_at",
+        "updated_at",
+    ),
+    Inventory: ("id", "medicine_id", "change", "reason", "timestamp"),
+    LedgerEntry: (
+        "id",
+        "account_id",
+        "kind",
+        "amount",
+        "balance",
+        "reference",
+        "created_at",
+    ),
+}
+
+
+@contextmanager
+def given_timestamps(*models):
+    """Lets rows keep the `auto_now`/`auto_now_add` values given to them"""
+    fields = [
+        field
+        for model in models
+        for field in model._meta.concrete_fields
+        if getattr(field, "auto_now", False) or getattr(field, "auto_now_add", False)
+    ]
+    flags = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in flags:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def next_id(model) -> int:
+    return (model.objects.aggregate(last=Max("id"))["last"] or 0) + 1
+
+
+def money(cents: int) -> Decimal:
+    return Decimal(cents).scaleb(-2)
+
+
+def stamp(when: datetime) -> str:
+    """UTC `when` as Django stores it on SQLite"""
+    return str(when.replace(tzinfo=None))
+
+
+def insert(model, rows: list[tuple]):
+    quote = connection.ops.quote_name
+    columns = COLUMNS[model]
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f"INSERT INTO {quote(model._meta.db_table)} "
+            f"({', '.join(quote(column) for column in columns)}) "
+            f"VALUES ({', '.join(['%s'] * len(columns))})",
+            rows,
+        )
+
+
+class Seeder:
+    def __init__(self, scale, seed, orders_per_user, days, end, log):
+        self.rng = random.Random(seed)
+        self.scale = scale
+        self.orders = scale * orders_per_user
+        self.days = days
+        self.end = end
+        self.start = end - timedelta(days=days)
+        self.log = log
+        # Ids are given upfront, so that rows can refer to each other
+        models = (Medicine, Account, CustomUser, Payment, Order, Inventory, LedgerEntry)
+        self.ids = {model: next_id(model) for model in models}
+        self.counts = dict.fromkeys(self.ids, 0)
+        self.pending = {model: [] for model in self.ids}
+
+    def take_id(self, model) -> int:
+        id = self.ids[model]
+        self.ids[model] += 1
+        self.counts[model] += 1
+        return id
+
+    def add(self, instance):
+        self.pending[type(instance)].append(instance)
+
+    def add_row(self, model, *row):
+        self.pending[model].append(row)
+
+    def flush(self, *models):
+        """Writes pending rows of `models`, in that order, in one transaction"""
+        with transaction.atomic():
+            for model in models:
+                if model in COLUMNS:
+                    insert(model, self.pending[model])
+                else:
+                    model.objects.bulk_create(self.pending[model])
+                self.pending[model] = []
+
+    def medicines(self):
+        rng = self.rng
+        categories = [category.value for category in Medicine.MedicineCategory]
+        self.medicine_ids, self.prices, self.stock = [], [], []
+        for _ in range(self.scale):
+            id = self.take_id(Medicine)
+            name = f"{rng.choice(STEMS)}{rng.choice(SUFFIXES)}"
+            stock = rng.randint(50, 1000)
+            price = rng.randint(2, 5000) * 50  # cents
+            self.add(
+                Medicine(
+                    id=id,
+                    name=f"{name} {rng.choice(STRENGTHS)}mg {rng.choice(FORMS)} {id}",
+                    short_name=f"{name[:8].upper()}{id}"[:20],
+                    category=rng.choice(categories),
+                    description=f"{name} for seeded benchmarks.",
+                    price=money(price),
+                    stock=stock,
+                    created_at=self.start,
+                    updated_at=self.start,
+                )
+            )
+            self.add_row(
+                Inventory,
+                self.take_id(Inventory),
+                id,
+                stock,
+                Inventory.ChangeReason.INITIAL_STOCK.value,
+                stamp(self.start),
+            )
+            self.medicine_ids.append(id)
+            self.prices.append(price)
+            self.stock.append(stock)
+        self.flush(Medicine, Inventory)
+        self.log(f"{self.scale} medicines")
+
+    def users(self):
+        rng, password = self.rng, make_password(PASSWORD)
+        span = self.end - self.start
+        # Half joined before the period
+        joined = sorted(self.end - 2 * span * rng.random() for _ in range(self.scale))
+        self.joined, self.user_ids, self.account_ids = joined, [], []
+        for date_joined in joined:
+            account_id, user_id = self.take_id(Account), self.take_id(CustomUser)
+            self.add(
+                Account(
+                    id=account_id,
+                    balance=0,
+                    created_at=date_joined,
+                    updated_at=date_joined,
+                )
+            )
+            self.add(
+                CustomUser(
+                    id=user_id,
+                    username=f"user{user_id}",
+                    email=f"user{user_id}@example.com",
+                    password=password,
+                    date_joined=date_joined,
+                    account_id=account_id,
+                    profile="",
+                )
+            )
+            self.user_ids.append(user_id)
+            self.account_ids.append(account_id)
+            if len(self.pending[CustomUser]) >= CHUNK_SIZE:
+                self.flush(Account, CustomUser)
+        self.flush(Account, CustomUser)
+        self.balances = [0] * self.scale  # cents
+        self.last_event = list(joined)
+        self.log(f"{self.scale} users")
+
+    def post(self, customer: int, cents: int, kind, reference: str, when):
+        self.balances[customer] += cents
+        self.last_event[customer] = when
+        self.add_row(
+            LedgerEntry,
+            self.take_id(LedgerEntry),
+            self.account_ids[customer],
+            kind.value,
+            str(money(cents)),
+            str(money(self.balances[customer])),
+            reference,
+            stamp(when),
+        )
+
+    def order(self, when: datetime):
+        rng = self.rng
+        # Customers who had joined by then, popular medicines more often
+        customer = rng.randrange(max(bisect_right(self.joined, when), 1))
+        medicine = int(self.scale * rng.random() ** 3)
+        quantity = rng.randint(1, 3)
+        total = self.prices[medicine] * quantity
+        medicine_id = self.medicine_ids[medicine]
+
+        if self.balances[customer] < total:
+            paid_at = max(
+                self.last_event[customer], when - timedelta(minutes=rng.randint(1, 60))
+            )
+            amount = total - self.balances[customer] + rng.choice(TOP_UPS) * 100
+            payment_id = self.take_id(Payment)
+            self.add_row(
+                Payment,
+                payment_id,
+                self.user_ids[customer],
+                str(money(amount)),
+                rng.choice(PAYMENT_METHODS),
+                f"SEED{payment_id}",
+                stamp(paid_at),
+            )
+            self.post(
+                customer,
+                amount,
+                LedgerEntry.EntryKind.PAYMENT,
+                f"Payment {payment_id}",
+                paid_at,
+            )
+        if self.stock[medicine] < quantity:
+            restock = rng.randint(100, 1000)
+            self.stock[medicine] += restock
+            self.add_row(
+                Inventory,
+                self.take_id(Inventory),
+                medicine_id,
+                restock,
+                Inventory.ChangeReason.STOCK_UPDATE.value,
+                stamp(when),
+            )
+
+        order_id = self.take_id(Order)
+        age = self.end - when
+        if age > timedelta(days=7):
+            status = Order.OrderStatus.DELIVERED
+        elif age > timedelta(days=2):
+            status = Order.OrderStatus.PROCESSED
+        else:
+            status = Order.OrderStatus.PENDING
+        self.add_row(
+            Order,
+            order_id,
+            self.user_ids[customer],
+            medicine_id,
+            quantity,
+            "--",
+            str(money(total)),
+            status.value,
+            stamp(when),
+            stamp(when),
+        )
+        self.stock[medicine] -= quantity
+        self.add_row(
+            Inventory,
+            self.take_id(Inventory),
+            medicine_id,
+            -quantity,
+            Inventory.ChangeReason.INITIAL_SALE.value,
+            stamp(when),
+        )
+        self.post(
+            customer, -total, LedgerEntry.EntryKind.ORDER, f"Order {order_id}", when
+        )
+
+    def history(self):
+        rng = self.rng
+        per_day, extra = divmod(self.orders, self.days)
+        for day in range(self.days):
+            opening = self.start + timedelta(days=day)
+            count = per_day + (day < extra)
+            for offset in sorted(rng.random() for _ in range(count)):
+                self.order(opening + timedelta(days=offset))
+                if len(self.pending[Order]) >= CHUNK_SIZE:
+                    self.flush(Payment, Order, Inventory, LedgerEntry)
+                    self.log(f"{self.counts[Order]} of {self.orders} orders")
+        self.flush(Payment, Order, Inventory, LedgerEntry)
+        self.log(f"{self.counts[Order]} orders")
+
+    def settle(self):
+        """Cached balances & stock, from the ledger & inventory"""
+        first_medicine, first_account = self.medicine_ids[0], self.account_ids[0]
+        with transaction.atomic():
+            Medicine.objects.filter(id__gte=first_medicine).update(
+                stock=Subquery(
+                    Inventory.objects.filter(medicine=OuterRef("pk"))
+                    .values("medicine")
+                    .annotate(total=Sum("change"))
+                    .values("total")
+                )
+            )
+            Account.objects.filter(id__gte=first_account, entries__isnull=False).update(
+                balance=Subquery(
+                    LedgerEntry.objects.filter(account=OuterRef("pk"))
+                    .order_by("-created_at", "-id")
+                    .values("balance")[:1]
+                ),
+                updated_at=Subquery(
+                    LedgerEntry.objects.filter(account=OuterRef("pk"))
+                    .order_by("-created_at", "-id")
+                    .values("created_at")[:1]
+                ),
+            )
+        bump_catalog_version()
+        cache.delete_many(
+            [
+                sales_day_key(timezone.localdate(self.start + timedelta(days=day)))
+                for day in range(self.days + 1)
+            ]
+        )
+
+
+def seed(
+    scale: int,
+    seed: int = 0,
+    orders_per_user: int = 10,
+    days: int = 365,
+    end: datetime | None = None,
+    log=print,
+) -> dict[str, int]:
+    """Seeds the database. Returns total rows written per model."""
+    if end is None:
+        end = timezone.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    end = end.astimezone(dt_timezone.utc)
+    seeder = Seeder(scale, seed, orders_per_user, days, end, log)
+    with given_timestamps(Medicine, Account):
+        seeder.medicines()
+        seeder.users()
+        seeder.history()
+    seeder.settle()
+    return {
+        str(model._meta.verbose_name_plural).lower(): total
+        for model, total in seeder.counts.items()
+    }
@@ -0,0 +1,37 @@
+'use strict';
+// Sidebar filters of `pharmacy.changelist.AutocompleteFilter`, select2 fed
+// by the admin's autocomplete view. Named only once an object is chosen,
+// so that an empty filter is left out of the query string.
+document.addEventListener('DOMContentLoaded', function () {
+    // The jQuery select2 is loaded on, at the end of the page
+    const $ = window.jQuery;
+    $('.autocomplete-filter').each(function () {
+        const $select = $(this);
+        $select.select2({
+            width: '100%',
+            allowClear: true,
+            placeholder: $select.data('placeholder'),
+            ajax: {
+                url: $select.data('url'),
+                dataType: 'json',
+                delay: 250,
+                data: function (params) {
+                    return {
+                        term: params.term,
+                        page: params.page,
+                        app_label: $select.data('app-label'),
+                        model_name: $select.data('model-name'),
+                        field_name: $select.data('field-name')
+                    };
+                }
+            }
+        });
+        $select.on('change', function () {
+            if ($select.val()) {
+                $select.attr('name', $select.data('name'));
+            } else {
+                $select.removeAttr('name');
+            }
+        }).trigger('change');
+    });
+});
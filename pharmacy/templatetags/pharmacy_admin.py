@@ -0,0 +1,25 @@
+import copy
+from django import template
+from django.contrib.admin.templatetags.admin_list import date_hierarchy
+from django.contrib.admin.templatetags.base import InclusionAdminNode
+from pharmacy.changelist import DatePeriods
+
+register = template.Library()
+
+
+def indexed_date_hierarchy(cl):
+    """Django's `date_hierarchy`, finding the dates listed by `DatePeriods`"""
+    cl = copy.copy(cl)
+    cl.queryset = DatePeriods(cl.queryset)
+    return date_hierarchy(cl)
+
+
+@register.tag(name="indexed_date_hierarchy")
+def indexed_date_hierarchy_tag(parser, token):
+    return InclusionAdminNode(
+        parser,
+        token,
+        func=indexed_date_hierarchy,
+        template_name="date_hierarchy.html",
+        takes_context=False,
+    )
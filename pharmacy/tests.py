@@ -1,3 +1,1401 @@
-from django.test import TestCase
+import asyncio
+import copy
+import gzip
+import io
+import json
+import random
+import re
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+
+from django.contrib.auth.models import Group
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection, transaction, OperationalError
+from django.db.models import Sum
+from django.db.models.signals import post_save
+from django.db.backends.signals import connection_created
+from django.test import Client, TransactionTestCase
+from django.urls import reverse
+from django.utils import timezone
+from fastapi.testclient import TestClient
+from users.models import CustomUser, Payment, Account, LedgerEntry
+from users.ledger import reconcile
+from api.static import PrecompressedStaticFiles, IMMUTABLE, REVALIDATE
+from api.v1 import idempotency
+from pharmacy import analytics, assets, images
+from pharmacy.catalog import FIELDS, READERS, import_catalog
+from pharmacy.forecast import reorder_points, update_forecasts
+from pharmacy.inventory import stock_at, stock_history, take_snapshots
+from pharmacy.exceptions import (
+    CatalogImportError,
+    InsufficientBalanceError,
+    InsufficientStockError,
+)
+from pharmacy.models import (
+    Medicine,
+    Order,
+    Inventory,
+    InventorySnapshot,
+    DemandForecast,
+    CatalogVersion,
+    IdempotencyKey,
+)
+
+# `SCAN table` without an index, unlike `SCAN table USING INDEX ...`
+FULL_SCAN = re.compile(r"^SCAN (\w+)$")
+
+# Statements of every connection, API requests run on worker threads
+statements: list[tuple[str, tuple]] = []
+
+
+def record(execute, sql, params, many, context):
+    statements.append((sql, params))
+    return execute(sql, params, many, context)
+
+
+def install_recorder(sender, connection, **kwargs):
+    connection.execute_wrappers.append(record)
+
+
+connection_created.connect(install_recorder)
+
+
+class QueryPlanTestCase(TransactionTestCase):
+    """Runs `EXPLAIN QUERY PLAN` on the queries made by requests"""
+
+    def setUp(self):
+        # Image variants are beside the point
+        patcher = mock.patch("pharmacy.images.has_variants", return_value=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        statements.clear()
+
+    def plan(self, sql: str, params) -> list[str]:
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+            return [detail for *_, detail in cursor.fetchall()]
+
+    def full_scans(self, sql: str, params) -> list[str]:
+        if not re.match(r"\s*(SELECT|UPDATE|DELETE)\b", sql, re.IGNORECASE):
+            return []
+        # Not subqueries or SQLite's own catalog
+        tables = connection.introspection.table_names()
+        return [
+            match.group(1)
+            for detail in self.plan(sql, params)
+            if (match := FULL_SCAN.match(detail)) and match.group(1) in tables
+        ]
+
+    def assertNoFullScans(self, queries: list[tuple[str, tuple]], allowed=()):
+        """`allowed` tables may be scanned, the rest must be searched"""
+        queries = list(queries)
+        self.assertTrue(queries, "No queries captured")
+        failures = [
+            f"{', '.join(tables)} <- {sql}"
+            for sql, params in queries
+            if (tables := set(self.full_scans(sql, params)) - set(allowed))
+        ]
+        self.assertFalse(failures, "Full table scans:\n" + "\n".join(failures))
+
+    @contextmanager
+    def assertNumStatements(self, count: int):
+        """`assertNumQueries` of every connection, not just this thread's"""
+        statements.clear()
+        yield
+        self.assertEqual(
+            len(statements), count, "\n".join(sql for sql, _ in statements)
+        )
+
+
+class APIQueryPlanTest(QueryPlanTestCase):
+    def setUp(self):
+        super().setUp()
+        from api import app
+        from api.v1.cache import user_cache
+
+        # Tokens are reused by tests, their users are not
+        user_cache.clear()
+        self.client = TestClient(app)
+        self.customer = CustomUser.objects.create(
+            username="customer", password="customer", token="pms_customer"
+        )
+        Payment.objects.create(
+            user=self.customer, amount=Decimal("10000"), reference="--"
+        )
+        self.medicines = [
+            Medicine.objects.create(
+                name=f"Medicine {index}",
+                short_name=f"M{index}",
+                category=category.value,
+                price=Decimal(10 + index),
+                stock=100,
+            )
+            for index, category in enumerate(Medicine.MedicineCategory)
+        ]
+        self.headers = {"Authorization": "Bearer pms_customer"}
+        statements.clear()
+
+    def test_catalog(self):
+        medicine = self.medicines[0]
+        for path, params in [
+            ("/api/v1/medicine", {}),
+            ("/api/v1/medicine", {"category": medicine.category, "limit": 2}),
+            ("/api/v1/medicine", {"price": 12}),
+            ("/api/v1/medicine", {"name": "medicine", "short_name": "m"}),
+            ("/api/v1/medicine/search", {"q": "medicine"}),
+            ("/api/v1/medicine/suggest", {"q": "med"}),
+            (f"/api/v1/medicine/{medicine.id}", {}),
+        ]:
+            response = self.client.get(path, params=params)
+            self.assertEqual(response.status_code, 200, path)
+        # Next page
+        response = self.client.get("/api/v1/medicine", params={"limit": 1})
+        self.client.get(
+            "/api/v1/medicine",
+            params={"limit": 1, "cursor": response.headers["X-Next-Cursor"]},
+        )
+        self.assertNoFullScans(statements)
+
+    def test_orders(self):
+        client, headers = self.client, self.headers
+        first, second = self.medicines[:2]
+        response = client.post(
+            f"/api/v1/order/{first.id}", json={"quantity": 2}, headers=headers
+        )
+        self.assertEqual(response.status_code, 200, response.text)
+        order_id = response.json()["id"]
+        response = client.post(
+            "/api/v1/orders/checkout",
+            json={
+                "items": [
+                    {"medicine_id": first.id, "quantity": 1},
+                    {"medicine_id": second.id, "quantity": 1},
+                ]
+            },
+            headers=headers,
+        )
+        self.assertEqual(response.status_code, 200, response.text)
+        response = client.patch(
+            f"/api/v1/order/{order_id}", json={"quantity": 1}, headers=headers
+        )
+        self.assertEqual(response.status_code, 200, response.text)
+        for params in [
+            {},
+            {"status": Order.OrderStatus.PENDING.value},
+            {"created_after": "2020-01-01T00:00:00Z", "limit": 1},
+            {"limit": 1000},
+        ]:
+            response = client.get("/api/v1/orders", params=params, headers=headers)
+            self.assertEqual(response.status_code, 200, response.text)
+        response = client.delete(f"/api/v1/order/{order_id}", headers=headers)
+        self.assertEqual(response.status_code, 200, response.text)
+        self.assertNoFullScans(statements)
+
+    def test_orders_next_page(self):
+        for medicine in self.medicines[:3]:
+            Order.objects.create(customer=self.customer, medicine=medicine, quantity=1)
+        # Ties on `created_at` are told apart by id
+        Order.objects.update(created_at=timezone.now())
+        ids, cursor = [], None
+        for _ in range(3):
+            statements.clear()
+            response = self.client.get(
+                "/api/v1/orders",
+                params={"limit": 1, "cursor": cursor},
+                headers=self.headers,
+            )
+            ids += [order["id"] for order in response.json()]
+            cursor = response.headers.get("X-Next-Cursor")
+        self.assertEqual(
+            ids, list(Order.objects.order_by("-id").values_list("id", flat=True))
+        )
+        self.assertIsNone(cursor)
+        # The cursor is sought in the index, not filtered row by row
+        sql, params = next(
+            (sql, params) for sql, params in statements if "pharmacy_order" in sql
+        )
+        self.assertIn(
+            "USING INDEX order_customer_created_id_idx (customer_id=? AND created_at<?)",
+            "\n".join(self.plan(sql, params)),
+        )
+
+    def test_streams_bounded(self):
+        from api.v1 import routes
+
+        slots = threading.BoundedSemaphore(1)
+        path, headers = "/api/v1/orders", self.headers
+        with mock.patch.object(routes, "stream_slots", slots):
+            self.assertTrue(slots.acquire(blocking=False))
+            response = self.client.get(path, headers=headers)
+            self.assertEqual(response.status_code, 503)
+            self.assertEqual(response.headers["Retry-After"], "1")
+            # Pages short of a stream are served meanwhile
+            response = self.client.get(path, params={"limit": 20}, headers=headers)
+            self.assertEqual(response.status_code, 200)
+            slots.release()
+            response = self.client.get(path, headers=headers)
+            self.assertEqual(response.status_code, 200)
+            # Its slot is released once sent
+            self.assertTrue(slots.acquire(blocking=False))
+
+    def test_orders_queries(self):
+        Order.objects.bulk_create(
+            Order(
+                customer=self.customer,
+                medicine=medicine,
+                quantity=1,
+                prescription="--",
+                total_price=medicine.price,
+            )
+            for medicine in self.medicines * 30
+        )
+        path, headers = "/api/v1/orders", self.headers
+        self.client.get(path, headers=headers)  # Caches the user
+        with self.assertNumStatements(1):
+            response = self.client.get(path, params={"limit": 20}, headers=headers)
+        self.assertEqual(len(response.json()), 20)
+        # Streamed, next page cursor then a query per 100 of the 210
+        with self.assertNumStatements(4):
+            response = self.client.get(path, params={"limit": 1000}, headers=headers)
+        self.assertEqual(len(response.json()), len(self.medicines) * 30)
+        # Without `limit` or `cursor`, every order as before pagination
+        with self.assertNumStatements(3):
+            response = self.client.get(path, headers=headers)
+        self.assertEqual(len(response.json()), len(self.medicines) * 30)
+        self.assertNotIn("X-Next-Cursor", response.headers)
+        # Exported in a single query, joins included
+        self.customer.is_staff = True
+        self.customer.save()
+        self.client.get("/api/v1/exports/orders", headers=headers)
+        with self.assertNumStatements(1):
+            response = self.client.get("/api/v1/exports/orders", headers=headers)
+        self.assertEqual(len(response.text.splitlines()), len(self.medicines) * 30)
+        # A query per chunk, each seeking past the last id of the previous
+        with mock.patch("api.v1.exports.EXPORT_CHUNK_SIZE", 100):
+            with self.assertNumStatements(3):
+                response = self.client.get(
+                    "/api/v1/exports/orders",
+                    params={"format": "csv", "fields": "quantity", "gzip": True},
+                    headers=headers,
+                )
+        rows = gzip.decompress(response.content).decode().splitlines()
+        self.assertEqual(rows, ["quantity"] + ["1"] * len(self.medicines) * 30)
+        sql, params = statements[-1]
+        self.assertIn("pharmacy_order.id >", sql.replace('"', ""))
+        self.assertNoFullScans(statements[-1:])
+
+    def test_suggest_order(self):
+        for name in ["Zinc", "Medazepam", "Mebendazole"]:
+            Medicine.objects.create(
+                name=name, category=self.medicines[0].category, price=1, stock=1
+            )
+        response = self.client.get(
+            "/api/v1/medicine/suggest", params={"q": "me", "limit": 3}
+        )
+        self.assertEqual(
+            [medicine["name"] for medicine in response.json()],
+            ["Mebendazole", "Medazepam", "Medicine 0"],
+        )
+        # Misspelt, from the trigram index
+        response = self.client.get(
+            "/api/v1/medicine/search", params={"q": "mebndazole"}
+        )
+        self.assertEqual(response.json()[0]["name"], "Mebendazole")
+
+    def test_catalog_etag(self):
+        path = f"/api/v1/medicine/{self.medicines[0].id}"
+        # `*` matches existing medicines only, cached or not
+        response = self.client.get(path, headers={"If-None-Match": "*"})
+        self.assertEqual(response.status_code, 304)
+        missing = f"/api/v1/medicine/{max(m.id for m in self.medicines) + 1}"
+        for _ in range(2):
+            response = self.client.get(missing, headers={"If-None-Match": "*"})
+            self.assertEqual(response.status_code, 404)
+        etag = self.client.get(path).headers["ETag"]
+        for if_none_match in [etag, f'"other", W/{etag}', "*"]:
+            response = self.client.get(path, headers={"If-None-Match": if_none_match})
+            self.assertEqual(response.status_code, 304, if_none_match)
+        response = self.client.get(path, headers={"If-None-Match": '"other"'})
+        self.assertEqual(response.status_code, 200)
+        # Stamped in the database, every process sees the change
+        version = CatalogVersion.objects.get().version
+        self.medicines[0].increase_stock(1)
+        self.assertEqual(CatalogVersion.objects.get().version, version + 1)
+        response = self.client.get(path, headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["stock"], 101)
+
+    def test_catalog_offset(self):
+        first = min(medicine.id for medicine in self.medicines)
+        response = self.client.get("/api/v1/medicine", params={"offset": first})
+        self.assertEqual(response.status_code, 200, response.text)
+        self.assertEqual(
+            sorted(medicine["id"] for medicine in response.json()),
+            sorted(medicine.id for medicine in self.medicines if medicine.id > first),
+        )
+
+    def test_account(self):
+        client, headers = self.client, self.headers
+        response = client.post(
+            "/api/v1/token", data={"username": "customer", "password": "customer"}
+        )
+        self.assertEqual(response.status_code, 200, response.text)
+        headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+        self.assertEqual(
+            client.get("/api/v1/profile", headers=headers).status_code, 200
+        )
+        self.assertEqual(
+            client.patch("/api/v1/token", headers=headers).status_code, 200
+        )
+        self.assertNoFullScans(statements)
+
+
+class AdminQueryPlanTest(QueryPlanTestCase):
+    """Changelists, as they open and as filtered from their sidebars"""
+
+    def setUp(self):
+        super().setUp()
+        admin = CustomUser.objects.create(
+            username="admin", password="admin", is_staff=True, is_superuser=True
+        )
+        Payment.objects.create(user=admin, amount=Decimal(10), reference="--")
+        self.medicine = Medicine.objects.create(name="Medicine", price=10, stock=10)
+        self.order = Order.objects.create(
+            customer=admin, medicine=self.medicine, quantity=1
+        )
+        self.group = Group.objects.create(name="Pharmacists")
+        self.admin = admin
+        self.client.force_login(admin)
+        statements.clear()
+
+    def date_hierarchy(self, field: str) -> list[dict]:
+        """Date hierarchy drill-down to today"""
+        today = timezone.localdate()
+        year = {f"{field}__year": today.year}
+        month = {**year, f"{field}__month": today.month}
+        return [year, month, {**month, f"{field}__day": today.day}]
+
+    def assertChangelistNoFullScans(self, model: type, *filters: dict, allowed=()):
+        url = reverse(
+            f"admin:{model._meta.app_label}_{model._meta.model_name}_changelist"
+        )
+        for params in [{}, *filters]:
+            response = self.client.get(url, params)
+            # Unknown lookups redirect to `?e=1`
+            self.assertEqual(response.status_code, 200, f"{url} {params}")
+        self.assertNoFullScans(statements, allowed)
+
+    def test_medicine(self):
+        self.assertChangelistNoFullScans(
+            Medicine,
+            {"category": Medicine.MedicineCategory.PAIN_RELIEF.value},
+            {"created_at__gte": "2020-01-01 00:00:00+00:00"},
+        )
+
+    def test_order(self):
+        self.assertChangelistNoFullScans(
+            Order,
+            {"status__exact": Order.OrderStatus.PENDING.value},
+            {"medicine__id__exact": self.medicine.id},
+            {"customer__id__exact": self.admin.id},
+            {"created_at__gte": "2020-01-01 00:00:00+00:00"},
+            *self.date_hierarchy("created_at"),
+        )
+
+    def test_inventory(self):
+        self.assertChangelistNoFullScans(
+            Inventory,
+            {"medicine__id__exact": self.medicine.id},
+            {"reason__exact": Inventory.ChangeReason.INITIAL_STOCK.value},
+            {"timestamp__gte": "2020-01-01 00:00:00+00:00"},
+            *self.date_hierarchy("timestamp"),
+        )
+
+    def test_payment(self):
+        self.assertChangelistNoFullScans(
+            Payment,
+            {"user__id__exact": self.admin.id},
+            {"method__exact": Payment.PaymentMethod.CASH.name},
+            {"created_at__gte": "2020-01-01 00:00:00+00:00"},
+            *self.date_hierarchy("created_at"),
+        )
+
+    def test_user(self):
+        self.assertChangelistNoFullScans(
+            CustomUser,
+            {"is_staff__exact": 1},
+            {"groups__id__exact": self.group.id},
+            {"date_joined__gte": "2020-01-01 00:00:00+00:00"},
+            *self.date_hierarchy("date_joined"),
+        )
+
+    def test_account(self):
+        # Walked back from the last id, a page at a time
+        self.assertChangelistNoFullScans(Account, allowed={"users_account"})
+
+    def test_inventory_snapshot(self):
+        self.assertChangelistNoFullScans(
+            InventorySnapshot, {"as_of__gte": "2020-01-01 00:00:00+00:00"}
+        )
+
+    def test_demand_forecast(self):
+        self.assertChangelistNoFullScans(
+            DemandForecast,
+            {"medicine__category": Medicine.MedicineCategory.OTHER.value},
+        )
+
+    def test_low_stock_forecasts(self):
+        # Stock vs reorder point compares columns of both tables. There is
+        # a forecast per medicine at most, so the scan is bounded by the
+        # catalog size.
+        self.assertChangelistNoFullScans(
+            DemandForecast, {"low_stock": "yes"}, allowed={"pharmacy_demandforecast"}
+        )
+
+    def test_ledger_entry(self):
+        self.assertChangelistNoFullScans(
+            LedgerEntry,
+            {"kind__exact": LedgerEntry.EntryKind.PAYMENT.value},
+            {"created_at__gte": "2020-01-01 00:00:00+00:00"},
+            *self.date_hierarchy("created_at"),
+        )
+
+    def test_related_search(self):
+        # Customers & medicines are searched apart, then orders by their keys
+        self.assertChangelistNoFullScans(
+            Order, {"q": "admin"}, allowed={"users_customuser", "pharmacy_medicine"}
+        )
+
+    def test_estimated_count(self):
+        # The largest id stands in for `COUNT(*)` of the whole table
+        response = self.client.get(reverse("admin:pharmacy_order_changelist"))
+        self.assertEqual(response.context["cl"].result_count, self.order.id)
+        self.assertFalse([sql for sql, _ in statements if "COUNT(" in sql])
+
+    def test_autocomplete_filter(self):
+        other = Medicine.objects.create(name="Paracetamol", price=10, stock=10)
+        response = self.client.get(
+            reverse("admin:pharmacy_order_changelist"),
+            {"medicine__id__exact": self.medicine.id},
+        )
+        # Only the chosen medicine is listed, the rest are autocompleted
+        self.assertContains(response, f'<option value="{self.medicine.id}" selected>')
+        self.assertNotContains(response, other.name)
+        response = self.client.get(
+            reverse("admin:autocomplete"),
+            {
+                "app_label": "pharmacy",
+                "model_name": "order",
+                "field_name": "medicine",
+                "term": "Paracet",
+            },
+        )
+        self.assertEqual(
+            [result["id"] for result in response.json()["results"]], [str(other.id)]
+        )
+
+
+class MetricsTest(TransactionTestCase):
+    def setUp(self):
+        from api import app
+
+        patcher = mock.patch("pharmacy.images.has_variants", return_value=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = TestClient(app)
+        self.medicine = Medicine.objects.create(name="Medicine", price=10, stock=10)
+
+    def samples(self) -> str:
+        response = self.client.get("/api/metrics")
+        self.assertEqual(response.status_code, 200)
+        return response.text
+
+    def test_route_templates(self):
+        self.client.get(f"/api/v1/medicine/{self.medicine.id}")
+        self.client.get("/d/admin/login/")
+        self.client.get("/d/no-such-page")
+        samples = self.samples()
+        for sample in [
+            'http_request_duration_seconds_count{method="GET",'
+            'route="/api/v1/medicine/{medicine_id}",status="200"}',
+            'http_request_duration_seconds_count{method="GET",'
+            'route="/d/admin/login/",status="200"}',
+            'http_request_duration_seconds_count{method="GET",'
+            'route="/d/{path}",status="404"}',
+            'http_request_db_queries_count{method="GET",'
+            'route="/api/v1/medicine/{medicine_id}"}',
+            "threadpool_waiting ",
+        ]:
+            self.assertIn(sample, samples)
+
+    def test_db_queries(self):
+        admin = CustomUser.objects.create(
+            username="admin", password="admin", is_staff=True, is_superuser=True
+        )
+        session = Client()
+        session.force_login(admin)
+        self.client.cookies.set("sessionid", session.cookies["sessionid"].value)
+        self.client.get("/d/admin/pharmacy/medicine/")
+        sum_line = next(
+            line
+            for line in self.samples().splitlines()
+            if line.startswith(
+                'http_request_db_queries_sum{method="GET",'
+                'route="/d/admin/pharmacy/medicine/"}'
+            )
+        )
+        self.assertGreater(float(sum_line.split()[-1]), 0)
+
+
+class SQLProfilerTest(TransactionTestCase):
+    def setUp(self):
+        from api import app
+
+        for patcher in [
+            mock.patch("pharmacy.images.has_variants", return_value=True),
+            mock.patch("api.metrics.SQL_PROFILER", True),
+        ]:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.client = TestClient(app)
+        self.customer = CustomUser.objects.create(
+            username="customer", password="customer", token="pms_customer"
+        )
+
+    def assertProfiled(self, response):
+        self.assertEqual(response.status_code, 200, response.text)
+        self.assertGreater(int(response.headers["X-DB-Queries"]), 0)
+        self.assertGreaterEqual(float(response.headers["X-DB-Time"]), 0)
+
+    def test_headers(self):
+        # User and a page of orders looked up in the threadpool
+        self.assertProfiled(
+            self.client.get(
+                "/api/v1/orders",
+                params={"limit": 20},
+                headers={"Authorization": "Bearer pms_customer"},
+            )
+        )
+        # Django, through `WSGIMiddleware`
+        self.customer.is_staff = self.customer.is_superuser = True
+        self.customer.save()
+        session = Client()
+        session.force_login(self.customer)
+        self.client.cookies.set("sessionid", session.cookies["sessionid"].value)
+        self.assertProfiled(self.client.get("/d/admin/pharmacy/order/"))
+
+    @mock.patch("pharmacy.profiler.SQL_DUPLICATE_THRESHOLD", 1)
+    def test_duplicate_queries_log(self):
+        with self.assertLogs("pharmacy.profiler", "WARNING") as logs:
+            self.client.get(
+                "/api/v1/orders", headers={"Authorization": "Bearer pms_customer"}
+            )
+        record = json.loads(logs.records[-1].getMessage())
+        self.assertEqual(record["route"], "/api/v1/orders")
+        self.assertTrue(record["duplicate_queries"])
+
+
+class ConcurrentOrderTest(TransactionTestCase):
+    """Orders placed & cancelled from many threads, on one medicine"""
+
+    THREADS = 8
+    ORDERS = 40  # Per thread
+    STOCK = 200
+
+    def setUp(self):
+        patcher = mock.patch("pharmacy.images.has_variants", return_value=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.medicine = Medicine.objects.create(
+            name="Medicine", price=10, stock=self.STOCK
+        )
+        self.customers = [
+            CustomUser.objects.create(username=f"customer{index}")
+            for index in range(self.THREADS // 2)
+        ]
+        for customer in self.customers:
+            # Short of paying for every order the threads attempt
+            customer.account.credit(
+                Decimal(1_000), LedgerEntry.EntryKind.PAYMENT, "Stress test"
+            )
+
+    def attempt(self, action):
+        """Runs `action` until it is not turned away by a database lock"""
+        while True:
+            try:
+                return action()
+            except (InsufficientStockError, InsufficientBalanceError):
+                return None
+            except OperationalError as e:
+                # FTS5 reports a lock met opening its tables as the latter
+                if "locked" not in str(e) and "vtable constructor" not in str(e):
+                    raise
+                time.sleep(0.001)
+
+    def shop(self, index: int, errors: list):
+        rng = random.Random(index)
+        customer = self.attempt(
+            lambda: CustomUser.objects.get(pk=self.customers[index % 4].pk)
+        )
+        try:
+            for _ in range(self.ORDERS):
+                quantity = rng.randint(1, 3)
+                if rng.random() < 0.5:
+                    self.attempt(
+                        lambda: Order.objects.create(
+                            customer=customer,
+                            medicine=Medicine.objects.get(pk=self.medicine.pk),
+                            quantity=quantity,
+                            prescription="--",
+                        )
+                    )
+                else:
+                    self.attempt(
+                        lambda: Order.checkout(customer, [(self.medicine.pk, quantity)])
+                    )
+                if rng.random() < 0.2:
+                    # Cancelled by other threads too, refunded once
+                    order = self.attempt(
+                        Order.objects.filter(medicine=self.medicine).first
+                    )
+                    if order:
+                        # A failed delete leaves the instance without its id
+                        self.attempt(lambda: copy.copy(order).delete())
+        except Exception as e:
+            errors.append(e)
+        finally:
+            connection.close()
+
+    def test_no_oversell(self):
+        errors = []
+        threads = [
+            threading.Thread(target=self.shop, args=(index, errors))
+            for index in range(self.THREADS)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertFalse(errors)
+
+        self.medicine.refresh_from_db()
+        ordered = sum(Order.objects.values_list("quantity", flat=True))
+        self.assertGreaterEqual(self.medicine.stock, 0)
+        self.assertEqual(self.medicine.stock, self.STOCK - ordered)
+        # Never below zero on the way, the log is in commit order
+        changes = Inventory.objects.filter(medicine=self.medicine).order_by("id")
+        level = 0
+        for change in changes.values_list("change", flat=True):
+            level += change
+            self.assertGreaterEqual(level, 0)
+        self.assertEqual(level, self.medicine.stock)
+        # Every balance is its ledger's, and paid for what is ordered
+        self.assertEqual(reconcile(), (len(self.customers), []))
+        for customer in self.customers:
+            paid = Order.objects.filter(customer=customer).aggregate(
+                total=Sum("total_price")
+            )["total"] or Decimal(0)
+            customer.account.refresh_from_db()
+            self.assertEqual(customer.account.balance, Decimal(1_000) - paid)
+
+
+class SaveQueriesTest(TransactionTestCase):
+    """Queries of saving models that remember their loaded values"""
+
+    def setUp(self):
+        patcher = mock.patch("pharmacy.images.has_variants", return_value=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.customer = CustomUser.objects.create(username="customer")
+        self.customer.account.credit(
+            Decimal(1_000), LedgerEntry.EntryKind.PAYMENT, "Save queries"
+        )
+        self.medicine = Medicine.objects.create(name="Medicine", price=10, stock=10)
+
+    def assertSaved(self, instance, queries: int, columns: set[str]):
+        """Saves `instance` in `queries` queries, updating `columns` only"""
+        saved = mock.Mock()
+        post_save.connect(saved, sender=type(instance))
+        self.addCleanup(post_save.disconnect, saved, sender=type(instance))
+        with self.assertNumQueries(queries) as context:
+            instance.save()
+        saved.assert_called_once()
+        updates = [
+            query["sql"]
+            for query in context.captured_queries
+            if query["sql"].startswith(f'UPDATE "{instance._meta.db_table}"')
+        ]
+        self.assertEqual(
+            (
+                set(re.findall(r'"(\w+)" = ', updates[0].split(" WHERE ")[0]))
+                if updates
+                else set()
+            ),
+            columns,
+        )
+
+    def test_medicine(self):
+        # Row, catalog version & inventory
+        with self.assertNumQueries(3):
+            medicine = Medicine.objects.create(name="Other", price=10, stock=5)
+        medicine = Medicine.objects.get(pk=medicine.pk)
+        medicine.price = 12
+        self.assertSaved(medicine, 2, {"price", "updated_at"})
+        self.assertSaved(medicine, 0, set())
+        medicine.stock = 7
+        self.assertSaved(medicine, 3, {"stock", "updated_at"})
+        # Catalog version, then the row and its dependents in bulk
+        with self.assertNumQueries(8):
+            medicine.delete()
+
+    def test_order(self):
+        # Stock, catalog version & inventory, the row, then the debit
+        with self.assertNumQueries(11):
+            order = Order.objects.create(
+                customer=self.customer, medicine=self.medicine, quantity=2
+            )
+        order = Order.objects.select_related("medicine", "customer__account").get(
+            pk=order.pk
+        )
+        order.status = Order.OrderStatus.PROCESSED.value
+        # Locked re-read of the quantity, then the row
+        self.assertSaved(order, 4, {"status", "updated_at"})
+        self.assertSaved(order, 0, set())
+        order.quantity = 3
+        # Also stock, catalog version, the debit & inventory
+        self.assertSaved(order, 12, {"quantity", "total_price", "updated_at"})
+        with self.assertNumQueries(11):
+            order.delete()
+
+    def test_order_stale_copy(self):
+        order = Order.objects.create(
+            customer=self.customer, medicine=self.medicine, quantity=2
+        )
+        first, second = Order.objects.get(pk=order.pk), Order.objects.get(pk=order.pk)
+        first.quantity = 4
+        first.save()
+        # Moved from the 4 saved, not the 2 this copy was loaded with
+        second.quantity = 1
+        second.save()
+        self.medicine.refresh_from_db()
+        self.assertEqual(self.medicine.stock, 10 - 1)
+        self.customer.account.refresh_from_db()
+        self.assertEqual(self.customer.account.balance, Decimal(1_000 - 10))
+
+    def test_user(self):
+        # Account, then the user
+        with self.assertNumQueries(2):
+            user = CustomUser.objects.create(username="other", profile="")
+        user = CustomUser.objects.get(pk=user.pk)
+        user.location = "Nairobi"
+        self.assertSaved(user, 1, {"location"})
+        self.assertSaved(user, 0, set())
+        # The user and rows referring to it, idempotency keys among them
+        with self.assertNumQueries(9):
+            user.delete()
+
+
+class InventoryHistoryTest(TransactionTestCase):
+    """Stock at a time, from checkpoints and the inventory log"""
+
+    def setUp(self):
+        patcher = mock.patch("pharmacy.images.has_variants", return_value=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.start = datetime(2026, 1, 1, tzinfo=dt_timezone.utc)
+        self.medicine = Medicine.objects.create(name="Medicine", price=10, stock=10)
+        self.log(0, None)  # Initial stock of 10
+
+    def log(self, hours: int, change: int | None) -> datetime:
+        """Logs `change` (or dates the last entry) `hours` after the start"""
+        if change is not None:
+            Inventory.objects.create(
+                medicine=self.medicine,
+                change=change,
+                reason=Inventory.ChangeReason.STOCK_UPDATE.value,
+            )
+        timestamp = self.start + timedelta(hours=hours)
+        Inventory.objects.filter(pk=Inventory.objects.latest("id").pk).update(
+            timestamp=timestamp
+        )
+        return timestamp
+
+    def assertStock(self, levels: dict[int, int]):
+        """Stock `hours` after the start, per hours"""
+        for hours, stock in levels.items():
+            when = self.start + timedelta(hours=hours)
+            self.assertEqual(stock_at(self.medicine.id, when), stock, hours)
+
+    def test_stock_at(self):
+        self.log(1, -3)
+        self.assertEqual(take_snapshots(), 1)
+        self.assertEqual(take_snapshots(), 0)  # Nothing logged since
+        self.log(2, 5)
+        self.log(3, -4)
+        levels = {-1: 0, 0: 10, 1: 7, 1.5: 7, 2: 12, 3: 8, 4: 8}
+        self.assertStock(levels)
+        # From the later checkpoint on, the earlier one before it
+        self.assertEqual(take_snapshots(), 1)
+        self.assertEqual(
+            list(InventorySnapshot.objects.order_by("as_of").values_list("stock")),
+            [(7,), (8,)],
+        )
+        self.assertStock(levels)
+
+    def test_stock_history(self):
+        t1, t2 = self.log(1, -3), self.log(2, 5)
+        take_snapshots()
+        t3 = self.log(3, -4)
+        start = self.start + timedelta(minutes=30)
+        self.assertEqual(
+            stock_history(self.medicine.id, start, t3),
+            [(start, 10), (t1, 7), (t2, 12), (t3, 8)],
+        )
+        self.assertEqual(
+            stock_history(self.medicine.id, start, t2),
+            [(start, 10), (t1, 7), (t2, 12)],
+        )
+
+    def test_naive_times(self):
+        from api import app
+
+        self.log(1, -3)
+        self.log(2, 5)
+        CustomUser.objects.create(username="staff", token="pms_staff", is_staff=True)
+        client = TestClient(app)
+        path = f"/api/v1/inventory/{self.medicine.id}/stock"
+        headers = {"Authorization": "Bearer pms_staff"}
+        # 01:30 UTC, of the server's time zone, not 04:30 UTC
+        naive = client.get(path, params={"at": "2026-01-01T04:30:00"}, headers=headers)
+        self.assertEqual(naive.status_code, 200, naive.text)
+        self.assertEqual(naive.json()["stock"], 7)
+        self.assertEqual(naive.json()["timestamp"], "2026-01-01T04:30:00+03:00")
+        utc = client.get(path, params={"at": "2026-01-01T04:30:00Z"}, headers=headers)
+        self.assertEqual(utc.json()["stock"], 12)
+        history = client.get(
+            f"/api/v1/inventory/{self.medicine.id}/history",
+            params={"start": "2026-01-01T03:30:00", "end": "2026-01-01T04:30:00"},
+            headers=headers,
+        )
+        self.assertEqual([level["stock"] for level in history.json()], [10, 7])
+
+
+class ForecastTest(TransactionTestCase):
+    def setUp(self):
+        patcher = mock.patch("pharmacy.images.has_variants", return_value=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        customer = CustomUser.objects.create(username="customer")
+        customer.account.credit(Decimal(1_000), LedgerEntry.EntryKind.PAYMENT, "--")
+        for index in range(5):
+            medicine = Medicine.objects.create(
+                name=f"Medicine {index}", price=1, stock=100
+            )
+            for quantity in range(1, index + 2):
+                Order.objects.create(
+                    customer=customer, medicine=medicine, quantity=quantity
+                )
+        # Sold over the past days, one order a day
+        for days, entry in enumerate(
+            Inventory.objects.filter(change__lt=0).order_by("-id")
+        ):
+            Inventory.objects.filter(pk=entry.pk).update(
+                timestamp=timezone.now() - timedelta(days=days)
+            )
+
+    def forecasts(self, chunk_size: int) -> list[tuple]:
+        DemandForecast.objects.all().delete()
+        with mock.patch("pharmacy.forecast.MEDICINES_PER_CHUNK", chunk_size):
+            self.assertEqual(update_forecasts(), 5)
+        return list(
+            DemandForecast.objects.order_by("medicine_id").values_list(
+                "demand", "variance", "reorder_point", "days_observed"
+            )
+        )
+
+    def test_chunks(self):
+        # Medicines forecast a chunk at a time as they would all at once
+        self.assertEqual(self.forecasts(2), self.forecasts(1_000))
+        self.assertEqual(update_forecasts(), 5)  # Nothing new sold
+        forecast = DemandForecast.objects.select_related("medicine").last()
+        self.assertGreater(forecast.demand, 0)
+        demand, variance = np.array([forecast.demand]), np.array([forecast.variance])
+        self.assertEqual(forecast.reorder_point, reorder_points(demand, variance)[0])
+
+
+class ImageVariantsTest(TransactionTestCase):
+    """Variants are made for new images only and listed off their record"""
+
+    def setUp(self):
+        patcher = mock.patch("pharmacy.images.submit")
+        self.submit = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.customer = CustomUser.objects.create(username="customer")
+        self.submit.reset_mock()
+
+    def test_schedule(self):
+        self.customer.last_login = timezone.now()
+        self.customer.save()
+        self.customer.save(update_fields=["last_login"])
+        self.submit.assert_not_called()
+        self.customer.profile = "user_profile/customer.jpg"
+        self.customer.save()
+        self.submit.assert_called_once_with("user_profile/customer.jpg")
+        # Already recorded
+        images.record_variants("user_profile/customer.jpg", [160])
+        self.submit.reset_mock()
+        CustomUser.objects.get(pk=self.customer.pk).save(force_update=True)
+        self.submit.assert_not_called()
+
+    def test_srcset(self):
+        medicine = Medicine.objects.create(name="Medicine", price=10, stock=10)
+        name = medicine.picture.name
+        images.record_variants(name, [160, 320])
+        medicine = Medicine.objects.get(pk=medicine.pk)
+        self.assertEqual(medicine.picture_variants, {name: [160, 320]})
+        root = name.rsplit(".", 1)[0]
+        with mock.patch("os.path.exists", side_effect=AssertionError):
+            self.assertEqual(
+                images.srcset(name, medicine.picture_variants),
+                {
+                    "image/webp": f"/media/{root}.160w.webp 160w, "
+                    f"/media/{root}.320w.webp 320w",
+                    "image/jpeg": f"/media/{root}.160w.jpg 160w, "
+                    f"/media/{root}.320w.jpg 320w",
+                },
+            )
+        # Recorded for an earlier picture
+        self.assertEqual(
+            images.srcset("medicine/other.jpg", medicine.picture_variants), {}
+        )
+
+
+class StaticFilesTest(TransactionTestCase):
+    """Precompressed siblings and caching of the files they list"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+        (self.directory / "assets").mkdir()
+        for name in ("assets/Cart-BChxL--6.js", "main.js"):
+            (self.directory / name).write_text("console.log('pharmacy');\n" * 50)
+
+    def get(self, path: str, **kwargs):
+        files = PrecompressedStaticFiles(directory=self.directory, **kwargs)
+        return TestClient(files).get(path, headers={"Accept-Encoding": "br, gzip"})
+
+    def test_immutable(self):
+        # Fingerprinted, but not listed yet
+        response = self.get("/assets/Cart-BChxL--6.js")
+        self.assertEqual(response.headers["cache-control"], REVALIDATE)
+        self.assertNotIn("content-encoding", response.headers)
+        self.assertEqual(assets.precompress(self.directory)[:2], (2, 4))
+        response = self.get("/assets/Cart-BChxL--6.js")
+        self.assertEqual(response.headers["cache-control"], IMMUTABLE)
+        self.assertEqual(response.headers["content-encoding"], "br")
+        self.assertEqual(
+            response.headers["content-type"], "text/javascript; charset=utf-8"
+        )
+        self.assertEqual(response.text, "console.log('pharmacy');\n" * 50)
+        response = self.get("/main.js")
+        self.assertEqual(response.headers["cache-control"], REVALIDATE)
+        # e.g uploads
+        response = self.get("/assets/Cart-BChxL--6.js", immutable=False)
+        self.assertEqual(response.headers["cache-control"], REVALIDATE)
+
+
+class IdempotencyTest(TransactionTestCase):
+    """Orders placed once per `Idempotency-Key`, whatever the retries"""
+
+    def setUp(self):
+        patcher = mock.patch("pharmacy.images.has_variants", return_value=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        from api import app
+        from api.v1.cache import user_cache
+
+        user_cache.clear()
+        self.client = TestClient(app)
+        self.customer = CustomUser.objects.create(
+            username="customer", password="customer", token="pms_customer"
+        )
+        self.customer.account.credit(
+            Decimal(1_000), LedgerEntry.EntryKind.PAYMENT, "Idempotency"
+        )
+        self.medicine = Medicine.objects.create(name="Medicine", price=10, stock=10)
+
+    def order(self, quantity: int, key: str = "order-1"):
+        return self.client.post(
+            f"/api/v1/order/{self.medicine.id}",
+            json={"quantity": quantity},
+            headers={"Authorization": "Bearer pms_customer", "Idempotency-Key": key},
+        )
+
+    def test_replay(self):
+        placed = self.order(2)
+        self.assertEqual(placed.status_code, 200)
+        self.assertNotIn("idempotent-replayed", placed.headers)
+        replayed = self.order(2)
+        self.assertEqual(replayed.status_code, 200)
+        self.assertEqual(replayed.headers["idempotent-replayed"], "true")
+        self.assertEqual(replayed.json(), placed.json())
+        self.assertEqual(Order.objects.count(), 1)
+        self.customer.account.refresh_from_db()
+        self.assertEqual(self.customer.account.balance, Decimal(980))
+        # Other keys place other orders
+        self.assertEqual(self.order(2, "order-2").status_code, 200)
+        self.assertEqual(Order.objects.count(), 2)
+
+    def test_failure_released(self):
+        self.assertEqual(self.order(11).status_code, 409)  # Out of stock
+        self.assertFalse(IdempotencyKey.objects.exists())
+        self.assertEqual(self.order(11).status_code, 409)
+
+    def test_mismatch(self):
+        self.assertEqual(self.order(2).status_code, 200)
+        self.assertEqual(self.order(3).status_code, 422)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_lapsed(self):
+        self.assertEqual(self.order(2).status_code, 200)
+        IdempotencyKey.objects.update(expires_at=timezone.now())
+        self.assertNotIn("idempotent-replayed", self.order(2).headers)
+        self.assertEqual(Order.objects.count(), 2)
+
+    @mock.patch.object(idempotency, "CLAIM_TTL", 0.3)
+    def test_concurrent_duplicate(self):
+        # Outlasts its claim's TTL, which it renews
+        runs = []
+
+        @idempotency.idempotent
+        async def place(user, quantity: int, idempotency_key=None):
+            runs.append(quantity)
+            await asyncio.sleep(1)
+            return {"quantity": quantity}
+
+        async def duplicates():
+            first = asyncio.create_task(
+                place(user=self.customer, quantity=1, idempotency_key="order-1")
+            )
+            await asyncio.sleep(0.2)
+            second = place(user=self.customer, quantity=1, idempotency_key="order-1")
+            return await asyncio.gather(first, second)
+
+        result, replayed = asyncio.run(duplicates())
+        self.assertEqual(runs, [1])
+        self.assertEqual(result, {"quantity": 1})
+        self.assertEqual(replayed.headers["idempotent-replayed"], "true")
+        self.assertEqual(json.loads(replayed.body), result)
+
+
+class TokenCacheTest(TransactionTestCase):
+    """Cached token users, evicted as they change"""
+
+    def setUp(self):
+        patcher = mock.patch("pharmacy.images.has_variants", return_value=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        from api import app
+        from api.v1.cache import user_cache
+
+        self.user_cache = user_cache
+        user_cache.clear()
+        self.client = TestClient(app)
+        self.customer = CustomUser.objects.create(
+            username="customer", password="customer", token="pms_customer"
+        )
+
+    def profile(self, token: str) -> int:
+        return self.client.get(
+            "/api/v1/profile", headers={"Authorization": f"Bearer {token}"}
+        ).status_code
+
+    def test_rotated_token(self):
+        self.assertEqual(self.profile("pms_customer"), 200)
+        self.assertIsNotNone(self.user_cache.get("pms_customer"))
+        response = self.client.patch(
+            "/api/v1/token", headers={"Authorization": "Bearer pms_customer"}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(self.user_cache.get("pms_customer"))
+        self.assertEqual(self.profile("pms_customer"), 401)
+        self.assertEqual(self.profile(response.json()["access_token"]), 200)
+
+    def test_deleted_user(self):
+        self.assertEqual(self.profile("pms_customer"), 200)
+        self.customer.delete()
+        self.assertIsNone(self.user_cache.get("pms_customer"))
+        self.assertEqual(self.profile("pms_customer"), 401)
+
+    def test_rolled_back_save(self):
+        self.assertEqual(self.profile("pms_customer"), 200)
+        user = self.user_cache.get("pms_customer")
+        with self.assertRaises(InsufficientBalanceError):
+            with transaction.atomic():
+                user.account.credit(Decimal(10), LedgerEntry.EntryKind.PAYMENT)
+                raise InsufficientBalanceError("Rolled back")
+        # Not evicted, nor is its baseline moved by the copy's saves
+        user = self.user_cache.get("pms_customer")
+        self.assertEqual(user.account.balance, Decimal(0))
+        self.assertEqual(user.account.changed_fields(), [])
+
+
+class CatalogTest(TransactionTestCase):
+    def setUp(self):
+        patcher = mock.patch("pharmacy.images.has_variants", return_value=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def path(self, name: str, content: str = None) -> str:
+        path = Path(self.directory.name, name)
+        if content is not None:
+            path.write_text(content)
+        return str(path)
+
+    def catalog(self) -> list[tuple]:
+        return list(Medicine.objects.order_by("name").values_list(*FIELDS))
+
+    def test_round_trip(self):
+        for index, category in enumerate(Medicine.MedicineCategory):
+            Medicine.objects.create(
+                name=f"Medicine {index}",
+                short_name=f"M{index}",
+                category=category.value,
+                description=f'Line one\nLine, "two" {index}',
+                price=Decimal("10.5") + index,
+                stock=index,
+            )
+        catalog = self.catalog()
+        for format in READERS:
+            path = self.path(f"catalog.{format}")
+            call_command("catalog", "export", path, stderr=io.StringIO())
+            Medicine.objects.all().delete()
+            call_command("catalog", "import", path, stderr=io.StringIO())
+            self.assertEqual(self.catalog(), catalog, format)
+
+    def test_invalid_jsonl(self):
+        for content, message in [
+            ('{"name": "A", "price": 1}\n\n{"name": "B",\n', "Record 2 (line 3): "),
+            ('{"name": "A", "price": 1}\n["B", 1]\n', "Record 2 (line 2): expected"),
+        ]:
+            path = self.path("catalog.jsonl", content)
+            with self.assertRaisesMessage(CommandError, message):
+                call_command("catalog", "import", path, stderr=io.StringIO())
+        with self.assertRaisesMessage(CatalogImportError, "Record 1: price"):
+            import_catalog(io.StringIO('{"name": "A"}\n'), "jsonl")
+
+
+class AnalyticsTest(TransactionTestCase):
+    def setUp(self):
+        patcher = mock.patch("pharmacy.images.has_variants", return_value=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        cache.clear()
+        self.antibiotics, self.pain_relief = [
+            Medicine.objects.create(
+                name=category.name, category=category.value, price=price, stock=100
+            )
+            for category, price in [
+                (Medicine.MedicineCategory.ANTIBIOTICS, 10),
+                (Medicine.MedicineCategory.PAIN_RELIEF, 5),
+            ]
+        ]
+        first, second = [
+            CustomUser.objects.create(username=f"customer{index}") for index in range(2)
+        ]
+        for customer, joined in [
+            (first, date(2025, 1, 10)),
+            (second, date(2025, 2, 5)),
+        ]:
+            customer.account.credit(Decimal(1_000), LedgerEntry.EntryKind.PAYMENT)
+            CustomUser.objects.filter(pk=customer.pk).update(
+                date_joined=analytics.local_midnight(joined)
+            )
+        for customer, medicine, quantity, day in [
+            (first, self.antibiotics, 2, date(2025, 1, 20)),
+            (first, self.pain_relief, 1, date(2025, 2, 10)),
+            (second, self.antibiotics, 1, date(2025, 2, 10)),
+            (second, self.pain_relief, 3, date(2025, 2, 11)),
+        ]:
+            order = Order.objects.create(
+                customer=customer, medicine=medicine, quantity=quantity
+            )
+            Order.objects.filter(pk=order.pk).update(
+                created_at=analytics.local_midnight(day) + timedelta(hours=12)
+            )
+        cache.clear()
+
+    def test_top_sellers(self):
+        start, end = date(2025, 1, 1), date(2025, 2, 28)
+        self.assertEqual(
+            [
+                (
+                    seller["name"],
+                    seller["quantity"],
+                    seller["revenue"],
+                    seller["orders"],
+                )
+                for seller in analytics.top_sellers(start, end, limit=10)
+            ],
+            [("PAIN_RELIEF", 4, 20.0, 2), ("ANTIBIOTICS", 3, 30.0, 2)],
+        )
+        top = analytics.top_sellers(start, end, limit=1, by="revenue")
+        self.assertEqual([seller["name"] for seller in top], ["ANTIBIOTICS"])
+
+    def test_revenue_by_category(self):
+        antibiotics = Medicine.MedicineCategory.ANTIBIOTICS.value
+        pain_relief = Medicine.MedicineCategory.PAIN_RELIEF.value
+        days = analytics.revenue_by_category(date(2025, 2, 10), date(2025, 2, 11))
+        self.assertEqual(
+            [
+                (
+                    day["period"],
+                    day["revenue"][antibiotics],
+                    day["revenue"][pain_relief],
+                )
+                for day in days
+            ],
+            [(date(2025, 2, 10), 10.0, 5.0), (date(2025, 2, 11), 0.0, 15.0)],
+        )
+        # Weeks from Monday, the 10th
+        weeks = analytics.revenue_by_category(
+            date(2025, 2, 10), date(2025, 2, 16), period="week"
+        )
+        self.assertEqual(
+            [(week["period"], week["total"]) for week in weeks],
+            [(date(2025, 2, 10), 30.0)],
+        )
+
+    def test_customer_cohorts(self):
+        cohorts = analytics.customer_cohorts(date(2025, 1, 1), date(2025, 2, 28))
+        self.assertEqual(
+            [
+                (cohort["cohort"], cohort["customers"], cohort["active"])
+                for cohort in cohorts
+            ],
+            [(date(2025, 1, 1), 1, [1, 1]), (date(2025, 2, 1), 1, [1])],
+        )
+        # Whole month cohorts, orders counted from the start day on
+        cohorts = analytics.customer_cohorts(date(2025, 1, 21), date(2025, 2, 28))
+        self.assertEqual(cohorts[0]["customers"], 1)
+        self.assertEqual(cohorts[0]["active"], [0, 1])
+
+    def test_longest_period(self):
+        from api import app
+        from api.v1.cache import user_cache
+
+        user_cache.clear()
+        CustomUser.objects.create(username="staff", is_staff=True, token="pms_staff")
+        # Starting mid-month, as long as `period` allows
+        response = TestClient(app).get(
+            "/api/v1/analytics/cohorts",
+            params={"start": "2025-01-15", "end": "2026-01-14"},
+            headers={"Authorization": "Bearer pms_staff"},
+        )
+        self.assertEqual(response.status_code, 200, response.text)
+        self.assertEqual(len(response.json()), 13)
+
+
+class CheckoutTest(TransactionTestCase):
+    """Several items ordered at once, all of them or none"""
+
+    def setUp(self):
+        patcher = mock.patch("pharmacy.images.has_variants", return_value=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        from api import app
+        from api.v1.cache import user_cache
+
+        user_cache.clear()
+        self.client = TestClient(app)
+        self.customer = CustomUser.objects.create(
+            username="customer", password="customer", token="pms_customer"
+        )
+        self.customer.account.credit(Decimal(60), LedgerEntry.EntryKind.PAYMENT)
+        self.first, self.second = [
+            Medicine.objects.create(name=f"Medicine {index}", price=price, stock=5)
+            for index, price in enumerate([10, 20])
+        ]
+
+    def checkout(self, *items: tuple[int, int]):
+        return self.client.post(
+            "/api/v1/orders/checkout",
+            json={
+                "items": [
+                    {"medicine_id": medicine_id, "quantity": quantity}
+                    for medicine_id, quantity in items
+                ]
+            },
+            headers={"Authorization": "Bearer pms_customer"},
+        )
+
+    def assertNothingWritten(self):
+        self.assertEqual(
+            list(Medicine.objects.order_by("id").values_list("stock", flat=True)),
+            [5, 5],
+        )
+        self.assertFalse(Order.objects.exists())
+        self.assertFalse(
+            Inventory.objects.filter(
+                reason=Inventory.ChangeReason.INITIAL_SALE.value
+            ).exists()
+        )
+        account = Account.objects.get(pk=self.customer.account_id)
+        self.assertEqual(account.balance, Decimal(60))
+        self.assertEqual(account.entries.count(), 1)
+
+    def test_second_item_out_of_stock(self):
+        response = self.checkout((self.first.id, 2), (self.second.id, 6))
+        self.assertEqual(response.status_code, 409, response.text)
+        self.assertIn(self.second.name, response.json()["detail"])
+        self.assertNothingWritten()
+
+    def test_second_item_unknown(self):
+        response = self.checkout((self.first.id, 2), (self.second.id + 1, 1))
+        self.assertEqual(response.status_code, 404, response.text)
+        self.assertNothingWritten()
+
+    def test_insufficient_balance(self):
+        response = self.checkout((self.first.id, 5), (self.second.id, 1))
+        self.assertEqual(response.status_code, 403, response.text)
+        self.assertNothingWritten()
+
+    def test_checkout(self):
+        response = self.checkout((self.first.id, 2), (self.second.id, 1))
+        self.assertEqual(response.status_code, 200, response.text)
+        orders = response.json()
+        self.assertEqual([order["total_price"] for order in orders], [20.0, 20.0])
+        self.assertEqual(
+            list(Medicine.objects.order_by("id").values_list("stock", flat=True)),
+            [3, 4],
+        )
+        self.assertEqual(
+            sorted(
+                Inventory.objects.filter(
+                    reason=Inventory.ChangeReason.INITIAL_SALE.value
+                ).values_list("change", flat=True)
+            ),
+            [-2, -1],
+        )
+        # A single debit of the summed total
+        entry = LedgerEntry.objects.filter(
+            account_id=self.customer.account_id,
+            kind=LedgerEntry.EntryKind.ORDER.value,
+        ).get()
+        self.assertEqual(entry.amount, Decimal(-40))
+        self.assertEqual(entry.balance, Decimal(20))
+        self.assertEqual(
+            entry.reference, "Orders " + ", ".join(str(order["id"]) for order in orders)
+        )
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -43,6 +44,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "pharmacy.metrics.route_middleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -76,6 +78,22 @@ WSGI_APPLICATION = "pharmacy_ms.wsgi.application"
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
+# Set PHARMACY_DB_PROFILE=production to tune SQLite for concurrent use:
+# write-ahead logging so that readers don't block the writer, waiting on
+# locks instead of failing with "database is locked", write transactions
+# taking the lock upfront and connections kept open between requests.
+
+DATABASE_PROFILE = os.environ.get("PHARMACY_DB_PROFILE", "development")
+
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",  # Durable at checkpoints, safe with WAL
+    "busy_timeout": 5000,  # milliseconds
+    "mmap_size": 256 * 1024 * 1024,  # bytes
+    "cache_size": -64 * 1024,  # KiB when negative
+    "temp_store": "MEMORY",
+}
+
 DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
@@ -83,6 +101,22 @@ DATABASES = {
     }
 }
 
+if DATABASE_PROFILE == "production":
+    DATABASES["default"].update(
+        {
+            "OPTIONS": {
+                "init_command": ";".join(
+                    f"PRAGMA {pragma}={value}"
+                    for pragma, value in SQLITE_PRAGMAS.items()
+                ),
+                "transaction_mode": "IMMEDIATE",
+                "timeout": SQLITE_PRAGMAS["busy_timeout"] / 1000,  # seconds
+            },
+            "CONN_MAX_AGE": 600,  # seconds
+            "CONN_HEALTH_CHECKS": True,
+        }
+    )
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -138,6 +172,72 @@ AUTH_USER_MODEL = "users.CustomUser"
 
 FRONTEND_DIR = BASE_DIR / "frontend/dist.ready"
 
+# API token -> user cache (per process). Other workers accept a token
+# rotated with `PATCH /v1/token`, or of a deleted user, for up to the TTL
+
+API_USER_CACHE_SIZE = 1024
+
+API_USER_CACHE_TTL = 60  # seconds
+
+# Serialized catalog pages, keyed by catalog version (kept in the
+# database, hence shared by every worker)
+
+API_CATALOG_CACHE_TTL = 300  # seconds
+
+# Responses of order placements replayed to retries carrying the same
+# Idempotency-Key (see api/v1/idempotency.py)
+
+API_IDEMPOTENCY_TTL = 60 * 60 * 24  # seconds
+
+API_IDEMPOTENCY_WAIT = 10  # seconds a duplicate waits for the original
+
+# Streamed responses (long order histories, exports) in progress at once,
+# each holding a thread & database connection. Others get 503.
+
+API_MAX_STREAMS = 16
+
+# Opt-in SQL profiling of requests, set PHARMACY_SQL_PROFILER=1: query
+# count & time headers, and a log of requests with slow or repeated
+# (N+1) queries (see pharmacy/profiler.py)
+
+SQL_PROFILER = os.environ.get("PHARMACY_SQL_PROFILER") == "1"
+
+SQL_SLOW_QUERY_MS = 100  # A single query
+
+SQL_SLOW_REQUEST_MS = 300  # All queries of a request
+
+SQL_DUPLICATE_THRESHOLD = 5  # Runs of the same SQL in a request
+
+# Staff analytics aggregate orders per day. Past days rarely change and
+# are dropped on order changes in this process; today's bucket is kept
+# briefly for the sake of other processes.
+
+ANALYTICS_CACHE_TTL = 60 * 60 * 24  # seconds
+
+ANALYTICS_TODAY_CACHE_TTL = 60  # seconds
+
+# Demand forecasting & reorder points (see pharmacy/forecast.py)
+
+FORECAST_SMOOTHING = 0.3  # Weight of the latest day's sales, 0 - 1
+
+REORDER_LEAD_TIME_DAYS = 7  # Days a reorder takes to arrive
+
+REORDER_REVIEW_DAYS = 7  # Days a reorder should last beyond lead time
+
+REORDER_SERVICE_FACTOR = 1.65  # Safety stock in standard deviations (~95%)
+
+# Resized WebP/JPEG variants of uploaded images, stored next to them
+# (see pharmacy/images.py)
+
+IMAGE_VARIANT_WIDTHS = (160, 320, 640)
+
+IMAGE_VARIANT_WORKERS = 2  # Processes
+
+# Serve v1 from coroutines using Django's async ORM instead of the threadpool
+# i.e queries run one at a time on Django's shared sync thread (see api.v1.routes)
+
+API_ASYNC_ORM = False
+
 JAZZMIN_SETTINGS = {
     "show_ui_builder": True,
     "site_title": "Pharmacy MS",
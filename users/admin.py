@@ -1,5 +1,6 @@
 from django.contrib import admin
-from users.models import CustomUser, Payment, Account
+from users.models import CustomUser, Payment, Account, LedgerEntry
+from pharmacy.changelist import AutocompleteFilter, LargeTableAdmin
 
 # Register your models here.
 
@@ -30,7 +31,7 @@ sensitive_post_parameters_m = method_decorator(sensitive_post_parameters())
 
 
 @admin.register(CustomUser)
-class CustomUserAdmin(admin.ModelAdmin):
+class CustomUserAdmin(LargeTableAdmin):
     form = UserChangeForm
     add_form = AdminUserCreationForm
     change_user_password_template = None
@@ -46,6 +47,7 @@ class CustomUserAdmin(admin.ModelAdmin):
         "date_joined",
     )
     search_fields = ("username", "first_name", "last_name", "email")
+    date_hierarchy = "date_joined"
     ordering = ("-date_joined",)
     filter_horizontal = (
         "groups",
@@ -264,35 +266,61 @@ class CustomUserAdmin(admin.ModelAdmin):
 
 
 @admin.register(Payment)
-class PaymentAdmin(admin.ModelAdmin):
+class PaymentAdmin(LargeTableAdmin):
     list_display = ("user", "amount", "method", "reference", "created_at")
-    search_fields = ("user", "reference", "method")
-    list_filter = ("user", "method", "created_at")
+    search_fields = ("user__username", "reference")
+    list_filter = (("user", AutocompleteFilter), "method", "created_at")
+    list_select_related = ("user",)
+    date_hierarchy = "created_at"
     ordering = ("-created_at",)
     list_editable = ()
 
-    def has_change_permission(self, request, obj=...):
+    def has_change_permission(self, request, obj=None):
         return False
 
-    def has_delete_permission(self, request, obj=...):
+    def has_delete_permission(self, request, obj=None):
         return False
 
 
 @admin.register(Account)
-class AccountAdmin(admin.ModelAdmin):
+class AccountAdmin(LargeTableAdmin):
     list_display = ("user", "balance", "created_at", "updated_at")
     search_fields = (
-        "user",
+        "user__username",
         "balance",
     )
-    list_filter = ("user", "updated_at", "created_at")
+    list_select_related = ("user",)
+    # Ids run in order of creation, no index on `created_at` needed
+    ordering = ("-id",)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(LedgerEntry)
+class LedgerEntryAdmin(LargeTableAdmin):
+    list_display = ("customer", "kind", "amount", "balance", "reference", "created_at")
+    search_fields = ("account__user__username", "reference")
+    list_filter = ("kind", "created_at")
+    list_select_related = ("account__user",)
+    date_hierarchy = "created_at"
     ordering = ("-created_at",)
 
+    @admin.display(description=_("Customer"), ordering="account__user__username")
+    def customer(self, obj: LedgerEntry):
+        return obj.account.user
+
     def has_add_permission(self, request):
         return False
 
-    def has_delete_permission(self, request, obj=...):
+    def has_change_permission(self, request, obj=None):
         return False
 
-    def has_change_permission(self, request, obj=...):
+    def has_delete_permission(self, request, obj=None):
         return False
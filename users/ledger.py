@@ -0,0 +1,87 @@
+"""Reconciliation of cached account balances against the ledger.
+
+The ledger is single-entry, one `LedgerEntry` per change to a customer's
+account, hence balances are checked per account rather than the books
+as a whole.
+
+`Account.balance` and the `balance` of an account's latest
+`LedgerEntry` must both equal the sum of the account's entries.
+`reconcile` checks this for every account, a batch at a time, each
+batch in one transaction so that postings in flight are seen either
+whole or not at all.
+"""
+
+from dataclasses import dataclass
+from decimal import Decimal
+from django.db import transaction
+from django.db.models import OuterRef, Subquery, Sum
+from users.models import Account, LedgerEntry
+from users.signals import balance_changed
+
+BATCH_SIZE = 1_000
+
+
+@dataclass
+class Mismatch:
+    account_id: int
+    balance: Decimal  # Cached
+    ledger_total: Decimal
+    last_balance: Decimal | None  # Running balance of the latest entry
+
+
+def reconcile(batch_size: int = BATCH_SIZE, fix: bool = False) -> tuple[int, list]:
+    """Returns total accounts checked and those out of balance.
+
+    With `fix`, the ledger wins: cached balances are reset to the sum of
+    the entries, and a zero adjustment carrying that sum is appended
+    where the latest running balance is off.
+    """
+    entries = LedgerEntry.objects.filter(account=OuterRef("pk"))
+    ledger_total = Subquery(
+        entries.values("account").annotate(total=Sum("amount")).values("total")
+    )
+    last_balance = Subquery(
+        entries.order_by("-created_at", "-id").values("balance")[:1]
+    )
+    checked, mismatches = 0, []
+    last_id = 0
+    while True:
+        with transaction.atomic():
+            rows = list(
+                Account.objects.filter(id__gt=last_id)
+                .order_by("id")
+                .annotate(ledger_total=ledger_total, last_balance=last_balance)
+                .values_list("id", "balance", "ledger_total", "last_balance")[
+                    :batch_size
+                ]
+            )
+            for account_id, balance, total, last in rows:
+                total = total or Decimal("0.00")
+                # `last` is None where there are no entries, total is 0
+                if balance == total and last in (None, total):
+                    continue
+                mismatches.append(Mismatch(account_id, balance, total, last))
+                if fix:
+                    repair(account_id, balance, total, last)
+        checked += len(rows)
+        if len(rows) < batch_size:
+            return checked, mismatches
+        last_id = rows[-1][0]
+
+
+def repair(account_id: int, balance: Decimal, total: Decimal, last: Decimal | None):
+    if last is not None and last != total:
+        LedgerEntry.objects.create(
+            account_id=account_id,
+            kind=LedgerEntry.EntryKind.ADJUSTMENT.value,
+            amount=0,
+            balance=total,
+            reference="Reconciliation",
+        )
+    if balance != total:
+        Account.objects.filter(pk=account_id, balance=balance).update(balance=total)
+        transaction.on_commit(
+            lambda: balance_changed.send(
+                sender=Account, instance=Account(pk=account_id)
+            )
+        )
@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand, CommandError
+from users.ledger import reconcile, BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = (
+        "Verifies cached account balances against the ledger. "
+        "Schedule it (e.g cron), it exits with an error on mismatches."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--fix",
+            action="store_true",
+            help="Reset mismatched balances to the ledger's",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=BATCH_SIZE,
+            help="Accounts checked per transaction",
+        )
+
+    def handle(self, *args, fix, batch_size, **options):
+        checked, mismatches = reconcile(batch_size, fix)
+        for mismatch in mismatches:
+            self.stderr.write(
+                f"Account {mismatch.account_id}: balance {mismatch.balance}, "
+                f"ledger {mismatch.ledger_total}, "
+                f"latest entry {mismatch.last_balance}"
+            )
+        if mismatches and not fix:
+            raise CommandError(
+                f"{len(mismatches)} of {checked} accounts out of balance"
+            )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{checked} accounts reconciled"
+                + (f", {len(mismatches)} fixed" if mismatches else "")
+            )
+        )
@@ -0,0 +1,124 @@
+# Generated by Django 5.1.5 on 2026-10-18 02:22
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def open_balances(apps, schema_editor):
+    """Opening entry per account holding a balance, as of its last change"""
+    Account = apps.get_model("users", "Account")
+    LedgerEntry = apps.get_model("users", "LedgerEntry")
+    LedgerEntry.objects.bulk_create(
+        (
+            LedgerEntry(
+                account_id=id,
+                kind="Opening balance",
+                amount=balance,
+                balance=balance,
+                reference="Balance before the ledger",
+                created_at=updated_at,
+            )
+            for id, balance, updated_at in Account.objects.exclude(balance=0)
+            .values_list("id", "balance", "updated_at")
+            .iterator()
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0002_query_plan_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="LedgerEntry",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[
+                            ("Opening balance", "OPENING_BALANCE"),
+                            ("Payment", "PAYMENT"),
+                            ("Order", "ORDER"),
+                            ("Refund", "REFUND"),
+                            ("Adjustment", "ADJUSTMENT"),
+                        ],
+                        help_text="What changed the balance",
+                        max_length=20,
+                        verbose_name="Kind",
+                    ),
+                ),
+                (
+                    "amount",
+                    models.DecimalField(
+                        decimal_places=2,
+                        help_text="Change in balance, negative for debits",
+                        max_digits=10,
+                        verbose_name="Amount",
+                    ),
+                ),
+                (
+                    "balance",
+                    models.DecimalField(
+                        decimal_places=2,
+                        help_text="Account balance after this entry",
+                        max_digits=10,
+                        verbose_name="Balance",
+                    ),
+                ),
+                (
+                    "reference",
+                    models.TextField(
+                        blank=True,
+                        help_text="Payment or orders behind the entry",
+                        verbose_name="Reference",
+                    ),
+                ),
+                (
+                    "created_at",
+                    models.DateTimeField(
+                        default=django.utils.timezone.now,
+                        help_text="The date and time when the entry was recorded",
+                        verbose_name="Created At",
+                    ),
+                ),
+                (
+                    "account",
+                    models.ForeignKey(
+                        help_text="Account whose balance changed",
+                        on_delete=django.db.models.deletion.PROTECT,
+                        related_name="entries",
+                        to="users.account",
+                        verbose_name="Account",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name_plural": "Ledger entries",
+                "indexes": [
+                    models.Index(
+                        fields=["account", "-created_at", "-id"],
+                        name="ledger_account_created_idx",
+                    ),
+                    models.Index(fields=["-created_at"], name="ledger_created_at_idx"),
+                    models.Index(
+                        fields=["kind", "-created_at"], name="ledger_kind_created_idx"
+                    ),
+                ],
+            },
+        ),
+        migrations.RunPython(open_balances, migrations.RunPython.noop),
+    ]
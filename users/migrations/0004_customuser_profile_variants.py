@@ -0,0 +1,23 @@
+# Generated by Django 5.1.5 on 2026-10-18 03:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0003_ledgerentry"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="customuser",
+            name="profile_variants",
+            field=models.JSONField(
+                default=dict,
+                editable=False,
+                help_text="Widths of the resized copies made of the profile picture",
+                verbose_name="Profile picture variants",
+            ),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.1.5 on 2026-10-18 03:44
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0004_customuser_profile_variants"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="account",
+            name="account_created_at_idx",
+        ),
+        migrations.AlterField(
+            model_name="payment",
+            name="user",
+            field=models.ForeignKey(
+                db_index=False,
+                help_text="User account to deposit to.",
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="payments",
+                to=settings.AUTH_USER_MODEL,
+                verbose_name="Customer",
+            ),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.1.5 on 2026-10-18 03:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0005_prune_indexes"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="account",
+            name="balance",
+            field=models.DecimalField(
+                decimal_places=2, default=0, help_text="Account balance", max_digits=10
+            ),
+        ),
+    ]
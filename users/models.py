@@ -1,10 +1,17 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F
 from django.contrib.auth.models import AbstractUser
 from django.utils.translation import gettext as _
+from django.utils import timezone
 from uuid import uuid4
 from os import path
 from django.core.validators import FileExtensionValidator
 from enum import Enum
+from datetime import datetime
+from decimal import Decimal
+from users.signals import balance_changed
+from pharmacy.exceptions import InsufficientBalanceError
+from pharmacy.mixins import ChangeTrackingMixin
 
 # Create your models here.
 
@@ -14,9 +21,9 @@ def generate_profile_filepath(instance: "CustomUser", filename: str) -> str:
     return f"user_profile/{instance.id}{custom_filename}"
 
 
-class Account(models.Model):
+class Account(ChangeTrackingMixin, models.Model):
     balance = models.DecimalField(
-        max_digits=8, decimal_places=2, help_text=_("Account balance"), default=0
+        max_digits=10, decimal_places=2, help_text=_("Account balance"), default=0
     )
     updated_at = models.DateTimeField(
         auto_now=True,
@@ -32,8 +39,156 @@ class Account(models.Model):
     def __str__(self):
         return str(self.balance)
 
+    def post(
+        self,
+        amount: Decimal,
+        kind: "LedgerEntry.EntryKind",
+        reference: str = "",
+        message: str = "Insufficient account balance",
+    ) -> "LedgerEntry":
+        """Moves the balance by `amount` and records it in the ledger.
 
-class CustomUser(AbstractUser):
+        The balance is moved by one conditional UPDATE and the entry,
+        carrying the resulting balance, is appended in the same
+        transaction. A debit (negative `amount`) raises
+        `InsufficientBalanceError` with `message` instead of overdrawing.
+        """
+        with transaction.atomic():
+            query = Account.objects.filter(pk=self.pk)
+            if amount < 0:
+                query = query.filter(balance__gte=-amount)
+            if not query.update(
+                balance=F("balance") + amount, updated_at=timezone.now()
+            ):
+                raise InsufficientBalanceError(message)
+            # The row is locked until commit, entries follow balance changes
+            balance = Account.objects.values_list("balance", flat=True).get(pk=self.pk)
+            entry = LedgerEntry.objects.create(
+                account_id=self.pk,
+                kind=kind.value,
+                amount=amount,
+                balance=balance,
+                reference=reference,
+            )
+        self.balance = balance
+        self._snapshot(["balance"])
+        # Receivers e.g caches must not act on a balance yet to be committed
+        transaction.on_commit(
+            lambda: balance_changed.send(sender=Account, instance=self)
+        )
+        return entry
+
+    def debit(
+        self,
+        amount: Decimal,
+        kind: "LedgerEntry.EntryKind",
+        reference: str = "",
+        message: str = "Insufficient account balance",
+    ) -> "LedgerEntry":
+        """Takes `amount` off the balance. See `post`."""
+        return self.post(-amount, kind, reference, message)
+
+    def credit(
+        self, amount: Decimal, kind: "LedgerEntry.EntryKind", reference: str = ""
+    ) -> "LedgerEntry":
+        """Adds `amount` to the balance. See `post`."""
+        return self.post(amount, kind, reference)
+
+    def balance_at(self, when: datetime) -> Decimal:
+        """Balance as of `when`, as per the ledger"""
+        balance = (
+            self.entries.filter(created_at__lte=when)
+            .order_by("-created_at", "-id")
+            .values_list("balance", flat=True)
+            .first()
+        )
+        return Decimal("0.00") if balance is None else balance
+
+
+class LedgerEntry(models.Model):
+    """Append-only record of a change to an account's balance.
+
+    Single-entry: a change is one entry on the account it moves, the
+    pharmacy's side of it (cash, sales) is not booked. `Account.balance`
+    is a cache of the latest entry's `balance`, which in turn is the sum
+    of the account's entries up to and including it (see
+    `users.ledger.reconcile`).
+    """
+
+    class EntryKind(Enum):
+        OPENING_BALANCE = "Opening balance"
+        PAYMENT = "Payment"
+        ORDER = "Order"
+        REFUND = "Refund"
+        ADJUSTMENT = "Adjustment"
+
+        @classmethod
+        def choices(cls):
+            return [(key.value, key.name) for key in cls]
+
+    account = models.ForeignKey(
+        Account,
+        on_delete=models.PROTECT,
+        verbose_name=_("Account"),
+        help_text=_("Account whose balance changed"),
+        related_name="entries",
+    )
+    kind = models.CharField(
+        max_length=20,
+        choices=EntryKind.choices(),
+        verbose_name=_("Kind"),
+        help_text=_("What changed the balance"),
+    )
+    amount = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        verbose_name=_("Amount"),
+        help_text=_("Change in balance, negative for debits"),
+    )
+    balance = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        verbose_name=_("Balance"),
+        help_text=_("Account balance after this entry"),
+    )
+    reference = models.TextField(
+        blank=True,
+        verbose_name=_("Reference"),
+        help_text=_("Payment or orders behind the entry"),
+    )
+    created_at = models.DateTimeField(
+        default=timezone.now,
+        verbose_name=_("Created At"),
+        help_text=_("The date and time when the entry was recorded"),
+    )
+
+    class Meta:
+        verbose_name_plural = _("Ledger entries")
+        indexes = [
+            # Balance as of a time
+            models.Index(
+                fields=["account", "-created_at", "-id"],
+                name="ledger_account_created_idx",
+            ),
+            models.Index(fields=["-created_at"], name="ledger_created_at_idx"),
+            models.Index(
+                fields=["kind", "-created_at"], name="ledger_kind_created_idx"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} of Ksh.{self.amount} on account {self.account_id}"
+
+    def save(self, *args, **kwargs):
+        if self.id:
+            raise Exception("Ledger entries cannot be edited")
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        raise Exception("Ledger entries cannot be deleted")
+
+
+class CustomUser(ChangeTrackingMixin, AbstractUser):
     """Both indiduals and organizations"""
 
     gender = models.CharField(
@@ -62,6 +217,13 @@ class CustomUser(AbstractUser):
         null=True,
     )
 
+    profile_variants = models.JSONField(
+        _("Profile picture variants"),
+        default=dict,
+        editable=False,
+        help_text=_("Widths of the resized copies made of the profile picture"),
+    )
+
     token = models.CharField(
         _("token"),
         help_text=_("Token for validation"),
@@ -81,17 +243,21 @@ class CustomUser(AbstractUser):
     class Meta:
         verbose_name = _("user")
         verbose_name_plural = _("users")
+        indexes = [
+            models.Index(fields=["-date_joined"], name="user_date_joined_idx"),
+            models.Index(
+                fields=["is_staff", "-date_joined"], name="user_staff_joined_idx"
+            ),
+        ]
 
     def save(self, *args, **kwargs):
         if not self.id:  # new entry
             self.set_password(self.password)
-            new_account = Account.objects.create()
-            new_account.save()
-            self.account = new_account
+            self.account = Account.objects.create()
         super().save(*args, **kwargs)
 
 
-class Payment(models.Model):
+class Payment(ChangeTrackingMixin, models.Model):
     class PaymentMethod(str, Enum):
         CASH = "Cash"
         MPESA = "m-pesa"
@@ -108,6 +274,8 @@ class Payment(models.Model):
         on_delete=models.CASCADE,
         help_text=_("User account to deposit to."),
         related_name="payments",
+        # Leads `payment_user_created_idx`
+        db_index=False,
     )
 
     amount = models.DecimalField(
@@ -128,12 +296,26 @@ class Payment(models.Model):
         help_text=_("The date and time when the order was created"),
     )
 
+    class Meta:
+        indexes = [
+            # User's payments, newest first
+            models.Index(
+                fields=["user", "-created_at"], name="payment_user_created_idx"
+            ),
+            models.Index(fields=["-created_at"], name="payment_created_at_idx"),
+            models.Index(
+                fields=["method", "-created_at"], name="payment_method_created_idx"
+            ),
+        ]
+
     def __str__(self):
         return f"Amount Ksh.{self.amount} via {self.method} (Ref: {self.reference})"
 
     def save(self, *args, **kwargs):
         if self.id:
             raise Exception("Payments cannot be edited")
-        self.user.account.balance += self.amount
-        self.user.account.save()
-        super().save(*args, **kwargs)
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            self.user.account.credit(
+                self.amount, LedgerEntry.EntryKind.PAYMENT, f"Payment {self.id}"
+            )
@@ -0,0 +1,6 @@
+from django.dispatch import Signal
+
+# Sent with `instance` (Account) whenever its balance is moved with an
+# UPDATE statement, which unlike `Account.save` sends no `post_save`.
+# Sent once the transaction moving it commits, never for a rollback.
+balance_changed = Signal()
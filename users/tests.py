@@ -1,3 +1,103 @@
-from django.test import TestCase
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TransactionTestCase
+from django.utils import timezone
+from users.models import CustomUser, Account, LedgerEntry
+from users.ledger import Mismatch, reconcile
+from pharmacy.exceptions import InsufficientBalanceError
+
+
+class LedgerTest(TransactionTestCase):
+    """Postings, balances as of a time and reconciliation"""
+
+    def setUp(self):
+        patcher = mock.patch("pharmacy.images.has_variants", return_value=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.account = CustomUser.objects.create(username="customer").account
+
+    def test_post(self):
+        before = timezone.now()
+        entry = self.account.credit(
+            Decimal(100), LedgerEntry.EntryKind.PAYMENT, "Payment 1"
+        )
+        self.assertEqual((entry.amount, entry.balance), (Decimal(100), Decimal(100)))
+        paid = timezone.now()
+        entry = self.account.debit(Decimal(30), LedgerEntry.EntryKind.ORDER, "Order 1")
+        self.assertEqual((entry.amount, entry.balance), (Decimal(-30), Decimal(70)))
+        with self.assertRaises(InsufficientBalanceError):
+            self.account.debit(Decimal(71), LedgerEntry.EntryKind.ORDER, "Order 2")
+        self.assertEqual(self.account.entries.count(), 2)
+        self.account.refresh_from_db()
+        self.assertEqual(self.account.balance, Decimal(70))
+        # As wide as the entries
+        self.account.credit(
+            Decimal("99999999.99") - 70, LedgerEntry.EntryKind.ADJUSTMENT
+        )
+        self.account.refresh_from_db()
+        self.assertEqual(self.account.balance, Decimal("99999999.99"))
+
+        self.assertEqual(self.account.balance_at(before), Decimal(0))
+        self.assertEqual(self.account.balance_at(paid), Decimal(100))
+        self.assertEqual(self.account.balance_at(entry.created_at), Decimal(70))
+
+    def test_reconcile(self):
+        self.account.credit(Decimal(100), LedgerEntry.EntryKind.PAYMENT)
+        self.assertEqual(reconcile(), (1, []))
+        # Cached balance off
+        Account.objects.filter(pk=self.account.pk).update(balance=50)
+        mismatch = Mismatch(self.account.pk, Decimal(50), Decimal(100), Decimal(100))
+        self.assertEqual(reconcile(fix=True), (1, [mismatch]))
+        self.assertEqual(reconcile(), (1, []))
+        # Running balance off
+        LedgerEntry.objects.create(
+            account=self.account,
+            kind=LedgerEntry.EntryKind.ADJUSTMENT.value,
+            amount=10,
+            balance=100,
+        )
+        mismatch = Mismatch(self.account.pk, Decimal(100), Decimal(110), Decimal(100))
+        self.assertEqual(reconcile(batch_size=1, fix=True), (1, [mismatch]))
+        self.assertEqual(reconcile(), (1, []))
+        self.account.refresh_from_db()
+        self.assertEqual(self.account.balance, Decimal(110))
+        self.assertEqual(self.account.balance_at(timezone.now()), Decimal(110))
+
+    def test_opening_balances(self):
+        """Migration `users.0003` opens the ledger of accounts in credit"""
+        before = [("users", "0002_query_plan_indexes")]
+        after = [("users", "0003_ledgerentry")]
+        executor = MigrationExecutor(connection)
+        executor.migrate(before)
+        Account = executor.loader.project_state(before).apps.get_model(
+            "users", "Account"
+        )
+        in_credit = Account.objects.create(balance=Decimal("12.50"))
+        Account.objects.create(balance=0)
+
+        executor = MigrationExecutor(connection)
+        executor.migrate(after)
+        LedgerEntry = executor.loader.project_state(after).apps.get_model(
+            "users", "LedgerEntry"
+        )
+        self.assertEqual(
+            list(
+                LedgerEntry.objects.values_list(
+                    "account_id", "kind", "amount", "balance", "created_at"
+                )
+            ),
+            [
+                (
+                    in_credit.pk,
+                    "Opening balance",
+                    Decimal("12.50"),
+                    Decimal("12.50"),
+                    in_credit.updated_at,
+                )
+            ],
+        )
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())